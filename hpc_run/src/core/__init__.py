@@ -5,5 +5,13 @@
 from .executor import ProcessExecutor
 from .monitor import SystemMonitor, ResourceMetrics
 from .reporter import ReportGenerator
+from .history import RunHistory, command_fingerprint
+from .events import EventWriter, read_events
+from .ranks import RankInfo, detect_rank
+from .digest import ProgressDigest, TokenBucket
+from .consumers import OutputConsumer, LoggerConsumer, LogFileConsumer, TailConsumer, MetricConsumer
 
-__all__ = ['ProcessExecutor', 'SystemMonitor', 'ResourceMetrics', 'ReportGenerator']
+__all__ = ['ProcessExecutor', 'SystemMonitor', 'ResourceMetrics', 'ReportGenerator',
+           'RunHistory', 'command_fingerprint', 'EventWriter', 'read_events',
+           'RankInfo', 'detect_rank', 'ProgressDigest', 'TokenBucket',
+           'OutputConsumer', 'LoggerConsumer', 'LogFileConsumer', 'TailConsumer', 'MetricConsumer']
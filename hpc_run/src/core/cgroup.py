@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+cgroup v2 资源统计模块
+直接读取作业所在 cgroup 的计数文件（cpu.stat、memory.current、memory.stat、memory.peak、io.stat），
+每次采样只读几个小文件，开销与进程数无关，且包含已退出的短命子进程
+"""
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+# cgroup v2 统一层级的挂载点（相对于文件系统根目录）
+CGROUP_MOUNT = "sys/fs/cgroup"
+
+
+@dataclass
+class CgroupCounters:
+    """一次读取的 cgroup 计数（均为累计值或当前值）"""
+    cpu_usec: int = 0
+    memory_current: int = 0
+    working_set: int = 0                 # memory.current 减去非活跃文件页（可回收的页缓存）
+    memory_peak: Optional[int] = None
+    read_bytes: int = 0
+    write_bytes: int = 0
+    read_ops: int = 0
+    write_ops: int = 0
+
+
+def read_keyed(path: Path) -> Dict[str, int]:
+    """
+    读取 "键 值" 格式的计数文件（cpu.stat、memory.stat 等）
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        键到整数值的字典（无法解析的行被忽略）
+    """
+    values = {}
+    with open(path, "r") as f:
+        for line in f:
+            key, _, value = line.partition(" ")
+            try:
+                values[key] = int(value)
+            except ValueError:
+                continue
+    return values
+
+
+def read_io_stat(path: Path) -> Dict[str, int]:
+    """
+    读取 io.stat 并对所有设备求和
+
+    Args:
+        path: io.stat 路径
+
+    Returns:
+        rbytes、wbytes、rios、wios 等字段的合计
+    """
+    totals: Dict[str, int] = {}
+    with open(path, "r") as f:
+        for line in f:
+            # 格式: "8:0 rbytes=1 wbytes=2 rios=3 wios=4 dbytes=0 dios=0"
+            for item in line.split()[1:]:
+                key, _, value = item.partition("=")
+                if value.isdigit():
+                    totals[key] = totals.get(key, 0) + int(value)
+    return totals
+
+
+def _read_int(path: Path) -> Optional[int]:
+    try:
+        text = path.read_text().strip()
+    except OSError:
+        return None
+    return int(text) if text.isdigit() else None
+
+
+def cgroup_path(pid: int, root: Path = Path("/")) -> Optional[Path]:
+    """
+    查找进程所在的 cgroup v2 目录
+
+    Args:
+        pid: 进程 PID
+        root: 文件系统根目录（测试时可指向伪造的 procfs/cgroupfs）
+
+    Returns:
+        cgroup 目录，不是 cgroup v2（或无法读取）时返回 None
+    """
+    try:
+        text = (root / f"proc/{pid}/cgroup").read_text()
+    except OSError:
+        return None
+    for line in text.splitlines():
+        # cgroup v2 统一层级的行为 "0::/path"
+        hierarchy, _, rest = line.partition(":")
+        controllers, _, relative = rest.partition(":")
+        if hierarchy == "0" and not controllers:
+            path = root / CGROUP_MOUNT / relative.strip().lstrip("/")
+            if (path / "cpu.stat").exists():
+                return path
+    return None
+
+
+class CgroupAccounting:
+    """按 cgroup 计数文件统计一组进程的资源使用"""
+
+    def __init__(self, path: Path, owned: bool = False):
+        """
+        Args:
+            path: cgroup 目录
+            owned: 是否为本工具创建的子 cgroup（close 时删除）
+        """
+        self.path = Path(path)
+        self.owned = owned
+
+    def read(self) -> CgroupCounters:
+        """
+        读取当前计数（缺少的控制器对应字段为 0）
+
+        Returns:
+            CgroupCounters
+
+        Raises:
+            OSError: cgroup 已不存在
+        """
+        counters = CgroupCounters(cpu_usec=read_keyed(self.path / "cpu.stat").get("usage_usec", 0))
+        current = _read_int(self.path / "memory.current")
+        if current is not None:
+            counters.memory_current = current
+            try:
+                inactive_file = read_keyed(self.path / "memory.stat").get("inactive_file", 0)
+            except OSError:
+                inactive_file = 0
+            counters.working_set = max(0, current - inactive_file)
+            counters.memory_peak = _read_int(self.path / "memory.peak")
+        try:
+            io = read_io_stat(self.path / "io.stat")
+        except OSError:
+            io = {}
+        counters.read_bytes = io.get("rbytes", 0)
+        counters.write_bytes = io.get("wbytes", 0)
+        counters.read_ops = io.get("rios", 0)
+        counters.write_ops = io.get("wios", 0)
+        return counters
+
+    def process_count(self) -> Optional[int]:
+        """cgroup 中的进程数（cgroup.procs 的行数），不可读时返回 None"""
+        try:
+            return len((self.path / "cgroup.procs").read_text().split())
+        except OSError:
+            return None
+
+    def has_memory(self) -> bool:
+        """是否启用了 memory 控制器"""
+        return (self.path / "memory.current").exists()
+
+    def close(self):
+        """删除本工具创建的子 cgroup（其中仍有进程时保留）"""
+        if not self.owned:
+            return
+        try:
+            self.path.rmdir()
+        except OSError:
+            pass
+
+
+def open_cgroup(pid: int, root: Path = Path("/"), delegate: bool = False) -> Optional[CgroupAccounting]:
+    """
+    为进程打开 cgroup 统计
+
+    默认统计进程所在的 cgroup（通常是调度器为作业或作业步创建的 cgroup，包含包装器自身）；
+    delegate 为 True 且该 cgroup 已委派给当前用户时，为进程单独创建子 cgroup 并把进程移入，
+    子 cgroup 缺少 memory 控制器时退回到原 cgroup。
+
+    Args:
+        pid: 刚启动的训练进程 PID
+        root: 文件系统根目录
+        delegate: 是否尝试创建子 cgroup
+
+    Returns:
+        CgroupAccounting，cgroup v2 不可用时返回 None
+    """
+    parent = cgroup_path(pid, root)
+    if parent is None:
+        return None
+    if not delegate:
+        return CgroupAccounting(parent)
+
+    child = parent / f"hpc_run.{pid}"
+    try:
+        child.mkdir()
+    except OSError:
+        return CgroupAccounting(parent)
+    accounting = CgroupAccounting(child, owned=True)
+    try:
+        (child / "cgroup.procs").write_text(str(pid))
+        if accounting.has_memory():
+            return accounting
+        # 父 cgroup 没有向下启用 memory 控制器，移回原 cgroup
+        (parent / "cgroup.procs").write_text(str(pid))
+    except OSError:
+        pass
+    accounting.close()
+    return CgroupAccounting(parent)
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+检查点 I/O 观测模块
+监视检查点目录（inotify，不可用时轮询），记录每个检查点的大小和从第一次写入到关闭/重命名的耗时，
+计算有效写入带宽和检查点占总运行时间的比例，带宽相对本次运行基线明显下降时发出提醒
+"""
+import os
+import time
+import errno
+import select
+import struct
+import fnmatch
+import threading
+import statistics
+import ctypes
+import ctypes.util
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+@dataclass
+class CheckpointRecord:
+    """一次检查点写入"""
+    name: str
+    size_bytes: int
+    start: float                       # 第一次写入（Unix 时间戳）
+    end: float                         # 最后一次写入关闭或重命名
+    duration: float
+    bandwidth_mbps: Optional[float]    # 有效写入带宽（MB/s），耗时过短时为 None
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data["start"] = round(self.start, 3)
+        data["end"] = round(self.end, 3)
+        return data
+
+
+def entry_stat(path: Path) -> Tuple[int, float]:
+    """
+    检查点（文件或目录）的总大小和最后修改时间
+
+    Returns:
+        (字节数, 最大 mtime)
+    """
+    st = os.stat(path)
+    if not os.path.isdir(path):
+        return st.st_size, st.st_mtime
+    size, mtime = 0, st.st_mtime
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                file_st = os.stat(os.path.join(dirpath, filename))
+            except OSError:
+                continue
+            size += file_st.st_size
+            mtime = max(mtime, file_st.st_mtime)
+    return size, mtime
+
+
+class CheckpointTracker:
+    """按检查点目录下的顶层条目（文件或目录）汇总写入活动，静默 settle 秒后记为一次检查点"""
+
+    def __init__(self, directory: Path, pattern: str = "*", settle: float = 5.0,
+                 slow_factor: float = 0.5, baseline_count: int = 3, min_duration: float = 0.05,
+                 on_checkpoint: Optional[Callable[[CheckpointRecord], None]] = None,
+                 on_slow: Optional[Callable[[CheckpointRecord, float], None]] = None):
+        """
+        Args:
+            directory: 检查点目录
+            pattern: 只记录名称匹配该 glob 的条目
+            settle: 无写入活动多少秒后认为写入完成
+            slow_factor: 带宽低于基线的该比例时提醒
+            baseline_count: 用前几个检查点的带宽中位数作为基线
+            min_duration: 耗时低于该值（秒）时不计算带宽（多为轮询粒度或缓存写入）
+            on_checkpoint: 记录一个检查点后的回调
+            on_slow: 带宽下降时的回调，参数为 (检查点, 基线带宽)
+        """
+        self.directory = Path(directory)
+        self.pattern = pattern
+        self.settle = settle
+        self.slow_factor = slow_factor
+        self.baseline_count = baseline_count
+        self.min_duration = min_duration
+        self.on_checkpoint = on_checkpoint
+        self.on_slow = on_slow
+        self.records: List[CheckpointRecord] = []
+        self.baseline: Optional[float] = None
+        self.slow: List[Dict] = []
+        self._pending: Dict[str, List[float]] = {}   # 名称 -> [开始时间, 最后活动时间]
+        self._lock = threading.Lock()
+
+    def activity(self, name: str, now: float, start: Optional[float] = None):
+        """
+        记录顶层条目的一次写入活动
+
+        Args:
+            name: 顶层条目名称
+            now: 活动时间
+            start: 开始时间估计（默认等于 now）
+        """
+        with self._lock:
+            pending = self._pending.get(name)
+            if pending is None:
+                self._pending[name] = [now if start is None else min(start, now), now]
+            else:
+                pending[1] = max(pending[1], now)
+
+    def renamed(self, old: str, new: str, now: float):
+        """顶层条目被重命名（先写临时文件再重命名的保存方式），沿用原来的开始时间"""
+        with self._lock:
+            pending = self._pending.pop(old, None)
+            start = pending[0] if pending else now
+            existing = self._pending.get(new)
+            self._pending[new] = [min(start, existing[0]) if existing else start, now]
+
+    def removed(self, name: str) -> Optional[float]:
+        """
+        顶层条目被删除
+
+        Returns:
+            该条目正在写入时的开始时间，否则返回 None
+        """
+        with self._lock:
+            pending = self._pending.pop(name, None)
+        return pending[0] if pending else None
+
+    def flush(self, now: float, force: bool = False):
+        """
+        记录已静默的条目
+
+        Args:
+            now: 当前时间
+            force: 不等待静默，记录全部（停止监视时）
+        """
+        with self._lock:
+            done = [name for name, (_, last) in self._pending.items() if force or now - last >= self.settle]
+            finished = [(name, self._pending.pop(name)) for name in done]
+        for name, (start, last) in finished:
+            self._record(name, start, last)
+
+    def _record(self, name: str, start: float, last: float):
+        if not fnmatch.fnmatch(name, self.pattern):
+            return
+        try:
+            size, _ = entry_stat(self.directory / name)
+        except OSError:
+            return
+        end = last
+        duration = max(0.0, end - start)
+        bandwidth = size / 1024 / 1024 / duration if duration >= self.min_duration else None
+        record = CheckpointRecord(name=name, size_bytes=size, start=start, end=end,
+                                  duration=round(duration, 3),
+                                  bandwidth_mbps=round(bandwidth, 2) if bandwidth is not None else None)
+        self.records.append(record)
+        if self.on_checkpoint:
+            self.on_checkpoint(record)
+        if bandwidth is None:
+            return
+
+        measured = [r.bandwidth_mbps for r in self.records if r.bandwidth_mbps is not None]
+        if self.baseline is None:
+            if len(measured) >= self.baseline_count:
+                self.baseline = statistics.median(measured[:self.baseline_count])
+            return
+        if bandwidth < self.baseline * self.slow_factor:
+            self.slow.append({"name": name, "bandwidth_mbps": record.bandwidth_mbps,
+                              "baseline_mbps": round(self.baseline, 2)})
+            if self.on_slow:
+                self.on_slow(record, self.baseline)
+
+    def summary(self, runtime: Optional[float] = None, max_records: int = 50) -> Dict:
+        """
+        汇总检查点 I/O（写入完成标记）
+
+        Args:
+            runtime: 总运行时长（秒），用于计算检查点耗时占比
+            max_records: 最多保留的检查点明细条数（保留最后几个）
+        """
+        total_bytes = sum(r.size_bytes for r in self.records)
+        # 检查点可能异步保存而互相重叠，占比按时间区间的并集计算
+        busy, cursor = 0.0, None
+        for start, end in sorted((r.start, r.end) for r in self.records):
+            if cursor is None or start > cursor:
+                busy += end - start
+                cursor = end
+            elif end > cursor:
+                busy += end - cursor
+                cursor = end
+        measured = [r for r in self.records if r.bandwidth_mbps is not None]
+        measured_seconds = sum(r.duration for r in measured)
+        return {
+            "directory": str(self.directory),
+            "count": len(self.records),
+            "total_mb": round(total_bytes / 1024 / 1024, 2),
+            "total_seconds": round(busy, 2),
+            "mean_bandwidth_mbps": (round(sum(r.size_bytes for r in measured) / 1024 / 1024 / measured_seconds, 2)
+                                    if measured_seconds > 0 else None),
+            "baseline_mbps": round(self.baseline, 2) if self.baseline is not None else None,
+            "time_fraction": round(busy / runtime, 4) if runtime else None,
+            "slow": self.slow,
+            "records": [r.to_dict() for r in self.records[-max_records:]],
+        }
+
+
+class _Inotify:
+    """最小的 inotify 封装（通过 ctypes 调用 libc）"""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.fd = fd
+
+    def add_watch(self, path: Path, mask: int = _WATCH_MASK) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(str(path)), ctypes.c_uint32(mask))
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), str(path))
+        return wd
+
+    def read(self, timeout: float) -> List[Tuple[int, int, int, str]]:
+        """等待并读取事件，返回 (wd, mask, cookie, name) 列表"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        events, position = [], 0
+        while position + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, position)
+            position += _EVENT_HEADER.size
+            name = data[position:position + length].rstrip(b"\0").decode("utf-8", errors="replace")
+            position += length
+            events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class CheckpointWatcher:
+    """在后台线程中监视检查点目录"""
+
+    def __init__(self, tracker: CheckpointTracker, backend: str = "auto", poll_interval: float = 2.0):
+        """
+        Args:
+            tracker: 检查点汇总器
+            backend: "auto"（优先 inotify）、"inotify" 或 "poll"
+            poll_interval: 轮询间隔（秒），也是等待目录出现的间隔
+        """
+        self.tracker = tracker
+        self.directory = tracker.directory
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.active_backend: Optional[str] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="checkpoint-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> CheckpointTracker:
+        """停止监视，记录尚未静默的检查点"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.tracker.flush(time.time(), force=True)
+        return self.tracker
+
+    def _run(self):
+        # 目录通常由训练脚本在第一次保存时创建
+        while not self.directory.is_dir():
+            if self._stop_event.wait(self.poll_interval):
+                return
+        if self.backend in ("auto", "inotify"):
+            try:
+                inotify = _Inotify()
+            except (OSError, AttributeError) as e:
+                print(f"[训练包装器] inotify 不可用，改为轮询检查点目录: {e}")
+            else:
+                self.active_backend = "inotify"
+                try:
+                    self._run_inotify(inotify)
+                finally:
+                    inotify.close()
+                return
+        self.active_backend = "poll"
+        self._run_poll()
+
+    def _run_inotify(self, inotify: _Inotify):
+        watches: Dict[int, str] = {}     # wd -> 相对检查点目录的路径（"" 为检查点目录本身）
+        moves: Dict[int, str] = {}       # cookie -> 被移走的顶层条目名称
+
+        def _watch_tree(relative: str):
+            for dirpath, dirnames, _ in os.walk(self.directory / relative):
+                try:
+                    wd = inotify.add_watch(Path(dirpath))
+                except OSError:
+                    continue
+                relative_dir = os.path.relpath(dirpath, self.directory)
+                watches[wd] = "" if relative_dir == "." else relative_dir
+
+        _watch_tree("")
+        while not self._stop_event.is_set():
+            now = time.time()
+            for wd, mask, cookie, name in inotify.read(min(1.0, self.tracker.settle)):
+                if mask & IN_Q_OVERFLOW:
+                    continue
+                if mask & IN_IGNORED:
+                    watches.pop(wd, None)
+                    continue
+                parent = watches.get(wd)
+                if parent is None or not name:
+                    continue
+                relative = os.path.join(parent, name) if parent else name
+                top = relative.split(os.sep, 1)[0]
+                if mask & IN_CREATE and mask & IN_ISDIR:
+                    _watch_tree(relative)
+                if not parent and mask & IN_MOVED_FROM:
+                    moves[cookie] = top
+                elif not parent and mask & IN_MOVED_TO:
+                    old = moves.pop(cookie, None)
+                    if old is not None:
+                        self.tracker.renamed(old, top, now)
+                    else:
+                        self.tracker.activity(top, now)
+                    if mask & IN_ISDIR:
+                        _watch_tree(relative)
+                elif not parent and mask & IN_DELETE:
+                    self.tracker.removed(top)
+                elif mask & (IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO):
+                    self.tracker.activity(top, now)
+            self.tracker.flush(time.time())
+
+    def _run_poll(self):
+        previous: Dict[str, Tuple[int, float]] = {}
+        try:
+            for entry in os.scandir(self.directory):
+                previous[entry.name] = entry_stat(Path(entry.path))
+        except OSError:
+            pass
+        last_scan = time.time()
+        while not self._stop_event.wait(self.poll_interval):
+            now = time.time()
+            current: Dict[str, Tuple[int, float]] = {}
+            try:
+                entries = list(os.scandir(self.directory))
+            except OSError:
+                entries = []
+            for entry in entries:
+                try:
+                    current[entry.name] = entry_stat(Path(entry.path))
+                except OSError:
+                    continue
+            # 同一次扫描中消失的正在写入的条目和新出现的条目视为重命名，沿用原来的开始时间
+            vanished = []
+            for name in sorted(set(previous) - set(current)):
+                start = self.tracker.removed(name)
+                if start is not None:
+                    vanished.append(start)
+            for name, (size, mtime) in sorted(current.items()):
+                old = previous.get(name)
+                if old == (size, mtime):
+                    continue
+                # 其他变化都在上一次扫描之后才开始
+                start = vanished.pop(0) if old is None and vanished else last_scan
+                self.tracker.activity(name, min(now, max(mtime, last_scan)), start=start)
+            previous, last_scan = current, now
+            self.tracker.flush(now)
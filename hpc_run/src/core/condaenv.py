@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Conda 环境解析模块
+解析 conda 环境的解释器路径和激活后的环境变量（只解析一次，按 conda-meta 修改时间缓存），
+包装器据此直接在该环境中启动训练命令，不经过 conda run（启动慢，且默认缓冲子进程输出）
+"""
+import os
+import json
+import shlex
+import shutil
+import hashlib
+import subprocess
+from pathlib import Path
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Mapping, Optional
+
+
+DEFAULT_CACHE_DIR = "~/.hpc_run/conda"
+
+# 激活前后比较时忽略的变量（由 shell 自身维护）
+_IGNORED_VARS = {"_", "SHLVL", "PWD", "OLDPWD"}
+
+
+@dataclass
+class CondaEnv:
+    """已解析的 conda 环境"""
+    name: str
+    prefix: str
+    python: Optional[str]
+    meta_mtime: float
+    path_prepend: List[str] = field(default_factory=list)   # 激活后加到 PATH 前面的目录
+    set_vars: Dict[str, str] = field(default_factory=dict)  # 激活后新增或修改的变量（PATH 除外）
+    unset_vars: List[str] = field(default_factory=list)     # 激活后删除的变量
+    source: str = "conda"                                  # conda（完整激活）或 fallback（仅设置基本变量）
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    def apply(self, environ: Optional[Mapping[str, str]] = None) -> Dict[str, str]:
+        """
+        生成激活该环境后的环境变量
+
+        Args:
+            environ: 基础环境变量（默认 os.environ）
+
+        Returns:
+            新的环境变量字典
+        """
+        env = dict(os.environ if environ is None else environ)
+        for name in self.unset_vars:
+            env.pop(name, None)
+        env.update(self.set_vars)
+        current = [entry for entry in env.get("PATH", "").split(os.pathsep)
+                   if entry and entry not in self.path_prepend]
+        env["PATH"] = os.pathsep.join(self.path_prepend + current)
+        return env
+
+    def resolve_command(self, command_parts: List[str], environ: Mapping[str, str]) -> List[str]:
+        """
+        把命令中的可执行文件解析为环境中的路径（python/python3 直接使用环境的解释器）
+
+        Args:
+            command_parts: 命令参数列表
+            environ: apply() 返回的环境变量
+
+        Returns:
+            新的命令参数列表
+        """
+        parts = list(command_parts)
+        if parts[0] in ("python", "python3") and self.python:
+            parts[0] = self.python
+        elif os.sep not in parts[0]:
+            parts[0] = shutil.which(parts[0], path=environ.get("PATH")) or parts[0]
+        return parts
+
+
+def conda_executable(environ: Optional[Mapping[str, str]] = None) -> Optional[str]:
+    """查找 conda 可执行文件（优先 CONDA_EXE）"""
+    environ = os.environ if environ is None else environ
+    if environ.get("CONDA_EXE") and os.path.exists(environ["CONDA_EXE"]):
+        return environ["CONDA_EXE"]
+    return shutil.which("conda") or shutil.which("mamba") or shutil.which("micromamba")
+
+
+def find_env_prefix(name: str, environ: Optional[Mapping[str, str]] = None) -> Path:
+    """
+    按名称（或路径）查找 conda 环境目录
+
+    Args:
+        name: 环境名称，或环境目录路径
+        environ: 环境变量（默认 os.environ）
+
+    Returns:
+        环境目录
+
+    Raises:
+        FileNotFoundError: 找不到环境
+    """
+    environ = os.environ if environ is None else environ
+    if os.sep in name or name.startswith("~"):
+        prefix = Path(os.path.expanduser(name))
+        if (prefix / "conda-meta").is_dir():
+            return prefix
+        raise FileNotFoundError(f"不是 conda 环境目录: {prefix}")
+
+    candidates = []
+    conda = conda_executable(environ)
+    bases = []
+    if conda:
+        bases.append(Path(conda).resolve().parent.parent)
+    for var in ("CONDA_ROOT", "MAMBA_ROOT_PREFIX"):
+        if environ.get(var):
+            bases.append(Path(environ[var]))
+    if name == "base":
+        candidates.extend(bases)
+    for entry in (environ.get("CONDA_ENVS_PATH") or environ.get("CONDA_ENVS_DIRS") or "").split(os.pathsep):
+        if entry:
+            candidates.append(Path(os.path.expanduser(entry)) / name)
+    candidates.extend(base / "envs" / name for base in bases)
+    candidates.append(Path.home() / ".conda" / "envs" / name)
+    # conda 会把创建过的环境登记在 ~/.conda/environments.txt
+    try:
+        for line in (Path.home() / ".conda" / "environments.txt").read_text().splitlines():
+            if line.strip() and Path(line.strip()).name == name:
+                candidates.append(Path(line.strip()))
+    except OSError:
+        pass
+
+    for prefix in candidates:
+        if (prefix / "conda-meta").is_dir():
+            return prefix
+    raise FileNotFoundError(f"找不到 conda 环境: {name}")
+
+
+def _activation_delta(prefix: Path, conda: str, environ: Mapping[str, str], timeout: float):
+    """在 shell 中执行 conda 激活脚本（包括 activate.d 钩子），比较激活前后的环境变量"""
+    activate = f"{shlex.quote(conda)} shell.posix activate {shlex.quote(str(prefix))}"
+    script = f'eval "$({activate})" >/dev/null && env -0'
+    output = subprocess.run(["bash", "-c", script], capture_output=True, timeout=timeout,
+                            check=True, env=dict(environ)).stdout
+    activated = {}
+    for item in output.decode("utf-8", errors="replace").split("\0"):
+        name, sep, value = item.partition("=")
+        if sep and name not in _IGNORED_VARS:
+            activated[name] = value
+
+    original = {name: value for name, value in environ.items() if name not in _IGNORED_VARS}
+    original_path = original.get("PATH", "").split(os.pathsep)
+    path_prepend = [entry for entry in activated.get("PATH", "").split(os.pathsep)
+                    if entry and entry not in original_path]
+    set_vars = {name: value for name, value in activated.items()
+                if name != "PATH" and original.get(name) != value}
+    unset_vars = [name for name in original if name not in activated and name != "PATH"]
+    return path_prepend, set_vars, unset_vars
+
+
+def resolve_conda_env(name: str, cache_dir: str = DEFAULT_CACHE_DIR,
+                      environ: Optional[Mapping[str, str]] = None, timeout: float = 60.0) -> CondaEnv:
+    """
+    解析 conda 环境（缓存有效时直接返回）
+
+    缓存以环境目录下 conda-meta 的修改时间为键：安装或删除包后会自动重新解析。
+
+    Args:
+        name: 环境名称或路径
+        cache_dir: 缓存目录
+        environ: 环境变量（默认 os.environ）
+        timeout: 执行激活脚本的超时时间（秒）
+
+    Returns:
+        CondaEnv
+
+    Raises:
+        FileNotFoundError: 找不到环境
+    """
+    environ = os.environ if environ is None else environ
+    prefix = find_env_prefix(name, environ)
+    meta_mtime = (prefix / "conda-meta").stat().st_mtime
+    cache_file = (Path(os.path.expanduser(cache_dir))
+                  / f"{hashlib.sha1(str(prefix).encode()).hexdigest()[:16]}.json")
+
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            cached = CondaEnv(**json.load(f))
+        if cached.prefix == str(prefix) and cached.meta_mtime == meta_mtime:
+            return cached
+    except (OSError, ValueError, TypeError):
+        pass
+
+    python = prefix / "bin" / "python"
+    env = CondaEnv(name=name, prefix=str(prefix), python=str(python) if python.exists() else None,
+                   meta_mtime=meta_mtime)
+    conda = conda_executable(environ)
+    try:
+        if not conda:
+            raise FileNotFoundError("找不到 conda 可执行文件")
+        env.path_prepend, env.set_vars, env.unset_vars = _activation_delta(prefix, conda, environ, timeout)
+    except (OSError, subprocess.SubprocessError) as e:
+        # 无法执行激活脚本时只设置基本变量（不包括 activate.d 钩子设置的变量）
+        print(f"[警告] 执行 conda 激活脚本失败，只设置基本环境变量（不缓存）: {e}")
+        env.source = "fallback"
+        env.path_prepend = [str(prefix / "bin")]
+        env.set_vars = {"CONDA_PREFIX": str(prefix), "CONDA_DEFAULT_ENV": name}
+        return env
+
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_file.with_name(f".{cache_file.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(env.to_dict(), f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, cache_file)
+    return env
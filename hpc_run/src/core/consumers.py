@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+输出消费者模块
+执行器对子进程管道只做一次分块读取，再把每个片段（以及折叠进度条后的完整行）依次交给各个消费者：
+日志写入、指标提取、最近输出缓存等
+"""
+import re
+from collections import deque
+from typing import Callable, Dict, IO, List, Optional
+
+
+class OutputConsumer:
+    """输出消费者基类（按需覆盖）"""
+
+    def on_output(self, chunk: str, lines: List[str], now: float):
+        """
+        处理一段输出
+
+        Args:
+            chunk: 从管道读取的原始文本片段（包含 \\r 和 ANSI 序列）
+            lines: 本片段中结束的完整行（进度条重绘已折叠）
+            now: 读取时的单调时钟时间
+        """
+
+    def on_exit(self, return_code: int):
+        """子进程退出（输出已全部处理）"""
+
+
+class LoggerConsumer(OutputConsumer):
+    """把输出交给 Logger（实时打印到控制台并保存）"""
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def on_output(self, chunk: str, lines: List[str], now: float):
+        self.logger.write_child(chunk)
+
+    def on_exit(self, return_code: int):
+        if hasattr(self.logger, "flush_child"):
+            self.logger.flush_child()
+
+
+class LogFileConsumer(OutputConsumer):
+    """把完整行写入日志文件（普通文件或 FramedLogWriter）"""
+
+    def __init__(self, writer: IO[str], close: bool = False):
+        """
+        Args:
+            writer: 可写的文本文件对象
+            close: 子进程退出时是否关闭文件
+        """
+        self.writer = writer
+        self.close_on_exit = close
+
+    def on_output(self, chunk: str, lines: List[str], now: float):
+        if lines:
+            self.writer.write("".join(lines))
+            self.writer.flush()
+
+    def on_exit(self, return_code: int):
+        if self.close_on_exit:
+            self.writer.close()
+
+
+class TailConsumer(OutputConsumer):
+    """保留最近 n 行输出（内存占用固定）"""
+
+    def __init__(self, n: int = 50):
+        self._lines: deque = deque(maxlen=n)
+
+    def on_output(self, chunk: str, lines: List[str], now: float):
+        self._lines.extend(lines)
+
+    def lines(self) -> List[str]:
+        """最近的输出行"""
+        return list(self._lines)
+
+
+# 形如 loss=0.123、lr: 1e-4、acc 0.9 的键值对
+DEFAULT_METRIC_PATTERN = r"\b([A-Za-z_][\w/.-]*)\s*[=:]\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\b"
+
+
+class MetricConsumer(OutputConsumer):
+    """从输出行中提取数值指标，保留每个指标的最新值"""
+
+    def __init__(self, pattern: str = DEFAULT_METRIC_PATTERN, keys: Optional[List[str]] = None,
+                 callback: Optional[Callable[[Dict[str, float], float], None]] = None):
+        """
+        Args:
+            pattern: 指标正则（第一个捕获组为名称，第二个为数值）
+            keys: 只保留这些指标（可选）
+            callback: 每行提取到指标时调用 callback(metrics, now)
+        """
+        self._regex = re.compile(pattern)
+        self.keys = set(keys) if keys else None
+        self.callback = callback
+        self.latest: Dict[str, float] = {}
+
+    def on_output(self, chunk: str, lines: List[str], now: float):
+        for line in lines:
+            metrics = {}
+            for name, value in self._regex.findall(line):
+                if self.keys is None or name in self.keys:
+                    try:
+                        metrics[name] = float(value)
+                    except ValueError:
+                        continue
+            if metrics:
+                self.latest.update(metrics)
+                if self.callback:
+                    self.callback(metrics, now)
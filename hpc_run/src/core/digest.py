@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+进度摘要模块
+从事件流增量汇总训练进度（步数、步速、GPU 使用率），按令牌桶限制各通知通道的发送频率
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+class TokenBucket:
+    """令牌桶限流器"""
+
+    def __init__(self, per_hour: float, burst: int = 1, clock=time.monotonic):
+        """
+        初始化令牌桶
+
+        Args:
+            per_hour: 每小时补充的令牌数（即长期平均的最大发送次数）
+            burst: 桶容量（允许的突发发送次数）
+            clock: 时钟函数（便于测试时替换）
+        """
+        self.rate = max(0.0, float(per_hour)) / 3600.0
+        self.capacity = max(1, int(burst))
+        self._clock = clock
+        self._tokens = float(self.capacity)
+        self._updated = clock()
+
+    def take(self) -> bool:
+        """
+        尝试取出一个令牌
+
+        Returns:
+            取到令牌时返回 True（允许发送），否则返回 False
+        """
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+
+@dataclass
+class SourceProgress:
+    """单个事件来源（一个作业或一个 rank）的进度"""
+    label: str
+    steps: Optional[int] = None
+    total_steps: Optional[int] = None
+    gpu: Optional[float] = None
+    idle_seconds: Optional[float] = None
+    mono: Optional[float] = None         # 最近一次 stats 事件的单调时钟时间
+    exited: bool = False
+    # 上一次生成摘要时的 (mono, steps)，用于计算两次摘要之间的步速
+    _mark: Optional[tuple] = field(default=None, repr=False)
+
+    def ingest(self, event: Dict):
+        """吸收一条事件"""
+        if event.get('type') == 'stats':
+            self.mono = event.get('mono')
+            if event.get('steps') is not None:
+                self.steps = event['steps']
+            if event.get('total_steps'):
+                self.total_steps = event['total_steps']
+            if event.get('gpu') is not None:
+                self.gpu = event['gpu']
+            self.idle_seconds = event.get('idle_seconds')
+        elif event.get('type') == 'exit':
+            self.exited = True
+        elif event.get('type') == 'spawn':
+            # 自动重启后训练进程重新运行；恢复训练的步号可能回退到检查点，步速从新进程的第一条统计重新计算
+            self.exited = False
+            self._mark = None
+
+    def snapshot(self) -> Dict:
+        """
+        生成本来源的进度条目，并把当前状态记为下一次计算步速的起点
+
+        Returns:
+            进度条目字典
+        """
+        rate = None
+        if self._mark and self.mono is not None and self.steps is not None:
+            mark_mono, mark_steps = self._mark
+            if self.mono > mark_mono and mark_steps is not None and self.steps >= mark_steps:
+                rate = (self.steps - mark_steps) / (self.mono - mark_mono)
+        if self.mono is not None:
+            self._mark = (self.mono, self.steps)
+        return {
+            "label": self.label,
+            "steps": self.steps,
+            "total_steps": self.total_steps,
+            "steps_per_second": rate,
+            "gpu": self.gpu,
+            "idle_seconds": self.idle_seconds,
+            "exited": self.exited,
+        }
+
+
+class ProgressDigest:
+    """
+    汇总多个事件来源的进度
+
+    只处理增量读取到的事件，生成摘要的开销与日志大小无关。
+    """
+
+    def __init__(self):
+        self.sources: Dict[str, SourceProgress] = {}
+        self._updated = False
+
+    def source(self, label: str) -> SourceProgress:
+        """获取（或创建）指定来源的进度"""
+        if label not in self.sources:
+            self.sources[label] = SourceProgress(label)
+        return self.sources[label]
+
+    def ingest(self, label: str, events: List[Dict]):
+        """
+        吸收某个来源新读取到的事件
+
+        Args:
+            label: 来源名称（如 "rank 0"）
+            events: 事件列表
+        """
+        progress = self.source(label)
+        for event in events:
+            progress.ingest(event)
+            if event.get('type') == 'stats':
+                self._updated = True
+
+    @property
+    def has_updates(self) -> bool:
+        """自上一次生成摘要以来是否有新的统计事件"""
+        return self._updated
+
+    def entries(self) -> List[Dict]:
+        """
+        生成各来源的进度条目（合并为一条消息发送）
+
+        Returns:
+            进度条目列表（按来源加入的顺序）
+        """
+        self._updated = False
+        return [progress.snapshot() for progress in self.sources.values() if progress.mono is not None]
+
+
+def build_rate_limits(notifier_config: dict, channels) -> Dict[str, TokenBucket]:
+    """
+    按配置为每个通知通道创建令牌桶
+
+    默认值取自 notification.progress.rate_limit，可在通道自己的配置段中用 rate_limit 覆盖
+    （如 notification.xxtui.rate_limit）。
+
+    Args:
+        notifier_config: 配置中的 notification 段
+        channels: 通道名称列表
+
+    Returns:
+        通道名称 -> 令牌桶
+    """
+    defaults = dict((notifier_config.get('progress') or {}).get('rate_limit') or {})
+    buckets = {}
+    for name in channels:
+        options = dict(defaults)
+        options.update((notifier_config.get(name) or {}).get('rate_limit') or {})
+        buckets[name] = TokenBucket(float(options.get('per_hour', 2)), int(options.get('burst', 1)))
+    return buckets
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+能耗统计模块
+对 GPU 功耗（nvidia-smi power.draw）按采样时间积分，并读取 CPU 封装的 RAPL 能量计数
+（/sys/class/powercap/intel-rapl:N/energy_uj，处理计数器回绕），汇总总能耗、平均和峰值功率以及每步能耗
+"""
+import math
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+
+# powercap 目录（相对于文件系统根目录）
+POWERCAP_DIR = "sys/class/powercap"
+
+
+@dataclass
+class RaplZone:
+    """一个 RAPL 能量域（CPU 封装）"""
+    name: str
+    path: Path
+    max_range_uj: int
+    last_uj: Optional[int] = None
+
+    def read(self) -> int:
+        """读取累计能量（微焦）"""
+        return int((self.path / "energy_uj").read_text().strip())
+
+
+def find_rapl_zones(root: Path = Path("/")) -> List[RaplZone]:
+    """
+    查找 CPU 封装的 RAPL 能量域
+
+    只统计顶层的 package 域：core/uncore 等子域包含在封装能量中，psys 包含整个平台，计入会重复统计。
+
+    Args:
+        root: 文件系统根目录（测试时可指向伪造的 sysfs）
+
+    Returns:
+        能量域列表（无 RAPL 时为空）
+
+    Raises:
+        PermissionError: energy_uj 不可读（较新的内核默认只允许 root 读取）
+    """
+    zones = []
+    for path in sorted((root / POWERCAP_DIR).glob("intel-rapl:*")):
+        if path.name.count(":") != 1:
+            continue
+        try:
+            name = (path / "name").read_text().strip()
+            max_range = int((path / "max_energy_range_uj").read_text().strip())
+        except (OSError, ValueError):
+            continue
+        if not name.startswith("package"):
+            continue
+        zone = RaplZone(name=name, path=path, max_range_uj=max_range)
+        zone.last_uj = zone.read()
+        zones.append(zone)
+    return zones
+
+
+def counter_delta(previous: int, current: int, max_range: int) -> int:
+    """
+    计算累计计数器的增量（current 小于 previous 时视为回绕了一次）
+
+    Args:
+        previous: 上一次读数
+        current: 本次读数
+        max_range: 计数器最大值（max_energy_range_uj）
+
+    Returns:
+        增量
+    """
+    if current >= previous:
+        return current - previous
+    return current + max_range - previous
+
+
+class EnergyMeter:
+    """按采样累计 GPU 和 CPU 能耗"""
+
+    def __init__(self, root: Path = Path("/"), rapl: bool = True):
+        """
+        Args:
+            root: 文件系统根目录（测试时可指向伪造的 sysfs）
+            rapl: 是否读取 CPU 的 RAPL 计数
+        """
+        self.zones: List[RaplZone] = []
+        self.rapl_error: Optional[str] = None
+        if rapl:
+            try:
+                self.zones = find_rapl_zones(Path(root))
+            except (OSError, ValueError) as e:
+                self.rapl_error = f"RAPL 计数不可读: {e}"
+        self.gpu_joules = 0.0
+        self.cpu_joules = 0.0
+        self.peak_watts = 0.0
+        self.first_time: Optional[float] = None
+        self.last_time: Optional[float] = None
+        self._gpu_prev: Optional[float] = None
+        self._gpu_seconds = 0.0
+        self._cpu_seconds = 0.0
+        self._rapl_time: Optional[float] = None
+
+    def observe(self, t: float, gpu_watts: Optional[float]):
+        """
+        记录一次采样
+
+        Args:
+            t: 采样时间（Unix 时间戳）
+            gpu_watts: 所统计 GPU 的功耗之和（瓦），无 GPU 或读取失败时为 None
+        """
+        dt = t - self.last_time if self.last_time is not None else 0.0
+        if self.first_time is None:
+            self.first_time = t
+        self.last_time = t
+
+        # GPU 功耗是瞬时值，按相邻两次采样的梯形面积积分
+        if gpu_watts is not None and self._gpu_prev is not None and dt > 0:
+            self.gpu_joules += (self._gpu_prev + gpu_watts) / 2 * dt
+            self._gpu_seconds += dt
+        self._gpu_prev = gpu_watts
+
+        # RAPL 是累计计数，直接取差值；某次读取失败时下一次读数的差值覆盖这段时间
+        cpu_watts = None
+        if self.zones:
+            try:
+                readings = [zone.read() for zone in self.zones]
+            except (OSError, ValueError) as e:
+                self.rapl_error = f"RAPL 计数读取失败: {e}"
+            else:
+                joules = sum(counter_delta(zone.last_uj, current, zone.max_range_uj)
+                             for zone, current in zip(self.zones, readings)) / 1e6
+                for zone, current in zip(self.zones, readings):
+                    zone.last_uj = current
+                rapl_dt = t - self._rapl_time if self._rapl_time is not None else 0.0
+                self._rapl_time = t
+                if rapl_dt > 0:
+                    self.cpu_joules += joules
+                    self._cpu_seconds += rapl_dt
+                    cpu_watts = joules / rapl_dt
+
+        if gpu_watts is not None or cpu_watts is not None:
+            self.peak_watts = max(self.peak_watts, (gpu_watts or 0.0) + (cpu_watts or 0.0))
+
+    def summary(self, steps: Optional[int] = None) -> Optional[Dict]:
+        """
+        汇总能耗（写入完成标记）
+
+        Args:
+            steps: 训练步数（已知时计算每步能耗）
+
+        Returns:
+            总能耗（kWh）、GPU/CPU 分项、平均和峰值功率等，没有任何功耗数据时返回 None
+        """
+        if not self._gpu_seconds and not self._cpu_seconds:
+            return {"error": self.rapl_error} if self.rapl_error else None
+        total = self.gpu_joules + self.cpu_joules
+        duration = (self.last_time or 0.0) - (self.first_time or 0.0)
+        summary = {
+            "total_kwh": round(total / 3.6e6, 6),
+            "gpu_kwh": round(self.gpu_joules / 3.6e6, 6) if self._gpu_seconds else None,
+            "cpu_kwh": round(self.cpu_joules / 3.6e6, 6) if self._cpu_seconds else None,
+            "avg_watts": round(total / duration, 1) if duration > 0 else None,
+            "peak_watts": round(self.peak_watts, 1),
+            "duration_seconds": round(duration, 1),
+            "rapl_zones": [zone.name for zone in self.zones],
+        }
+        if self.rapl_error:
+            summary["error"] = self.rapl_error
+        if steps:
+            summary["steps"] = steps
+            summary["joules_per_step"] = round(total / steps, 2)
+        return summary
+
+
+def sum_gpu_power(gpus: List[Dict]) -> Optional[float]:
+    """
+    GPU 功耗之和
+
+    Args:
+        gpus: 每块 GPU 一个字典（power_w 字段，读取失败时为 NaN）
+
+    Returns:
+        功耗之和（瓦），没有有效读数时返回 None
+    """
+    values = [gpu.get("power_w") for gpu in gpus]
+    values = [value for value in values if value is not None and not math.isnan(value)]
+    return sum(values) if values else None
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+错误索引模块
+包装器写日志的同时维护一个很小的旁路索引文件，记录匹配错误/警告特征的行在原始日志中的字节偏移量；
+训练失败时报告据此直接定位第一个和最后一个错误并截取上下文，无需扫描整个日志
+"""
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from .logstore import read_log_range
+
+
+ERROR_INDEX_SUFFIX = ".errors"
+
+# 默认错误特征。每个分支都以固定字符开头，合并后的正则可以先按首字符快速跳过无关位置
+# （以 \w*、^\s* 等开头的分支会使每个位置都要完整尝试匹配，扫描慢数倍）
+DEFAULT_ERROR_PATTERNS = [
+    r"Traceback \(most recent call last\)",
+    r"CUDA out of memory",
+    r"OutOfMemoryError",
+    r"NCCL error",
+    r"CUDA error",
+    r"Segmentation fault",
+    r"core dumped",
+    r"Error: ",
+    r"Exception: ",
+]
+
+# 默认警告特征
+DEFAULT_WARNING_PATTERNS = [
+    r"Warning: ",
+    r"WARN(?:ING)?\b",
+]
+
+
+class ErrorIndexWriter:
+    """扫描写入日志的文本，把匹配行的位置追加到索引文件"""
+
+    def __init__(self, path: Union[str, Path], error_patterns: Optional[List[str]] = None,
+                 warning_patterns: Optional[List[str]] = None, max_entries: int = 1000,
+                 spacing_after_cap: int = 1 << 20):
+        """
+        Args:
+            path: 索引文件路径
+            error_patterns: 错误特征正则列表（默认 DEFAULT_ERROR_PATTERNS）
+            warning_patterns: 警告特征正则列表（默认 DEFAULT_WARNING_PATTERNS）
+            max_entries: 每个级别完整记录的条数
+            spacing_after_cap: 达到条数上限后，同一级别两条记录之间至少间隔的字节数
+                （保证能找到较晚出现的错误，同时限制索引大小）
+
+        Raises:
+            re.error: 正则无效
+        """
+        self.path = Path(path)
+        error_patterns = DEFAULT_ERROR_PATTERNS if error_patterns is None else error_patterns
+        warning_patterns = DEFAULT_WARNING_PATTERNS if warning_patterns is None else warning_patterns
+        # 所有特征合并为一个预编译的多分支正则，每段文本只扫描一遍。不用命名分组区分级别：
+        # 外层分组会关闭按首字符跳过的优化，匹配到的行很少，命中后再判断级别即可
+        patterns = list(error_patterns) + list(warning_patterns)
+        self._regex = re.compile("|".join(f"(?:{p})" for p in patterns), re.MULTILINE) if patterns else None
+        self._error_regex = (re.compile("|".join(f"(?:{p})" for p in error_patterns), re.MULTILINE)
+                             if error_patterns else None)
+        self.max_entries = max_entries
+        self.spacing_after_cap = spacing_after_cap
+        self.counts = {"error": 0, "warning": 0}
+        self.first: Dict[str, Dict] = {}
+        self.last: Dict[str, Dict] = {}
+        self._written = {"error": 0, "warning": 0}
+        self._last_written_offset = {"error": -1, "warning": -1}
+        self._lines = 0
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def scan(self, text: str, offset: int):
+        """
+        扫描一段完整行
+
+        Args:
+            text: 若干完整行（以换行结尾）
+            offset: 该段文本第一个字节在原始日志中的偏移量
+        """
+        if self._regex is None or not text:
+            self._lines += text.count("\n")
+            return
+        last_line_start = -1
+        for match in self._regex.finditer(text):
+            line_start = text.rfind("\n", 0, match.start()) + 1
+            if line_start == last_line_start:
+                continue
+            last_line_start = line_start
+            line_end = text.find("\n", match.end())
+            line_end = len(text) if line_end < 0 else line_end
+            is_error = self._error_regex is not None and self._error_regex.match(text, match.start())
+            entry = {
+                "level": "error" if is_error else "warning",
+                "offset": offset + len(text[:line_start].encode("utf-8", errors="replace")),
+                "line": self._lines + text.count("\n", 0, line_start) + 1,
+                "text": text[line_start:line_end].strip()[:200],
+            }
+            self._record(entry)
+        self._lines += text.count("\n")
+        self._file.flush()
+
+    def _record(self, entry: Dict):
+        level = entry["level"]
+        self.counts[level] += 1
+        self.first.setdefault(level, entry)
+        self.last[level] = entry
+        if (self._written[level] >= self.max_entries
+                and entry["offset"] - self._last_written_offset[level] < self.spacing_after_cap):
+            return
+        self._written[level] += 1
+        self._last_written_offset[level] = entry["offset"]
+        self._file.write(f"{entry['offset']}\t{level}\t{entry['line']}\t{entry['text']}\n")
+
+    def close(self):
+        """写入最后一条未记录的错误并关闭索引文件"""
+        for level, entry in self.last.items():
+            if entry["offset"] != self._last_written_offset[level]:
+                self._file.write(f"{entry['offset']}\t{level}\t{entry['line']}\t{entry['text']}\n")
+        self._file.close()
+
+    def summary(self) -> Dict:
+        """
+        汇总（写入完成标记）
+
+        Returns:
+            索引路径、各级别条数、第一个和最后一个错误
+        """
+        return {
+            "path": str(self.path),
+            "errors": self.counts["error"],
+            "warnings": self.counts["warning"],
+            "first_error": self.first.get("error"),
+            "last_error": self.last.get("error"),
+        }
+
+
+def read_error_index(path: Union[str, Path], level: Optional[str] = None) -> List[Dict]:
+    """
+    读取错误索引
+
+    Args:
+        path: 索引文件路径
+        level: 只返回该级别（error 或 warning）
+
+    Returns:
+        条目列表（按偏移量排序）
+    """
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t", 3)
+            if len(parts) != 4 or not line.endswith("\n"):
+                continue
+            if level and parts[1] != level:
+                continue
+            entries.append({"offset": int(parts[0]), "level": parts[1], "line": int(parts[2]), "text": parts[3]})
+    return sorted(entries, key=lambda entry: entry["offset"])
+
+
+def read_error_context(log_path: Union[str, Path], offset: int, before: int = 5, after: int = 30,
+                       window: int = 64 * 1024) -> List[str]:
+    """
+    读取日志中某一行及其前后几行
+
+    Args:
+        log_path: 日志文件路径
+        offset: 该行起始字节的原始偏移量
+        before: 之前的行数
+        after: 之后的行数（包含该行）
+        window: 前后各读取的最大字节数
+
+    Returns:
+        行列表（保留换行符）
+    """
+    start = max(0, offset - window)
+    data = read_log_range(log_path, start, offset - start + window)
+    head, tail = data[:offset - start], data[offset - start:]
+    head_lines = head.decode("utf-8", errors="replace").splitlines(keepends=True)
+    tail_lines = tail.decode("utf-8", errors="replace").splitlines(keepends=True)
+    # 窗口起点可能落在一行中间，丢弃不完整的第一行
+    if start > 0 and head_lines:
+        head_lines = head_lines[1:]
+    return (head_lines[-before:] if before else []) + tail_lines[:after]
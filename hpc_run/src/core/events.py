@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+事件流模块
+包装器以 JSON Lines 格式追加写入结构化事件（启动、子进程、周期统计、信号、退出、标记文件），
+监控程序和分析脚本可按字节偏移量增量读取
+"""
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+
+# 事件格式版本：新增字段不改版本，删除或修改已有字段的含义时递增
+SCHEMA_VERSION = 1
+
+# 这些事件写入后立即刷新到磁盘，其余事件（如周期统计）按时间批量刷新
+_FLUSH_EVENTS = {"start", "spawn", "signal", "exit", "marker", "release"}
+
+
+class EventWriter:
+    """结构化事件写入器"""
+
+    def __init__(self, path: Union[str, Path], flush_interval: float = 5.0):
+        """
+        初始化事件写入器
+
+        Args:
+            path: 事件文件路径（.jsonl）
+            flush_interval: 非关键事件的最长刷新间隔（秒）
+        """
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        # 追加模式 + 每个事件一次 write，保证行完整
+        self._file = open(self.path, "ab", buffering=64 * 1024)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._last_flush = time.monotonic()
+
+    def emit(self, event_type: str, **fields) -> Dict:
+        """
+        写入一条事件
+
+        Args:
+            event_type: 事件类型
+            **fields: 事件字段
+
+        Returns:
+            写入的事件字典
+        """
+        with self._lock:
+            if self._file.closed:
+                return {}
+            self._seq += 1
+            mono = time.monotonic()
+            event = {"v": SCHEMA_VERSION, "seq": self._seq, "type": event_type,
+                     "wall": round(time.time(), 6), "mono": round(mono, 6)}
+            event.update(fields)
+            self._file.write((json.dumps(event, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+            if event_type in _FLUSH_EVENTS or mono - self._last_flush >= self.flush_interval:
+                self._file.flush()
+                self._last_flush = mono
+        return event
+
+    def close(self):
+        """刷新并关闭事件文件"""
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def read_events(path: Union[str, Path], offset: int = 0,
+                max_bytes: Optional[int] = None) -> Tuple[List[Dict], int]:
+    """
+    从指定字节偏移量增量读取事件
+
+    只解析完整的行，写到一半的最后一行留到下次读取。
+
+    Args:
+        path: 事件文件路径
+        offset: 上次读取结束的字节偏移量
+        max_bytes: 单次最多读取的字节数（可选）
+
+    Returns:
+        (事件列表, 新的字节偏移量)
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read() if max_bytes is None else f.read(max_bytes)
+
+    end = data.rfind(b"\n")
+    if end < 0:
+        return [], offset
+
+    events = []
+    for line in data[:end].split(b"\n"):
+        if not line.strip():
+            continue
+        try:
+            events.append(json.loads(line))
+        except ValueError:
+            continue
+    return events, offset + end + 1
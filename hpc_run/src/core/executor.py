@@ -285,17 +285,28 @@
 """
 进程执行器模块
 负责启动和管理子进程，捕获输出
+
+执行器不修改全局状态（每个子进程单独指定工作目录），同时提供同步接口 run() 和
+asyncio 接口 run_async()；同一个事件循环中可以并发运行多个子进程。
 """
-import subprocess
 import os
-import time
 import sys
+import time
+import shlex
+import codecs
+import asyncio
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 # 导入工具类
 sys.path.append(str(Path(__file__).parent.parent))
 from utils.config_loader import ConfigLoader, Logger
+from utils.terminal import ProgressLineFilter
+
+try:
+    from .consumers import OutputConsumer, LoggerConsumer
+except ImportError:  # 作为顶层模块导入时
+    from core.consumers import OutputConsumer, LoggerConsumer
 
 
 # ----------------------------
@@ -309,63 +320,115 @@ class ProcessExecutor:
         初始化执行器
         
         Args:
-            config: 配置字典，必须包含 'work_dir' 和 'command' 字段
+            config: 配置字典，必须包含 'work_dir' 和 'command' 字段，
+                可选 'env'（追加的环境变量）
             logger: 日志记录器（可选）
         """
         self.work_dir = config["work_dir"]
         self.command = config["command"]
+        self.env = config.get("env") or {}
         self.logger = logger or Logger()
         self.process_info = {}
+        self.process: Optional[asyncio.subprocess.Process] = None
+
+    def build_argv(self) -> List[str]:
+        """
+        解析命令（支持引号），python 命令自动添加 -u 禁用输出缓冲
+        
+        Returns:
+            参数列表
+        """
+        parts = shlex.split(self.command) if isinstance(self.command, str) else list(self.command)
+        if parts and os.path.basename(parts[0]) in ("python", "python3") and "-u" not in parts:
+            parts.insert(1, "-u")
+        return parts
 
-    def run(self, save_log: bool = False, log_path: Optional[str] = None) -> Dict:
+    async def run_async(self, consumers: Optional[List[OutputConsumer]] = None,
+                        chunk_size: int = 64 * 1024) -> Dict:
         """
-        执行子进程命令
+        在当前事件循环中执行子进程
+        
+        管道只读取一次，每个片段依次交给所有消费者。
         
         Args:
-            save_log: 是否保存日志到文件
-            log_path: 日志文件路径或目录
+            consumers: 输出消费者列表（默认交给 Logger 打印并保存）
+            chunk_size: 单次读取的最大字节数
             
         Returns:
             进程信息字典
         """
-        os.chdir(self.work_dir)
-        parts = self.command.split()
-        if parts[0] == "python" and "-u" not in parts:
-            parts.insert(1, "-u")
+        consumers = consumers if consumers is not None else [LoggerConsumer(self.logger)]
+        argv = self.build_argv()
+        env = dict(os.environ, **{key: str(value) for key, value in self.env.items()}) if self.env else None
 
         start_time = time.time()
         start_str = time.strftime("%Y-%m-%d %H:%M:%S")
-
-        process = subprocess.Popen(
-            parts,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
+        self.process = process = await asyncio.create_subprocess_exec(
+            *argv,
+            cwd=self.work_dir,
+            env=env,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
         )
 
-        # self.logger.info(f"先进入工作目录 {self.work_dir}，启动 PID={process.pid} 进程")
-        # self.logger.info(f"执行命令：{self.command}\n")
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        line_filter = ProgressLineFilter()
+
+        def _dispatch(chunk: str, lines: List[str]):
+            now = time.monotonic()
+            for consumer in consumers:
+                consumer.on_output(chunk, lines, now)
 
-        if process.stdout:
-            for line in process.stdout:
-                self.logger.write_child(line)
+        while True:
+            data = await process.stdout.read(chunk_size)
+            if not data:
+                break
+            chunk = decoder.decode(data)
+            if chunk:
+                _dispatch(chunk, line_filter.feed(chunk))
+        tail = decoder.decode(b"", final=True)
+        lines = line_filter.feed(tail) + line_filter.flush()
+        if tail or lines:
+            _dispatch(tail, lines)
 
-        process.wait()
+        return_code = await process.wait()
+        for consumer in consumers:
+            consumer.on_exit(return_code)
         end_time = time.time()
-        end_str = time.strftime("%Y-%m-%d %H:%M:%S")
 
-        self.process_info = {
+        process_info = {
             "pid": process.pid,
             "command": self.command,
             "work_dir": self.work_dir,
             "start_time": start_str,
-            "end_time": end_str,
+            "end_time": time.strftime("%Y-%m-%d %H:%M:%S"),
             "elapsed": round(end_time - start_time, 2),
-            "return_code": process.returncode,
+            "return_code": return_code,
         }
+        self.process_info = process_info
+        return process_info
+
+    def run(self, save_log: bool = False, log_path: Optional[str] = None,
+            consumers: Optional[List[OutputConsumer]] = None) -> Dict:
+        """
+        执行子进程命令（阻塞直到结束）
+        
+        Args:
+            save_log: 是否保存日志到文件
+            log_path: 日志文件路径或目录
+            consumers: 输出消费者列表（默认交给 Logger 打印并保存）
+            
+        Returns:
+            进程信息字典
+        """
+        process_info = asyncio.run(self.run_async(consumers))
 
         if save_log and log_path:
-            self.logger.save(log_path, self.process_info)
+            self.logger.save(log_path, process_info)
+
+        return process_info
 
-        return self.process_info
\ No newline at end of file
+    def terminate(self):
+        """终止正在运行的子进程"""
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+日志跟踪模块
+在登录节点增量读取训练日志（普通文本或分帧压缩日志）：保持文件打开并按大块读取新内容，
+只在没有新数据时才低频 stat 文件名检查轮转（inode 变化）和截断（大小变小），避免频繁访问共享存储的元数据服务器
+"""
+import os
+import json
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from .logstore import INDEX_SUFFIX, compression_of, _decompress, _read_index
+
+
+# 保存跟踪进度的文件（位于工作目录，下次跟踪同一日志时从这里继续）
+FOLLOW_STATE_FILE = ".train_follow.json"
+
+
+def tail_offset(path: Union[str, Path], n: int, block_size: int = 64 * 1024) -> int:
+    """
+    日志最后 n 行的起始偏移量（未压缩字节）
+
+    Args:
+        path: 日志文件路径
+        n: 行数
+        block_size: 普通文本日志每次向前读取的字节数
+
+    Returns:
+        偏移量（行数不足 n 时为 0）
+    """
+    path = Path(path)
+    compress = compression_of(path)
+    if compress:
+        index_path = path.with_name(path.name + INDEX_SUFFIX)
+        entries = _read_index(index_path) if index_path.exists() else []
+        newlines = 0
+        with open(path, "rb") as f:
+            for offset, length, raw_offset, _ in reversed(entries):
+                f.seek(offset)
+                raw = _decompress(f.read(length), compress)
+                position = _nth_newline_from_end(raw, n + 1 - newlines)
+                if position is not None:
+                    return raw_offset + position + 1
+                newlines += raw.count(b"\n")
+        return 0
+
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        # 最后一行以换行结尾时，换行本身不算一行的开始
+        newlines_needed = n + 1
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size)
+            found = _nth_newline_from_end(data, newlines_needed)
+            if found is not None:
+                return position + found + 1
+            newlines_needed -= data.count(b"\n")
+    return 0
+
+
+def _nth_newline_from_end(data: bytes, n: int) -> Optional[int]:
+    """data 中从末尾数第 n 个换行符的位置，不足 n 个时返回 None"""
+    position = len(data)
+    for _ in range(n):
+        position = data.rfind(b"\n", 0, position)
+        if position < 0:
+            return None
+    return position
+
+
+class LogFollower:
+    """增量读取一个日志文件，offset 始终是未压缩内容中的字节偏移量"""
+
+    def __init__(self, path: Union[str, Path], offset: int = 0, chunk_size: int = 1 << 20,
+                 max_read: int = 16 << 20):
+        """
+        Args:
+            path: 日志文件路径
+            offset: 开始读取的偏移量
+            chunk_size: 每次 read 的字节数
+            max_read: 每次 read_new 最多返回的字节数（积压很多时分批输出）
+
+        Raises:
+            OSError: 日志无法打开
+        """
+        self.path = Path(path)
+        self.offset = offset
+        self.chunk_size = chunk_size
+        self.max_read = max_read
+        self.compress = compression_of(self.path)
+        self._file = open(self.path, "rb")
+        self.inode = os.fstat(self._file.fileno()).st_ino
+        self._index = None
+        self._index_pending = b""
+        if self.compress:
+            self._index = open(self.path.with_name(self.path.name + INDEX_SUFFIX), "rb")
+        else:
+            self._file.seek(offset)
+
+    def read_new(self) -> bytes:
+        """
+        读取新写入的内容（不做任何元数据操作）
+
+        Returns:
+            新内容，没有新内容时返回空字节串
+        """
+        if self.compress:
+            return self._read_frames()
+        chunks = []
+        total = 0
+        while total < self.max_read:
+            data = self._file.read(self.chunk_size)
+            if not data:
+                break
+            chunks.append(data)
+            total += len(data)
+            if len(data) < self.chunk_size:
+                break
+        self.offset += total
+        return b"".join(chunks)
+
+    def _read_frames(self) -> bytes:
+        """分帧压缩日志：读取索引新增的行，解压对应的帧"""
+        self._index_pending += self._index.read()
+        lines = self._index_pending.split(b"\n")
+        self._index_pending = lines.pop()
+        chunks = []
+        for line in lines:
+            parts = line.split(b"\t")
+            if len(parts) != 4:
+                continue
+            offset, length, raw_offset, raw_length = (int(x) for x in parts)
+            if raw_offset + raw_length <= self.offset:
+                continue
+            self._file.seek(offset)
+            raw = _decompress(self._file.read(length), self.compress)
+            chunks.append(raw[max(0, self.offset - raw_offset):])
+            self.offset = raw_offset + raw_length
+        return b"".join(chunks)
+
+    def check(self) -> Optional[str]:
+        """
+        检查日志是否被轮转或截断（一次 stat 文件名和一次 fstat）
+
+        Returns:
+            "rotated"（文件名指向了新文件或已被删除）、"truncated"（文件变短）或 None
+        """
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return "rotated"
+        if current.st_ino != self.inode:
+            return "rotated"
+        if self.compress:
+            if self._index.tell() > os.fstat(self._index.fileno()).st_size:
+                return "truncated"
+        elif os.fstat(self._file.fileno()).st_size < self._file.tell():
+            return "truncated"
+        return None
+
+    def rewind(self):
+        """从头重新读取（日志被截断后使用）"""
+        self.offset = 0
+        self._file.seek(0)
+        if self._index:
+            self._index.seek(0)
+            self._index_pending = b""
+
+    def close(self):
+        self._file.close()
+        if self._index:
+            self._index.close()
+
+
+def load_follow_state(work_dir: Path) -> Dict:
+    """读取上次跟踪保存的进度（log_file、inode、offset），不存在或损坏时返回空字典"""
+    try:
+        with open(Path(work_dir) / FOLLOW_STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_follow_state(work_dir: Path, follower: LogFollower):
+    """保存跟踪进度（工作目录不可写时忽略）"""
+    path = Path(work_dir) / FOLLOW_STATE_FILE
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"log_file": str(follower.path), "inode": follower.inode, "offset": follower.offset}, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
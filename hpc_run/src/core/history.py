@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+运行历史模块
+将每次完成的训练持久化到本地 SQLite 数据库，支持按命令指纹查询历史运行时长
+"""
+import json
+import time
+import hashlib
+import sqlite3
+import statistics
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    fingerprint   TEXT    NOT NULL,
+    work_dir      TEXT    NOT NULL,
+    command       TEXT    NOT NULL,
+    start_ts      REAL,
+    end_ts        REAL    NOT NULL,
+    elapsed       REAL    NOT NULL,
+    return_code   INTEGER,
+    cpu_avg       REAL,
+    gpu_avg       REAL,
+    max_memory_mb REAL,
+    resources     TEXT
+);
+-- 覆盖索引：中位数查询只需扫描索引即可完成，不回表
+CREATE INDEX IF NOT EXISTS idx_runs_fp_time ON runs (fingerprint, return_code, end_ts, elapsed);
+CREATE INDEX IF NOT EXISTS idx_runs_workdir_time ON runs (work_dir, end_ts);
+CREATE INDEX IF NOT EXISTS idx_runs_time ON runs (end_ts);
+"""
+
+
+def command_fingerprint(command: str) -> str:
+    """
+    计算命令指纹（忽略多余空白）
+
+    Args:
+        command: 训练命令
+
+    Returns:
+        16 位十六进制指纹
+    """
+    normalized = " ".join((command or "").split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class RunHistory:
+    """训练运行历史存储"""
+
+    def __init__(self, db_path: Union[str, Path]):
+        """
+        初始化历史存储
+
+        Args:
+            db_path: SQLite 数据库文件路径（目录不存在时自动创建）
+        """
+        self.db_path = Path(db_path).expanduser()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        """关闭数据库连接"""
+        self._conn.close()
+
+    def record(self, completion_info: Dict) -> int:
+        """
+        记录一次完成的训练
+
+        Args:
+            completion_info: 完成标记文件内容（.train_complete.json）
+
+        Returns:
+            新记录的 ID
+        """
+        command = completion_info.get("command") or ""
+        elapsed = float(completion_info.get("elapsed_seconds") or 0.0)
+        end_ts = float(completion_info.get("timestamp") or time.time())
+        start_ts = completion_info.get("start_timestamp")
+        if start_ts is None:
+            start_ts = end_ts - elapsed
+        resources = completion_info.get("resources") or {}
+
+        cursor = self._conn.execute(
+            "INSERT INTO runs (fingerprint, work_dir, command, start_ts, end_ts, elapsed, "
+            "return_code, cpu_avg, gpu_avg, max_memory_mb, resources) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                command_fingerprint(command),
+                completion_info.get("work_dir") or "",
+                command,
+                start_ts,
+                end_ts,
+                elapsed,
+                completion_info.get("return_code"),
+                resources.get("cpu_avg"),
+                resources.get("gpu_avg"),
+                resources.get("max_memory_mb"),
+                json.dumps(resources, ensure_ascii=False) if resources else None,
+            ),
+        )
+        self._conn.commit()
+        return cursor.lastrowid
+
+    def recent_runtimes(self, fingerprint: str, limit: int = 20) -> List[float]:
+        """
+        查询某命令最近若干次成功运行的时长
+
+        Args:
+            fingerprint: 命令指纹
+            limit: 最多返回的记录数
+
+        Returns:
+            运行时长列表（秒），按结束时间倒序
+        """
+        rows = self._conn.execute(
+            "SELECT elapsed FROM runs WHERE fingerprint = ? AND return_code = 0 "
+            "ORDER BY end_ts DESC LIMIT ?",
+            (fingerprint, limit),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def median_runtime(self, fingerprint: str, limit: int = 20) -> Optional[float]:
+        """
+        查询某命令最近若干次成功运行时长的中位数
+
+        Args:
+            fingerprint: 命令指纹
+            limit: 参与统计的最近记录数
+
+        Returns:
+            中位数（秒），无历史记录时返回 None
+        """
+        runtimes = self.recent_runtimes(fingerprint, limit)
+        return statistics.median(runtimes) if runtimes else None
+
+    def recent_runs(self, work_dir: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """
+        查询最近的运行记录
+
+        Args:
+            work_dir: 仅返回该工作目录下的记录（可选）
+            limit: 最多返回的记录数
+
+        Returns:
+            运行记录字典列表，按结束时间倒序
+        """
+        columns = ("fingerprint", "work_dir", "command", "start_ts", "end_ts",
+                   "elapsed", "return_code", "cpu_avg", "gpu_avg", "max_memory_mb")
+        sql = f"SELECT {', '.join(columns)} FROM runs"
+        params: tuple = ()
+        if work_dir:
+            sql += " WHERE work_dir = ?"
+            params = (work_dir,)
+        sql += " ORDER BY end_ts DESC LIMIT ?"
+        rows = self._conn.execute(sql, params + (limit,)).fetchall()
+        return [dict(zip(columns, row)) for row in rows]
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+日志存储模块
+支持边写边压缩的分帧日志：日志由一系列可独立解压的压缩帧（gzip member 或 zstd frame）组成，
+并附带记录各帧偏移量的索引文件，读取日志末尾时只需解压最后几帧
+"""
+import io
+import os
+import gzip
+import time
+import threading
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:  # zstd 为可选依赖
+    zstandard = None
+
+
+INDEX_SUFFIX = ".idx"
+COMPRESS_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def resolve_compression(compress: Union[str, bool, None]) -> Optional[str]:
+    """
+    解析日志压缩配置
+
+    Args:
+        compress: 配置值，可为 false/none、gzip、zstd 或 auto（有 zstandard 时用 zstd，否则 gzip）
+
+    Returns:
+        压缩算法名称，不压缩时返回 None
+    """
+    if compress in (None, False) or str(compress).lower() in ("", "false", "none", "off"):
+        return None
+    compress = "auto" if compress is True else str(compress).lower()
+    if compress == "auto":
+        return "zstd" if zstandard is not None else "gzip"
+    if compress == "zstd" and zstandard is None:
+        print("[警告] 未安装 zstandard，日志压缩回退为 gzip")
+        return "gzip"
+    if compress not in COMPRESS_SUFFIXES:
+        raise ValueError(f"不支持的日志压缩算法: {compress}")
+    return compress
+
+
+def compression_of(path: Union[str, Path]) -> Optional[str]:
+    """根据文件后缀判断日志压缩算法"""
+    suffix = Path(path).suffix
+    for name, ext in COMPRESS_SUFFIXES.items():
+        if suffix == ext:
+            return name
+    return None
+
+
+class FramedLogWriter:
+    """分帧压缩日志写入器，按大小或时间策略将缓冲区压缩为独立帧追加到文件"""
+
+    def __init__(self, path: Union[str, Path], compress: str = "gzip",
+                 flush_bytes: int = 1 << 20, flush_interval: float = 30.0, level: Optional[int] = None):
+        """
+        初始化写入器
+
+        Args:
+            path: 压缩日志文件路径
+            compress: 压缩算法（gzip 或 zstd）
+            flush_bytes: 缓冲区达到该大小（字节，未压缩）时写出一帧
+            flush_interval: 距上次写出超过该时间（秒）时写出一帧
+            level: 压缩级别（默认 gzip 6，zstd 3）
+        """
+        self.path = Path(path)
+        self.index_path = self.path.with_name(self.path.name + INDEX_SUFFIX)
+        self.compress = compress
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+
+        if compress == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level or 3)
+            self._compress_frame = self._compressor.compress
+        else:
+            gzip_level = level or 6
+            self._compress_frame = lambda data: gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+        self._file = open(self.path, "ab")
+        self._index = open(self.index_path, "a", encoding="utf-8")
+        self._offset = self._file.tell()
+        self._raw_offset = 0
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+        # 输出停滞时也按时间策略写出缓冲内容
+        self._timer = threading.Thread(target=self._flush_loop, name="log-flusher", daemon=True)
+        self._timer.start()
+
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+
+    def write(self, text: str):
+        """
+        写入文本（先进入缓冲区）
+
+        Args:
+            text: 日志文本
+        """
+        data = text.encode("utf-8", errors="replace")
+        with self._lock:
+            self._buffer.append(data)
+            self._buffered += len(data)
+            if self._buffered >= self.flush_bytes:
+                self._write_frame()
+
+    def tell(self) -> int:
+        """已写入的未压缩字节数（即下一个字节在原始日志中的偏移量）"""
+        with self._lock:
+            return self._raw_offset + self._buffered
+
+    def flush(self):
+        """按时间策略写出缓冲区（与普通文件对象接口保持一致）"""
+        with self._lock:
+            if self._buffered and time.monotonic() - self._last_flush >= self.flush_interval:
+                self._write_frame()
+
+    def close(self):
+        """写出剩余内容并关闭文件"""
+        self._closed.set()
+        self._timer.join(timeout=1)
+        with self._lock:
+            self._write_frame()
+            self._file.close()
+            self._index.close()
+
+    def _flush_loop(self):
+        """后台定时写出"""
+        while not self._closed.wait(min(self.flush_interval, 1.0)):
+            self.flush()
+
+    def _write_frame(self):
+        """将缓冲区压缩为一帧并追加到文件（调用方需持有锁）"""
+        self._last_flush = time.monotonic()
+        if not self._buffered:
+            return
+        raw = b"".join(self._buffer)
+        frame = self._compress_frame(raw)
+        self._file.write(frame)
+        self._file.flush()
+        # 索引格式：压缩偏移 压缩长度 原始偏移 原始长度
+        self._index.write(f"{self._offset}\t{len(frame)}\t{self._raw_offset}\t{len(raw)}\n")
+        self._index.flush()
+        self._offset += len(frame)
+        self._raw_offset += len(raw)
+        self.raw_bytes += len(raw)
+        self.compressed_bytes += len(frame)
+        self._buffer = []
+        self._buffered = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_log_writer(path: Union[str, Path], compress: Optional[str] = None,
+                    flush_bytes: int = 1 << 20, flush_interval: float = 30.0):
+    """
+    打开日志写入器
+
+    Args:
+        path: 日志文件路径（压缩时自动追加 .gz/.zst 后缀）
+        compress: 压缩算法，None 表示写普通文本
+        flush_bytes: 压缩帧大小（字节）
+        flush_interval: 压缩帧最长写出间隔（秒）
+
+    Returns:
+        (写入器, 实际日志文件路径)
+    """
+    path = Path(path)
+    if not compress:
+        return open(path, "w", encoding="utf-8"), path
+    path = path.with_name(path.name + COMPRESS_SUFFIXES[compress])
+    return FramedLogWriter(path, compress, flush_bytes, flush_interval), path
+
+
+def _decompress(data: bytes, compress: str) -> bytes:
+    """解压一个或多个连续的压缩帧"""
+    if compress == "zstd":
+        if zstandard is None:
+            raise RuntimeError("读取 zstd 日志需要安装 zstandard")
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True)
+        return reader.read()
+    return gzip.decompress(data)
+
+
+def _read_index(index_path: Path) -> List[Tuple[int, int, int, int]]:
+    """读取帧索引（忽略写到一半的最后一行）"""
+    entries = []
+    with open(index_path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split("\t")
+            if len(parts) == 4 and line.endswith("\n"):
+                entries.append(tuple(int(x) for x in parts))
+    return entries
+
+
+def _tail_plain(path: Path, n: int, block_size: int = 64 * 1024) -> List[str]:
+    """从文件末尾向前按块读取，直到凑够 n 行"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        while position > 0 and data.count(b"\n") <= n:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+    lines = data.decode("utf-8", errors="replace").splitlines(keepends=True)
+    return lines[-n:]
+
+
+def read_log_tail(path: Union[str, Path], n: int = 50) -> List[str]:
+    """
+    读取日志最后 n 行，读取成本与日志总大小无关
+
+    普通文本日志从末尾向前读取；分帧压缩日志借助索引只解压最后几帧，
+    索引缺失时回退为完整解压。
+
+    Args:
+        path: 日志文件路径
+        n: 行数
+
+    Returns:
+        行列表（保留换行符）
+    """
+    path = Path(path)
+    compress = compression_of(path)
+    if not compress:
+        return _tail_plain(path, n)
+
+    index_path = path.with_name(path.name + INDEX_SUFFIX)
+    if not index_path.exists():
+        with open(path, "rb") as f:
+            text = _decompress(f.read(), compress).decode("utf-8", errors="replace")
+        return text.splitlines(keepends=True)[-n:]
+
+    entries = _read_index(index_path)
+    chunks: List[bytes] = []
+    newlines = 0
+    with open(path, "rb") as f:
+        for offset, length, _, _ in reversed(entries):
+            f.seek(offset)
+            raw = _decompress(f.read(length), compress)
+            chunks.insert(0, raw)
+            newlines += raw.count(b"\n")
+            if newlines > n:
+                break
+    text = b"".join(chunks).decode("utf-8", errors="replace")
+    return text.splitlines(keepends=True)[-n:]
+
+
+def read_log_range(path: Union[str, Path], start: int, length: int) -> bytes:
+    """
+    读取日志中一段未压缩字节（按原始偏移量）
+
+    普通文本日志直接定位读取；分帧压缩日志借助索引只解压覆盖该范围的帧，
+    索引缺失时回退为完整解压。
+
+    Args:
+        path: 日志文件路径
+        start: 原始偏移量
+        length: 读取长度
+
+    Returns:
+        字节串（超出日志末尾的部分被截断）
+    """
+    path = Path(path)
+    start = max(0, start)
+    compress = compression_of(path)
+    if not compress:
+        with open(path, "rb") as f:
+            f.seek(start)
+            return f.read(length)
+
+    index_path = path.with_name(path.name + INDEX_SUFFIX)
+    if not index_path.exists():
+        with open(path, "rb") as f:
+            return _decompress(f.read(), compress)[start:start + length]
+
+    chunks: List[bytes] = []
+    first_raw = None
+    with open(path, "rb") as f:
+        for offset, frame_length, raw_offset, raw_length in _read_index(index_path):
+            if raw_offset + raw_length <= start:
+                continue
+            if raw_offset >= start + length:
+                break
+            f.seek(offset)
+            chunks.append(_decompress(f.read(frame_length), compress))
+            if first_raw is None:
+                first_raw = raw_offset
+    if first_raw is None:
+        return b""
+    data = b"".join(chunks)
+    return data[start - first_raw:start - first_raw + length]
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+内存压力跟踪模块
+确定训练可用的有效内存上限（cgroup memory.max 或调度器分配），读取 PSI 内存压力，
+用线性趋势估算距离 OOM 的时间并提前预警；训练被 SIGKILL 时据此判断是否为 OOM
+"""
+import os
+from pathlib import Path
+from collections import deque
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import psutil
+
+from .cgroup import cgroup_path, read_keyed
+from .monitor import BoundedTimeline
+
+
+def cgroup_memory_limit(path: Optional[Path], root: Path = Path("/")) -> Optional[int]:
+    """
+    cgroup 及其所有祖先中最小的 memory.max
+
+    Args:
+        path: 进程所在的 cgroup 目录
+        root: 文件系统根目录
+
+    Returns:
+        上限（字节），未设置上限（均为 "max"）时返回 None
+    """
+    if path is None:
+        return None
+    mount = (root / "sys/fs/cgroup").resolve()
+    limits = []
+    current = Path(path).resolve()
+    while True:
+        try:
+            value = (current / "memory.max").read_text().strip()
+        except OSError:
+            value = ""
+        if value.isdigit():
+            limits.append(int(value))
+        if current == mount or current.parent == current:
+            break
+        current = current.parent
+    return min(limits) if limits else None
+
+
+def scheduler_memory_limit(environ: Optional[Mapping[str, str]] = None) -> Optional[int]:
+    """
+    调度器分配的内存（Slurm 的 SLURM_MEM_PER_NODE 或 SLURM_MEM_PER_CPU × 本节点 CPU 数）
+
+    Returns:
+        上限（字节），未知时返回 None
+    """
+    environ = os.environ if environ is None else environ
+    per_node = environ.get("SLURM_MEM_PER_NODE", "")
+    if per_node.isdigit() and int(per_node) > 0:
+        return int(per_node) * 1024 * 1024
+    per_cpu = environ.get("SLURM_MEM_PER_CPU", "")
+    cpus = (environ.get("SLURM_CPUS_ON_NODE") or "").split("(")[0]
+    if per_cpu.isdigit() and cpus.isdigit():
+        return int(per_cpu) * int(cpus) * 1024 * 1024
+    return None
+
+
+def effective_memory_limit(cgroup: Optional[Path], environ: Optional[Mapping[str, str]] = None,
+                           root: Path = Path("/")) -> Tuple[Optional[int], str]:
+    """
+    训练可用的有效内存上限
+
+    Args:
+        cgroup: 进程所在的 cgroup 目录（可选）
+        environ: 环境变量（默认 os.environ）
+        root: 文件系统根目录
+
+    Returns:
+        (上限字节数, 来源)；来源为 cgroup、scheduler 或 node（节点物理内存）
+    """
+    limit = cgroup_memory_limit(cgroup, root)
+    if limit is not None:
+        return limit, "cgroup"
+    limit = scheduler_memory_limit(environ)
+    if limit is not None:
+        return limit, "scheduler"
+    try:
+        return psutil.virtual_memory().total, "node"
+    except (AttributeError, OSError):
+        return None, "unknown"
+
+
+def read_psi(path: Path) -> Optional[Dict[str, float]]:
+    """
+    读取 PSI 压力文件（memory.pressure 或 /proc/pressure/memory）
+
+    Args:
+        path: 压力文件路径
+
+    Returns:
+        some_avg10、some_avg60、full_avg10、full_avg60 等（百分比），不可读时返回 None
+    """
+    try:
+        text = path.read_text()
+    except OSError:
+        return None
+    values = {}
+    for line in text.splitlines():
+        kind, *items = line.split()
+        for item in items:
+            key, _, value = item.partition("=")
+            if key.startswith("avg"):
+                try:
+                    values[f"{kind}_{key}"] = float(value)
+                except ValueError:
+                    continue
+    return values or None
+
+
+def read_oom_kills(cgroup: Optional[Path]) -> Optional[int]:
+    """读取 cgroup memory.events 中的 oom_kill 计数（包含子 cgroup），不可读时返回 None"""
+    if cgroup is None:
+        return None
+    try:
+        return read_keyed(cgroup / "memory.events").get("oom_kill")
+    except OSError:
+        return None
+
+
+class MemoryTrend:
+    """滑动窗口内内存使用量的线性趋势"""
+
+    def __init__(self, window: float = 300.0):
+        """
+        Args:
+            window: 拟合使用的时间窗口（秒）
+        """
+        self.window = window
+        self._points: deque = deque()
+
+    def add(self, t: float, value: float):
+        self._points.append((t, value))
+        while self._points and t - self._points[0][0] > self.window:
+            self._points.popleft()
+
+    def slope(self) -> Optional[float]:
+        """最小二乘斜率（单位/秒），点数不足或时间跨度过短时返回 None"""
+        n = len(self._points)
+        if n < 3 or self._points[-1][0] - self._points[0][0] < self.window / 10:
+            return None
+        mean_t = sum(t for t, _ in self._points) / n
+        mean_v = sum(v for _, v in self._points) / n
+        var_t = sum((t - mean_t) ** 2 for t, _ in self._points)
+        if var_t <= 0:
+            return None
+        return sum((t - mean_t) * (v - mean_v) for t, v in self._points) / var_t
+
+
+class MemoryWatch:
+    """跟踪内存使用相对有效上限的变化，估算 OOM 时间并产生预警"""
+
+    def __init__(self, limit: Optional[int], source: str = "unknown", cgroup: Optional[Path] = None,
+                 warn_seconds: float = 1800.0, warn_fraction: float = 0.9, window: float = 300.0,
+                 psi_path: Optional[Path] = None):
+        """
+        Args:
+            limit: 有效内存上限（字节）
+            source: 上限来源（cgroup / scheduler / node）
+            cgroup: 进程所在的 cgroup 目录（读取 PSI 和 OOM 计数）
+            warn_seconds: 预计在该时间（秒）内达到上限时预警
+            warn_fraction: 使用量超过上限的该比例时预警
+            window: 趋势拟合窗口（秒）
+            psi_path: PSI 文件路径（默认 cgroup 的 memory.pressure，其次 /proc/pressure/memory）
+        """
+        self.limit = limit
+        self.source = source
+        self.cgroup = cgroup
+        self.warn_seconds = warn_seconds
+        self.warn_fraction = warn_fraction
+        self.trend = MemoryTrend(window)
+        if psi_path is None:
+            candidates = ([cgroup / "memory.pressure"] if cgroup else []) + [Path("/proc/pressure/memory")]
+            psi_path = next((path for path in candidates if path.exists()), None)
+        self.psi_path = psi_path
+        self.timeline = BoundedTimeline(max_points=240)
+        self.peak = 0.0
+        self.peak_time: Optional[float] = None
+        self.psi_max: Optional[float] = None
+        self.warnings: List[Dict] = []
+        self._armed = True
+        self.oom_kills_at_start = read_oom_kills(cgroup)
+
+    @classmethod
+    def for_process(cls, pid: int, root: Path = Path("/"), environ: Optional[Mapping[str, str]] = None,
+                    **kwargs) -> "MemoryWatch":
+        """
+        按进程所在的 cgroup 和调度器环境变量创建
+
+        Args:
+            pid: 训练进程 PID
+            root: 文件系统根目录（测试时可指向伪造的 procfs/cgroupfs）
+            environ: 环境变量（默认 os.environ）
+            **kwargs: 传给构造函数的其他参数
+        """
+        cgroup = cgroup_path(pid, root)
+        limit, source = effective_memory_limit(cgroup, environ, root)
+        return cls(limit, source, cgroup, **kwargs)
+
+    def observe(self, t: float, used: float) -> Optional[Dict]:
+        """
+        记录一次内存采样
+
+        Args:
+            t: 采样时间（Unix 时间戳）
+            used: 内存使用量（字节）
+
+        Returns:
+            新产生的预警（字典），否则返回 None；使用量回落到预警线以下且不再增长后才会再次预警
+        """
+        psi = read_psi(self.psi_path) if self.psi_path else None
+        some_avg10 = psi.get("some_avg10") if psi else None
+        if some_avg10 is not None:
+            self.psi_max = max(self.psi_max or 0.0, some_avg10)
+        if used >= self.peak:
+            self.peak, self.peak_time = used, t
+        self.trend.add(t, used)
+        self.timeline.append({"t": round(t, 1), "mem_mb": round(used / 1024 / 1024, 1),
+                              "psi": some_avg10})
+        if not self.limit:
+            return None
+
+        fraction = used / self.limit
+        slope = self.trend.slope()
+        eta = (self.limit - used) / slope if slope and slope > 0 and used < self.limit else None
+        near = fraction >= self.warn_fraction
+        soon = eta is not None and eta <= self.warn_seconds
+        if not (near or soon):
+            if fraction < self.warn_fraction * 0.9 and not (slope and slope > 0):
+                self._armed = True
+            return None
+        if not self._armed:
+            return None
+        self._armed = False
+        warning = {
+            "t": round(t, 1),
+            "used_mb": round(used / 1024 / 1024, 1),
+            "limit_mb": round(self.limit / 1024 / 1024, 1),
+            "fraction": round(fraction, 3),
+            "growth_mb_per_min": round(slope * 60 / 1024 / 1024, 2) if slope else None,
+            "eta_seconds": round(eta) if eta is not None else None,
+            "psi_some_avg10": some_avg10,
+            "limit_source": self.source,
+        }
+        self.warnings.append(warning)
+        return warning
+
+    def oom_killed(self, return_code: Optional[int]) -> bool:
+        """
+        判断训练进程是否被 OOM killer 杀死
+
+        cgroup 的 oom_kill 计数增加时直接确认；否则进程被 SIGKILL（或 shell 返回 137）且
+        峰值内存达到上限的 warn_fraction 时推断为 OOM。
+        """
+        if return_code not in (-9, 137):
+            return False
+        kills = read_oom_kills(self.cgroup)
+        if kills is not None and self.oom_kills_at_start is not None and kills > self.oom_kills_at_start:
+            return True
+        return bool(self.limit and self.peak >= self.limit * self.warn_fraction)
+
+    def summary(self, return_code: Optional[int] = None) -> Dict:
+        """
+        汇总内存压力信息（写入完成标记）
+
+        Args:
+            return_code: 训练进程退出码（用于判断是否 OOM）
+        """
+        summary = {
+            "limit_mb": round(self.limit / 1024 / 1024, 1) if self.limit else None,
+            "limit_source": self.source,
+            "psi_some_avg10_max": self.psi_max,
+            "warnings": self.warnings,
+            "oom_killed": self.oom_killed(return_code),
+        }
+        # 没有任何读数时（如进程在第一次采样前退出）不写峰值，避免报告中出现 0 MB
+        if self.peak_time is not None:
+            summary["peak_mb"] = round(self.peak / 1024 / 1024, 1)
+            summary["peak_fraction"] = round(self.peak / self.limit, 3) if self.limit else None
+            summary["peak_time"] = self.peak_time
+        if summary["oom_killed"]:
+            summary["timeline"] = self.timeline.points
+        return summary
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+指标导出模块
+按 OpenMetrics / Prometheus 文本格式导出作业状态：包装器定期把本作业的指标写入 node_exporter 的
+textfile collector 目录（.prom 文件，原子替换），监控程序通过 HTTP /metrics 提供所有被监控作业的汇总。
+每个时间序列的文本行只在值变化时重新生成，渲染时拼接缓存的文本，作业很多时抓取的开销仍然很小
+"""
+import os
+import math
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 秒级耗时的默认直方图分桶（通知发送、轮询耗时）
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 作业所处阶段（hpc_run_job_phase 中当前阶段为 1，其余为 0）
+JOB_PHASES = ("starting", "running", "restarting", "completed", "failed", "releasing")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _format_value(value: float) -> str:
+    """格式化样本值（整数不带小数点，NaN/Inf 按规范书写）"""
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer()):
+        return str(int(value))
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: str = "") -> str:
+    """格式化标签集合（extra 为追加的已格式化标签，如直方图的 le）"""
+    parts = [f'{name}="{_escape(value)}"' for name, value in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, "" if value is None else str(value)) for name, value in labels.items()))
+
+
+class MetricFamily:
+    """一个指标族（gauge、counter 或 histogram）及其所有时间序列"""
+
+    def __init__(self, name: str, kind: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Args:
+            name: 指标名（counter 不含 _total 后缀）
+            kind: gauge、counter 或 histogram
+            help_text: 说明
+            buckets: histogram 的分桶上界（升序，不含 +Inf）
+        """
+        if kind not in ("gauge", "counter", "histogram"):
+            raise ValueError(f"未知的指标类型: {kind}")
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelKey, object] = {}
+        # 每个序列渲染好的文本行，值变化时失效
+        self._lines: Dict[LabelKey, str] = {}
+        self._block: Optional[str] = None
+
+    def set(self, value: float, **labels):
+        """设置 gauge 的值，或用累计值更新 counter（值不变时不触发重新渲染）"""
+        key = _label_key(labels)
+        if self._values.get(key) == value:
+            return
+        self._values[key] = value
+        self._invalidate(key)
+
+    def inc(self, amount: float = 1.0, **labels):
+        """counter 增加 amount"""
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+        self._invalidate(key)
+
+    def observe(self, value: float, **labels):
+        """histogram 记录一个观测值"""
+        key = _label_key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = {"counts": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state["counts"][i] += 1
+        state["count"] += 1
+        state["sum"] += value
+        self._invalidate(key)
+
+    def remove(self, **labels) -> int:
+        """
+        删除标签包含给定标签的所有序列（如某个作业的全部序列）
+
+        Returns:
+            删除的序列数
+        """
+        match = set(_label_key(labels))
+        keys = [key for key in self._values if match <= set(key)]
+        for key in keys:
+            del self._values[key]
+            self._lines.pop(key, None)
+        if keys:
+            self._block = None
+        return len(keys)
+
+    def _invalidate(self, key: LabelKey):
+        self._lines.pop(key, None)
+        self._block = None
+
+    def _render_series(self, key: LabelKey) -> str:
+        value = self._values[key]
+        if self.kind == "gauge":
+            return f"{self.name}{_format_labels(key)} {_format_value(value)}\n"
+        if self.kind == "counter":
+            return f"{self.name}_total{_format_labels(key)} {_format_value(value)}\n"
+        lines = []
+        for bound, count in zip(self.buckets, value["counts"]):
+            le = 'le="' + _format_value(float(bound)) + '"'
+            lines.append(f"{self.name}_bucket{_format_labels(key, le)} {count}\n")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_format_labels(key, le)} {value['count']}\n")
+        lines.append(f"{self.name}_count{_format_labels(key)} {value['count']}\n")
+        lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(value['sum'])}\n")
+        return "".join(lines)
+
+    def samples(self) -> str:
+        """所有序列的文本（只重新渲染值变化过的序列）"""
+        if self._block is None:
+            for key in self._values:
+                if key not in self._lines:
+                    self._lines[key] = self._render_series(key)
+            self._block = "".join(self._lines[key] for key in self._values)
+        return self._block
+
+    def render(self, openmetrics: bool = True) -> str:
+        """
+        渲染指标族
+
+        Args:
+            openmetrics: True 时按 OpenMetrics 书写 counter 的 TYPE（不含 _total），
+                否则按 Prometheus 文本格式 0.0.4（node_exporter textfile collector 使用）
+        """
+        if not self._values:
+            return ""
+        type_name = self.name if openmetrics or self.kind != "counter" else f"{self.name}_total"
+        return (f"# HELP {type_name} {self.help_text}\n"
+                f"# TYPE {type_name} {self.kind}\n"
+                + self.samples())
+
+
+class MetricsRegistry:
+    """指标族集合（线程安全）"""
+
+    def __init__(self):
+        self.families: Dict[str, MetricFamily] = {}
+        self.lock = threading.Lock()
+
+    def _family(self, name: str, kind: str, help_text: str, **kwargs) -> MetricFamily:
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = MetricFamily(name, kind, help_text, **kwargs)
+        elif family.kind != kind:
+            raise ValueError(f"指标 {name} 已注册为 {family.kind}")
+        return family
+
+    def gauge(self, name: str, help_text: str) -> MetricFamily:
+        """获取或创建 gauge"""
+        return self._family(name, "gauge", help_text)
+
+    def counter(self, name: str, help_text: str) -> MetricFamily:
+        """获取或创建 counter（name 不含 _total）"""
+        return self._family(name, "counter", help_text)
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> MetricFamily:
+        """获取或创建 histogram"""
+        return self._family(name, "histogram", help_text, buckets=buckets)
+
+    def remove(self, **labels) -> int:
+        """从所有指标族中删除标签包含给定标签的序列"""
+        with self.lock:
+            return sum(family.remove(**labels) for family in self.families.values())
+
+    def render(self, openmetrics: bool = True) -> str:
+        """
+        渲染所有指标
+
+        Args:
+            openmetrics: 是否按 OpenMetrics 格式（以 # EOF 结尾）
+
+        Returns:
+            指标文本
+        """
+        with self.lock:
+            text = "".join(family.render(openmetrics) for family in self.families.values())
+        return text + "# EOF\n" if openmetrics else text
+
+
+def update_job_metrics(registry: MetricsRegistry, labels: Dict[str, object], stats: Dict):
+    """
+    用一次进度统计（与 stats 事件的字段相同）更新作业的 gauge 和 counter
+
+    Args:
+        registry: 指标注册表
+        labels: 作业标签（run、job_id、rank）
+        stats: steps、total_steps、lines、bytes、idle_seconds、cpu、gpu、max_memory_mb 等字段，缺少的字段跳过
+    """
+    gauges = (
+        ("steps", "hpc_run_job_steps", "Training steps parsed from the output", 1),
+        ("total_steps", "hpc_run_job_total_steps", "Total training steps", 1),
+        ("idle_seconds", "hpc_run_job_output_idle_seconds", "Seconds since the last output", 1),
+        ("cpu", "hpc_run_job_cpu_percent", "CPU usage of the process tree (percent of one core)", 1),
+        ("gpu", "hpc_run_job_gpu_utilization_percent", "Average utilization of the visible GPUs", 1),
+        ("max_memory_mb", "hpc_run_job_memory_max_bytes", "Peak memory of the process tree", 1024 * 1024),
+        ("start_timestamp", "hpc_run_job_start_time_seconds", "Unix time the run started", 1),
+        ("attempt", "hpc_run_job_attempt", "Current attempt number (restarts included)", 1),
+    )
+    counters = (
+        ("lines", "hpc_run_job_output_lines", "Output lines written to the log"),
+        ("bytes", "hpc_run_job_output_bytes", "Output bytes read from the training process"),
+    )
+    with registry.lock:
+        for key, name, help_text, scale in gauges:
+            if stats.get(key) is not None:
+                registry.gauge(name, help_text).set(stats[key] * scale, **labels)
+        for key, name, help_text in counters:
+            if stats.get(key) is not None:
+                registry.counter(name, help_text).set(stats[key], **labels)
+
+
+def set_job_phase(registry: MetricsRegistry, labels: Dict[str, object], phase: str):
+    """
+    设置作业所处阶段（每个阶段一个序列，当前阶段为 1）
+
+    Args:
+        registry: 指标注册表
+        labels: 作业标签
+        phase: JOB_PHASES 之一
+    """
+    with registry.lock:
+        family = registry.gauge("hpc_run_job_phase", "Current phase of the run (1 for the active phase)")
+        for name in JOB_PHASES:
+            family.set(1 if name == phase else 0, phase=name, **labels)
+
+
+def write_textfile(path: Union[str, Path], registry: MetricsRegistry):
+    """
+    原子替换 textfile collector 文件（先写同目录下的临时文件再 rename，node_exporter 不会读到半个文件）
+
+    Args:
+        path: .prom 文件路径
+        registry: 指标注册表
+
+    Raises:
+        OSError: 目录不可写
+    """
+    path = Path(path)
+    # node_exporter 只读取 *.prom，临时文件不会被采集
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render(openmetrics=False))
+    os.replace(tmp_path, path)
+
+
+class TextfileExporter:
+    """定期把一个作业的指标写入 node_exporter textfile collector 目录"""
+
+    def __init__(self, path: Union[str, Path], labels: Dict[str, object]):
+        """
+        Args:
+            path: .prom 文件路径
+            labels: 作业标签（run、job_id、rank）
+        """
+        self.path = Path(path)
+        self.labels = labels
+        self.registry = MetricsRegistry()
+        # 返回当前进度统计的函数（每次运行训练进程时由包装器设置）
+        self.source: Optional[Callable[[], Dict]] = None
+        self.error: Optional[str] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def set_phase(self, phase: str):
+        """切换阶段并立即写入"""
+        set_job_phase(self.registry, self.labels, phase)
+        self.write()
+
+    def write(self):
+        """刷新统计并写入文件（写入失败时只记录第一次的错误）"""
+        if self.source is not None:
+            update_job_metrics(self.registry, self.labels, self.source())
+        try:
+            write_textfile(self.path, self.registry)
+        except OSError as e:
+            if self.error is None:
+                self.error = str(e)
+                print(f"[警告] 写入指标文件失败: {e}")
+
+    def start(self, interval: float):
+        """
+        启动定期写入线程
+
+        Args:
+            interval: 写入间隔（秒）
+        """
+        def _loop():
+            while not self._stop_event.wait(interval):
+                self.write()
+
+        self._thread = threading.Thread(target=_loop, name="metrics-textfile", daemon=True)
+        self._thread.start()
+
+    def close(self, remove: bool = False):
+        """
+        停止写入线程
+
+        Args:
+            remove: 是否删除指标文件（否则保留最终状态）
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if remove:
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+
+
+def accepts_openmetrics(accept: Optional[str]) -> bool:
+    """按 Accept 请求头判断抓取方是否接受 OpenMetrics 格式"""
+    return bool(accept) and "application/openmetrics-text" in accept
+
+
+class MetricsServer:
+    """在后台线程中通过 HTTP /metrics 提供指标"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464,
+                 on_scrape: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            registry: 指标注册表
+            host: 监听地址
+            port: 监听端口（0 表示由系统分配，测试时使用）
+            on_scrape: 每次抓取前调用（如同步通知耗时），可选
+
+        Raises:
+            OSError: 端口被占用等
+        """
+        self.registry = registry
+        self.on_scrape = on_scrape
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                if server.on_scrape is not None:
+                    server.on_scrape()
+                openmetrics = accepts_openmetrics(self.headers.get("Accept"))
+                body = server.registry.render(openmetrics).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """实际监听的 (地址, 端口)"""
+        return self._server.server_address[:2]
+
+    def start(self) -> "MetricsServer":
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class MonitorMetrics:
+    """监控程序的指标：所有被监控作业的状态、通知发送耗时和每次轮询的耗时"""
+
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        self._latencies_seen: Dict[str, int] = {}
+        self.poll_seconds = self.registry.histogram(
+            "hpc_run_monitor_poll_duration_seconds", "Duration of one monitor check (excluding the wait)")
+        self.notify_seconds = self.registry.histogram(
+            "hpc_run_notification_latency_seconds", "Time to deliver a notification, per channel")
+
+    def update_job(self, labels: Dict[str, object], stats: Optional[Dict] = None, phase: Optional[str] = None):
+        """
+        更新一个作业的统计和阶段
+
+        Args:
+            labels: 作业标签（run、job_id、rank）
+            stats: 进度统计（stats 事件或运行状态文件中的字段）
+            phase: JOB_PHASES 之一
+        """
+        if stats:
+            update_job_metrics(self.registry, labels, stats)
+        if phase:
+            set_job_phase(self.registry, labels, phase)
+
+    def observe_poll(self, seconds: float):
+        """记录一次轮询耗时"""
+        with self.registry.lock:
+            self.poll_seconds.observe(seconds)
+
+    def sync_latencies(self, latencies: Dict[str, List[float]]):
+        """
+        把各通道新增的发送耗时记入直方图（只处理上次同步之后追加的部分）
+
+        Args:
+            latencies: 通道名称 -> 历次发送耗时（MultiNotifier.latencies）
+        """
+        with self.registry.lock:
+            for channel, values in latencies.items():
+                seen = self._latencies_seen.get(channel, 0)
+                for value in values[seen:]:
+                    self.notify_seconds.observe(value, channel=channel)
+                self._latencies_seen[channel] = len(values)
@@ -1,56 +1,392 @@
 #!/usr/bin/env python3
 """
 系统监控模块
-负责监控进程的 CPU、内存和 GPU 使用情况
+负责监控进程的 CPU、内存、GPU 和 I/O 使用情况
 """
+import os
+import time
 import psutil
 import shutil
+import threading
 import subprocess
-from typing import Optional, Tuple
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass, field
 
+from .energy import sum_gpu_power
+
+
+class BoundedTimeline:
+    """有界时间序列：点数达到上限后每隔一个点丢弃一个并加倍采样步长，保留整体形状"""
+    
+    def __init__(self, max_points: int = 2000):
+        """
+        初始化时间序列
+        
+        Args:
+            max_points: 最多保留的点数
+        """
+        self.max_points = max_points
+        self.points: List[Dict] = []
+        self._stride = 1
+        self._skipped = 0
+    
+    def append(self, point: Dict):
+        """添加一个点（按当前步长抽样）"""
+        self._skipped += 1
+        if self._skipped < self._stride:
+            return
+        self._skipped = 0
+        self.points.append(point)
+        if len(self.points) >= self.max_points:
+            self.points = self.points[::2]
+            self._stride *= 2
+
+
+class AdaptiveSchedule:
+    """
+    自适应采样间隔：启动阶段和触发突发后按最小间隔密集采样，稳定阶段每次乘以 factor 退避到最大间隔
+
+    enabled 为 False 时始终返回 min_interval（固定间隔采样）。
+    """
+
+    def __init__(self, min_interval: float = 0.5, max_interval: float = 30.0, startup: float = 120.0,
+                 burst: float = 60.0, factor: float = 1.5, enabled: bool = True, cpu_delta: float = 0.5,
+                 memory_delta: float = 0.2, stall_seconds: float = 60.0):
+        """
+        Args:
+            min_interval: 最小采样间隔（秒），固定间隔模式下即采样间隔
+            max_interval: 稳定阶段的最大采样间隔（秒）
+            startup: 启动后按最小间隔采样的时长（秒）
+            burst: 每次触发后按最小间隔采样的时长（秒）
+            factor: 稳定阶段每次采样后间隔的增长倍数
+            enabled: 是否自适应
+            cpu_delta: 相邻两次采样的 CPU 使用率相对变化超过该比例时触发（且至少变化半个核）
+            memory_delta: 相邻两次采样的内存相对变化超过该比例时触发
+            stall_seconds: 输出停止超过该时长、以及停止后恢复时触发
+        """
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.startup = startup
+        self.burst = burst
+        self.factor = factor
+        self.enabled = enabled
+        self.cpu_delta = cpu_delta
+        self.memory_delta = memory_delta
+        self.stall_seconds = stall_seconds
+        self.interval = min_interval
+        self.triggers: Dict[str, int] = {}
+        self._dense_until = 0.0
+        self._previous: Optional[Tuple[float, float, Optional[int]]] = None
+        self._stalled = False
+
+    @classmethod
+    def from_config(cls, sampling_config: dict, interval: float) -> "AdaptiveSchedule":
+        """
+        按配置创建采样计划
+
+        Args:
+            sampling_config: 配置中的 monitor.sampling 段
+            interval: monitor.interval（固定间隔模式的采样间隔）
+
+        Returns:
+            AdaptiveSchedule（默认不自适应，按 interval 固定采样，只设置 interval 的配置保持原有的采样频率）
+        """
+        enabled = bool(sampling_config.get('adaptive', False))
+        return cls(
+            min_interval=float(sampling_config.get('min_interval', 0.5)) if enabled else interval,
+            max_interval=float(sampling_config.get('max_interval', 30)),
+            startup=float(sampling_config.get('startup', 120)),
+            burst=float(sampling_config.get('burst', 60)),
+            factor=float(sampling_config.get('factor', 1.5)),
+            enabled=enabled,
+            cpu_delta=float(sampling_config.get('cpu_delta', 0.5)),
+            memory_delta=float(sampling_config.get('memory_delta', 0.2)),
+            stall_seconds=float(sampling_config.get('stall_seconds', 60)),
+        )
+
+    def start(self, now: float):
+        """开始计时（启动阶段从此刻算起）"""
+        self._dense_until = now + self.startup
+        self.interval = self.min_interval
+
+    def trigger(self, reason: str, now: float):
+        """
+        触发一次突发：立即回到最小间隔，并保持 burst 秒
+
+        Args:
+            reason: 触发原因（计入 triggers）
+            now: 当前 monotonic 时间
+        """
+        self.triggers[reason] = self.triggers.get(reason, 0) + 1
+        if not self.enabled:
+            return
+        self._dense_until = max(self._dense_until, now + self.burst)
+        self.interval = self.min_interval
+
+    def observe(self, now: float, cpu: float, memory_mb: float, processes: Optional[int] = None,
+                idle_seconds: Optional[float] = None) -> List[str]:
+        """
+        用一次采样结果检查廉价的突发触发条件：CPU 或内存大幅变化、进程数变化（如启动了 DataLoader worker）、
+        输出停止或恢复
+
+        Args:
+            now: 当前 monotonic 时间
+            cpu: CPU 使用率（%）
+            memory_mb: 内存使用量（MB）
+            processes: 进程数（未知时为 None）
+            idle_seconds: 距最后一次输出的秒数（未知时为 None）
+
+        Returns:
+            本次触发的原因列表
+        """
+        reasons = []
+        previous = self._previous
+        if previous is not None:
+            if abs(cpu - previous[0]) >= max(50.0, self.cpu_delta * previous[0]):
+                reasons.append("cpu")
+            if previous[1] > 0 and abs(memory_mb - previous[1]) >= self.memory_delta * previous[1]:
+                reasons.append("memory")
+            if processes is not None and previous[2] is not None and processes != previous[2]:
+                reasons.append("processes")
+        self._previous = (cpu, memory_mb, processes)
+        if idle_seconds is not None:
+            stalled = idle_seconds >= self.stall_seconds
+            if stalled != self._stalled:
+                reasons.append("stall" if stalled else "resume")
+            self._stalled = stalled
+        for reason in reasons:
+            self.trigger(reason, now)
+        return reasons
+
+    def next_interval(self, now: float) -> float:
+        """
+        本次采样之后到下一次采样的间隔
+
+        Args:
+            now: 当前 monotonic 时间
+
+        Returns:
+            间隔（秒）
+        """
+        if not self.enabled or now < self._dense_until:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.factor)
+        return self.interval
+
+
+def _correlation(xs: List[float], ys: List[float]) -> Optional[float]:
+    """皮尔逊相关系数，任一序列方差为 0 时返回 None"""
+    n = len(xs)
+    if n < 3:
+        return None
+    mean_x, mean_y = sum(xs) / n, sum(ys) / n
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    var_y = sum((y - mean_y) ** 2 for y in ys)
+    if var_x <= 0 or var_y <= 0:
+        return None
+    return cov / (var_x * var_y) ** 0.5
+
+
+def _weighted_mean(values: List[float], weights: List[float]) -> float:
+    """加权平均值，权重之和为 0 时退化为算术平均"""
+    total = sum(weights)
+    if total <= 0:
+        return sum(values) / len(values)
+    return sum(v * w for v, w in zip(values, weights)) / total
+
+
+def classify_bottleneck(points: List[Dict], gpu_idle_threshold: float = 30.0) -> Dict:
+    """
+    根据时间序列判断运行瓶颈
+    
+    - memory-bound: 节点内存长时间接近耗尽（>= 90%）
+    - compute-bound: GPU 大部分时间处于繁忙状态
+    - input-bound: GPU 空闲时段与磁盘/网络读取速率正相关，或空闲时读取速率明显高于繁忙时；
+      GPU 空闲但 I/O 不高时通常是 CPU 数据预处理跟不上，同样归为 input-bound
+    
+    Args:
+        points: 时间序列点（含 gpu、read_bps、net_rx_bps、node_mem_percent 字段，可选的 dt 为距上一个点的秒数）
+        gpu_idle_threshold: GPU 利用率低于该值视为空闲
+        
+    Returns:
+        包含 label、reason 和判据数值的字典
+    """
+    gpu_points = [p for p in points if p.get("gpu") is not None]
+    if not points:
+        return {"label": "unknown", "reason": "没有采样数据"}
+    
+    # 自适应采样的间隔不均匀，比例按每个点代表的时长（dt）加权，突发时的密集采样不会放大其所占比例
+    def _fraction(items, total):
+        weight = sum(p.get("dt", 1.0) for p in total)
+        return sum(p.get("dt", 1.0) for p in items) / weight if weight > 0 else 0.0
+    
+    mem_pressure = _fraction([p for p in points if (p.get("node_mem_percent") or 0) >= 90], points)
+    if mem_pressure >= 0.2:
+        return {"label": "memory-bound", "reason": f"{mem_pressure:.0%} 的时间节点内存使用率 >= 90%",
+                "mem_pressure_fraction": round(mem_pressure, 3)}
+    
+    if not gpu_points:
+        return {"label": "unknown", "reason": "没有 GPU 采样数据"}
+    
+    idle = [p for p in gpu_points if p["gpu"] < gpu_idle_threshold]
+    busy = [p for p in gpu_points if p["gpu"] >= gpu_idle_threshold]
+    idle_fraction = _fraction(idle, gpu_points)
+    input_rate = [(p.get("read_bps") or 0) + (p.get("net_rx_bps") or 0) for p in gpu_points]
+    corr = _correlation([100 - p["gpu"] for p in gpu_points], input_rate)
+    result = {"gpu_idle_fraction": round(idle_fraction, 3),
+              "idle_input_corr": round(corr, 3) if corr is not None else None}
+    
+    if idle_fraction < 0.25:
+        result.update(label="compute-bound", reason=f"GPU 仅 {idle_fraction:.0%} 的时间空闲")
+        return result
+    
+    def _mean_input(items):
+        return sum((p.get("read_bps") or 0) + (p.get("net_rx_bps") or 0) for p in items) / len(items) if items else 0.0
+    
+    idle_input, busy_input = _mean_input(idle), _mean_input(busy)
+    if (corr is not None and corr >= 0.3) or (busy and idle_input > 1.5 * busy_input > 0):
+        reason = f"GPU {idle_fraction:.0%} 的时间空闲，且空闲时段与读取速率正相关"
+    else:
+        reason = f"GPU {idle_fraction:.0%} 的时间空闲，I/O 不高，可能是数据预处理（CPU）跟不上"
+    result.update(label="input-bound", reason=reason)
+    return result
+
 
 @dataclass
 class ResourceMetrics:
     """资源使用指标"""
     cpu_samples: list = field(default_factory=list)
     gpu_samples: list = field(default_factory=list)
+    # 每个采样值代表的时长（秒），采样间隔不均匀时平均值按时长加权
+    cpu_weights: list = field(default_factory=list)
+    gpu_weights: list = field(default_factory=list)
     max_memory: float = 0.0  # MB
+    # 进程树 I/O 累计量
+    read_bytes: int = 0
+    write_bytes: int = 0
+    read_ops: int = 0
+    write_ops: int = 0
+    peak_read_bps: float = 0.0
+    peak_write_bps: float = 0.0
+    # 节点网络累计量
+    net_rx_bytes: int = 0
+    net_tx_bytes: int = 0
+    # 工作目录文件系统元数据操作延迟（毫秒）
+    fs_latency_samples: list = field(default_factory=list)
+    # 统计方式：cgroup（读取作业 cgroup 的计数文件）或 psutil（遍历进程树）
+    backend: str = "psutil"
+    # cgroup 记录的内存峰值（MB，仅在为训练进程单独创建的子 cgroup 中可靠）
+    cgroup_peak_memory: Optional[float] = None
+    # 能耗统计（EnergyMeter，可选）
+    energy: Optional[object] = None
+    # 采样统计（模式、次数、突发触发次数、采样开销）
+    sampling: Optional[Dict] = None
+    timeline: BoundedTimeline = field(default_factory=BoundedTimeline)
     
-    def add_cpu(self, value: float):
-        """添加 CPU 采样值"""
+    def add_cpu(self, value: float, weight: float = 1.0):
+        """添加 CPU 采样值（weight 为该值代表的时长）"""
         self.cpu_samples.append(value)
+        self.cpu_weights.append(weight)
     
-    def add_gpu(self, value: float):
-        """添加 GPU 采样值"""
+    def add_gpu(self, value: float, weight: float = 1.0):
+        """添加 GPU 采样值（weight 为该值代表的时长）"""
         self.gpu_samples.append(value)
+        self.gpu_weights.append(weight)
     
     def update_memory(self, value: float):
         """更新最大内存值"""
         self.max_memory = max(self.max_memory, value)
     
     def get_avg_cpu(self) -> float:
-        """获取平均 CPU 使用率"""
-        return sum(self.cpu_samples) / len(self.cpu_samples) if self.cpu_samples else 0.0
+        """获取平均 CPU 使用率（按时长加权）"""
+        return _weighted_mean(self.cpu_samples, self.cpu_weights) if self.cpu_samples else 0.0
     
     def get_avg_gpu(self) -> Optional[float]:
-        """获取平均 GPU 使用率"""
-        return sum(self.gpu_samples) / len(self.gpu_samples) if self.gpu_samples else None
+        """获取平均 GPU 使用率（按时长加权）"""
+        return _weighted_mean(self.gpu_samples, self.gpu_weights) if self.gpu_samples else None
     
     def get_max_memory(self) -> float:
         """获取最大内存使用量（MB）"""
         return self.max_memory
+    
+    def summary(self, steps: Optional[int] = None) -> Dict:
+        """
+        汇总资源指标（写入完成标记文件）
+        
+        Args:
+            steps: 训练步数（已知时计算每步能耗）
+        
+        Returns:
+            包含平均 CPU、平均 GPU、峰值内存和采样次数的字典
+        """
+        avg_gpu = self.get_avg_gpu()
+        summary = {
+            "cpu_avg": round(self.get_avg_cpu(), 2),
+            "gpu_avg": round(avg_gpu, 2) if avg_gpu is not None else None,
+            "max_memory_mb": round(self.max_memory, 2),
+            "samples": len(self.cpu_samples),
+            "backend": self.backend,
+            "io": {
+                "read_mb": round(self.read_bytes / 1024 / 1024, 2),
+                "write_mb": round(self.write_bytes / 1024 / 1024, 2),
+                "read_ops": self.read_ops,
+                "write_ops": self.write_ops,
+                "peak_read_mbps": round(self.peak_read_bps / 1024 / 1024, 2),
+                "peak_write_mbps": round(self.peak_write_bps / 1024 / 1024, 2),
+            },
+            "network": {
+                "rx_mb": round(self.net_rx_bytes / 1024 / 1024, 2),
+                "tx_mb": round(self.net_tx_bytes / 1024 / 1024, 2),
+            },
+            "bottleneck": classify_bottleneck(self.timeline.points),
+        }
+        energy = self.energy.summary(steps) if self.energy is not None else None
+        if energy:
+            summary["energy"] = energy
+        if self.sampling:
+            summary["sampling"] = self.sampling
+        if self.cgroup_peak_memory is not None:
+            summary["cgroup_peak_memory_mb"] = round(self.cgroup_peak_memory, 2)
+        if self.fs_latency_samples:
+            summary["fs_latency_ms"] = {
+                "avg": round(sum(self.fs_latency_samples) / len(self.fs_latency_samples), 2),
+                "max": round(max(self.fs_latency_samples), 2),
+                "samples": len(self.fs_latency_samples),
+            }
+        return summary
 
 
 class SystemMonitor:
     """系统资源监控器"""
     
-    def __init__(self, pid: int):
+    def __init__(self, pid: int, device_source=None, gpu_indices: Optional[List[int]] = None,
+                 fs_probe_dir: Optional[str] = None, fs_probe_interval: float = 60.0,
+                 accounting: str = "auto", cgroup_root: Path = Path("/"), cgroup_delegate: bool = False,
+                 memory_watch=None, on_memory_warning=None, energy_meter=None,
+                 schedule: Optional[AdaptiveSchedule] = None, activity=None, gpu_min_interval: float = 0.0):
         """
         初始化监控器
         
         Args:
-            pid: 要监控的进程 ID
+            pid: 要监控的进程 ID（CPU、内存和 I/O 统计包含其所有子进程）
+            device_source: 设备级数据来源（如 SharedSamplerClient，提供 latest() 方法），
+                为 None 时直接调用 nvidia-smi
+            gpu_indices: 只统计这些编号的 GPU（None 表示所有 GPU）
+            fs_probe_dir: 测量该目录所在文件系统的元数据操作延迟（可选）
+            fs_probe_interval: 文件系统延迟探测间隔（秒）
+            accounting: CPU/内存/磁盘 I/O 的统计方式："auto"（有 cgroup v2 时读取 cgroup 计数，
+                否则遍历进程树）、"cgroup" 或 "psutil"
+            cgroup_root: 文件系统根目录（测试时可指向伪造的 procfs/cgroupfs）
+            cgroup_delegate: 是否尝试为进程单独创建子 cgroup（需要 cgroup 已委派给当前用户）
+            memory_watch: 内存压力跟踪器（MemoryWatch，可选），每次采样后更新
+            on_memory_warning: 内存预警回调，参数为预警字典
+            energy_meter: 能耗统计（EnergyMeter，可选），每次采样后用 GPU 功耗和 RAPL 计数更新
+            schedule: 后台采样的间隔计划（AdaptiveSchedule，默认按 start_background 的 interval 固定间隔采样）
+            activity: 返回最后一次输出时间（monotonic）的函数，用于检测输出停止（可选）
+            gpu_min_interval: 直接调用 nvidia-smi 时的最小间隔（秒），密集采样期间不会更频繁地启动 nvidia-smi
         """
         self.pid = pid
         try:
@@ -60,80 +396,354 @@ class SystemMonitor:
         except psutil.NoSuchProcess:
             raise ValueError(f"进程不存在: PID={pid}")
         
+        # 缓存子进程对象，保留 cpu_percent 的上一次计数
+        self._children: Dict[int, psutil.Process] = {}
+        self.device_source = device_source
+        self.gpu_indices = gpu_indices
+        self.fs_probe_dir = Path(fs_probe_dir) if fs_probe_dir else None
+        self.fs_probe_interval = fs_probe_interval
+        self._last_fs_probe = 0.0
+        self._io_prev: Dict[int, Tuple[int, int, int, int]] = {}
+        self._net_prev = None
+        self._io_time: Optional[float] = None
         self.metrics = ResourceMetrics()
+        self.cgroup = None
+        if accounting in ("auto", "cgroup"):
+            from .cgroup import open_cgroup
+            self.cgroup = open_cgroup(pid, Path(cgroup_root), delegate=cgroup_delegate)
+            if self.cgroup is None and accounting == "cgroup":
+                print("[警告] 未找到 cgroup v2，改为遍历进程树统计资源")
+        if self.cgroup is not None:
+            self.metrics.backend = "cgroup"
+        self._cgroup_prev = None
+        self.memory_watch = memory_watch
+        self.on_memory_warning = on_memory_warning
+        self.metrics.energy = energy_meter
+        self._gpu_power: Optional[float] = None
+        self._gpu_time: Optional[float] = None
+        self._gpu_last: Optional[float] = None
+        self.gpu_min_interval = gpu_min_interval
         self._nvidia_smi_path = self._find_nvidia_smi()
+        self.schedule = schedule
+        self.activity = activity
+        self._sample_time = time.monotonic()
+        self._sampling_stats: Optional[Dict] = None
+        self._stop_event = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
     
     def _find_nvidia_smi(self) -> Optional[str]:
         """查找 nvidia-smi 路径"""
         return shutil.which('nvidia-smi')
     
-    def sample_cpu(self) -> float:
+    def _process_tree(self) -> List[psutil.Process]:
         """
-        采样 CPU 使用率
+        获取被监控进程及其所有子进程
         
         Returns:
-            CPU 使用率百分比
+            进程对象列表（子进程对象跨采样复用）
         """
         try:
-            cpu_percent = self.process.cpu_percent(interval=None)
-            self.metrics.add_cpu(cpu_percent)
-            return cpu_percent
+            children = self.process.children(recursive=True)
         except (psutil.NoSuchProcess, psutil.AccessDenied):
-            return 0.0
+            return [self.process]
+        
+        current = {}
+        for child in children:
+            cached = self._children.get(child.pid)
+            if cached is None:
+                cached = child
+                try:
+                    # 新子进程的第一次 cpu_percent 调用只建立基准
+                    cached.cpu_percent(interval=None)
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+            current[child.pid] = cached
+        self._children = current
+        return [self.process] + list(current.values())
+    
+    def sample_cpu(self, weight: float = 1.0) -> float:
+        """
+        采样 CPU 使用率（进程树合计）
+        
+        Args:
+            weight: 该采样代表的时长（秒，即距上一次采样的时间）
+        
+        Returns:
+            CPU 使用率百分比
+        """
+        cpu_percent = 0.0
+        for proc in self._process_tree():
+            try:
+                cpu_percent += proc.cpu_percent(interval=None)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        self.metrics.add_cpu(cpu_percent, weight)
+        return cpu_percent
     
     def sample_memory(self) -> float:
         """
-        采样内存使用量
+        采样内存使用量（进程树 RSS 合计）
         
         Returns:
             内存使用量（MB）
         """
-        try:
-            memory_mb = self.process.memory_info().rss / 1024 / 1024
-            self.metrics.update_memory(memory_mb)
-            return memory_mb
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            return 0.0
+        rss = 0
+        for proc in [self.process] + list(self._children.values()):
+            try:
+                rss += proc.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        memory_mb = rss / 1024 / 1024
+        self.metrics.update_memory(memory_mb)
+        return memory_mb
     
     def sample_gpu(self) -> Optional[float]:
         """
-        采样 GPU 使用率（所有 GPU 的平均值）
+        采样 GPU 使用率（所有 GPU 的平均值），同时记录功耗之和供能耗统计使用
         
         Returns:
             GPU 使用率百分比，如果无 GPU 或采样失败则返回 None
         """
+        now = time.monotonic()
+        sample = self.device_source.latest() if self.device_source is not None else None
+        # 直接调用 nvidia-smi（未使用共享采样，或共享采样暂无数据）时限制调用频率
+        if sample is None and self._gpu_time is not None and now - self._gpu_time < self.gpu_min_interval:
+            return self._gpu_last
+        weight = now - self._gpu_time if self._gpu_time is not None else 1.0
+        self._gpu_time = now
+        self._gpu_last = self._sample_gpu(weight, sample)
+        return self._gpu_last
+    
+    def _sample_gpu(self, weight: float, sample: Optional[Dict] = None) -> Optional[float]:
+        """读取一次 GPU 利用率和功耗（共享采样的样本，没有时调用 nvidia-smi）"""
+        self._gpu_power = None
+        if sample is not None:
+            gpus = sample.get("gpus") or []
+            if self.gpu_indices is not None:
+                gpus = [gpus[i] for i in self.gpu_indices if i < len(gpus)]
+            if not gpus:
+                return None
+            self._gpu_power = sum_gpu_power(gpus)
+            avg_gpu = sum(gpu["util"] for gpu in gpus) / len(gpus)
+            self.metrics.add_gpu(avg_gpu, weight)
+            return avg_gpu
+        
         if not self._nvidia_smi_path:
             return None
         
         try:
             output = subprocess.check_output(
-                [self._nvidia_smi_path, '--query-gpu=utilization.gpu', 
+                [self._nvidia_smi_path, '--query-gpu=utilization.gpu,power.draw', 
                  '--format=csv,noheader,nounits'],
                 timeout=2
             )
-            values = [float(x) for x in output.decode().strip().splitlines() if x.strip()]
+            gpus = []
+            for line in output.decode().strip().splitlines():
+                if not line.strip():
+                    continue
+                util, _, power = line.partition(',')
+                try:
+                    power_w = float(power)
+                except ValueError:
+                    power_w = float('nan')  # 如 [N/A]
+                gpus.append({"util": float(util), "power_w": power_w})
+            if self.gpu_indices is not None:
+                gpus = [gpus[i] for i in self.gpu_indices if i < len(gpus)]
             
-            if values:
-                avg_gpu = sum(values) / len(values)
-                self.metrics.add_gpu(avg_gpu)
+            if gpus:
+                self._gpu_power = sum_gpu_power(gpus)
+                avg_gpu = sum(gpu["util"] for gpu in gpus) / len(gpus)
+                self.metrics.add_gpu(avg_gpu, weight)
                 return avg_gpu
-        except (subprocess.TimeoutExpired, subprocess.CalledProcessError, ValueError):
+        except (subprocess.TimeoutExpired, subprocess.CalledProcessError, ValueError, OSError):
             pass
         
         return None
     
+    def sample_io(self) -> Dict[str, float]:
+        """
+        采样进程树的磁盘 I/O 速率和节点网络吞吐
+        
+        进程树按 PID 分别计算增量，新出现的子进程从 0 开始计，已退出子进程的最后一段增量会丢失。
+        
+        Returns:
+            read_bps、write_bps、read_iops、write_iops、net_rx_bps、net_tx_bps
+        """
+        now = time.monotonic()
+        elapsed = now - self._io_time if self._io_time is not None else None
+        self._io_time = now
+        
+        delta = [0, 0, 0, 0]
+        current = {}
+        for proc in [self.process] + list(self._children.values()):
+            try:
+                counters = proc.io_counters()
+            except (psutil.NoSuchProcess, psutil.AccessDenied, AttributeError, NotImplementedError):
+                continue
+            values = (counters.read_bytes, counters.write_bytes, counters.read_count, counters.write_count)
+            previous = self._io_prev.get(proc.pid, (0, 0, 0, 0))
+            for i in range(4):
+                delta[i] += max(0, values[i] - previous[i])
+            current[proc.pid] = values
+        self._io_prev = current
+        
+        return self._record_io(delta, elapsed)
+    
+    def _record_io(self, delta: List[int], elapsed: Optional[float]) -> Dict[str, float]:
+        """累计磁盘 I/O 增量，采样节点网络吞吐，返回速率"""
+        net_delta = (0, 0)
+        try:
+            net = psutil.net_io_counters()
+            if self._net_prev is not None:
+                net_delta = (max(0, net.bytes_recv - self._net_prev[0]), max(0, net.bytes_sent - self._net_prev[1]))
+            self._net_prev = (net.bytes_recv, net.bytes_sent)
+        except (AttributeError, OSError, RuntimeError):
+            pass
+        
+        m = self.metrics
+        m.read_bytes += delta[0]
+        m.write_bytes += delta[1]
+        m.read_ops += delta[2]
+        m.write_ops += delta[3]
+        m.net_rx_bytes += net_delta[0]
+        m.net_tx_bytes += net_delta[1]
+        
+        if not elapsed:
+            return {}
+        rates = {
+            "read_bps": delta[0] / elapsed,
+            "write_bps": delta[1] / elapsed,
+            "read_iops": delta[2] / elapsed,
+            "write_iops": delta[3] / elapsed,
+            "net_rx_bps": net_delta[0] / elapsed,
+            "net_tx_bps": net_delta[1] / elapsed,
+        }
+        m.peak_read_bps = max(m.peak_read_bps, rates["read_bps"])
+        m.peak_write_bps = max(m.peak_write_bps, rates["write_bps"])
+        return rates
+    
+    def sample_cgroup(self) -> Optional[Tuple[float, float, Dict[str, float]]]:
+        """
+        从 cgroup 计数文件采样 CPU、内存和磁盘 I/O（替代逐个进程的 sample_cpu/sample_memory/sample_io）
+        
+        计数从监控开始时算起；内存为工作集（memory.current 减去非活跃文件页），与进程树 RSS 合计相近，
+        但包含已退出子进程以外的所有进程（包括包装器自身）。
+        
+        Returns:
+            (CPU%, 内存MB, 速率字典)，cgroup 不可读时返回 None
+        """
+        now = time.monotonic()
+        try:
+            counters = self.cgroup.read()
+        except OSError:
+            return None
+        previous = self._cgroup_prev
+        self._cgroup_prev = (now, counters)
+        
+        memory_mb = counters.working_set / 1024 / 1024
+        self.metrics.update_memory(memory_mb)
+        if counters.memory_peak is not None and self.cgroup.owned:
+            self.metrics.cgroup_peak_memory = counters.memory_peak / 1024 / 1024
+        if previous is None:
+            self._record_io([0, 0, 0, 0], None)
+            return 0.0, memory_mb, {}
+        
+        elapsed = now - previous[0]
+        last = previous[1]
+        cpu_percent = max(0, counters.cpu_usec - last.cpu_usec) / 1e6 / elapsed * 100 if elapsed > 0 else 0.0
+        self.metrics.add_cpu(cpu_percent, elapsed)
+        delta = [max(0, counters.read_bytes - last.read_bytes), max(0, counters.write_bytes - last.write_bytes),
+                 max(0, counters.read_ops - last.read_ops), max(0, counters.write_ops - last.write_ops)]
+        return cpu_percent, memory_mb, self._record_io(delta, elapsed)
+    
+    def probe_fs_latency(self) -> Optional[float]:
+        """
+        测量工作目录所在文件系统的元数据操作延迟（创建并删除一个空文件）
+        
+        按 fs_probe_interval 限频，避免给共享存储的元数据服务器增加负担。
+        
+        Returns:
+            延迟（毫秒），未到探测时间或失败时返回 None
+        """
+        if not self.fs_probe_dir or time.monotonic() - self._last_fs_probe < self.fs_probe_interval:
+            return None
+        self._last_fs_probe = time.monotonic()
+        probe = self.fs_probe_dir / f".hpc_run_fs_probe_{os.getpid()}"
+        try:
+            started = time.perf_counter()
+            fd = os.open(probe, os.O_CREAT | os.O_WRONLY, 0o600)
+            os.close(fd)
+            os.unlink(probe)
+            latency_ms = (time.perf_counter() - started) * 1000
+        except OSError:
+            return None
+        self.metrics.fs_latency_samples.append(latency_ms)
+        return latency_ms
+    
     def sample_all(self) -> Tuple[float, float, Optional[float]]:
         """
-        采样所有资源指标
+        采样所有资源指标（I/O 和节点内存记录在时间序列中）
         
         Returns:
             (CPU%, 内存MB, GPU%)
         """
-        cpu = self.sample_cpu()
-        mem = self.sample_memory()
+        now = time.monotonic()
+        dt = now - self._sample_time
+        self._sample_time = now
+        sampled = self.sample_cgroup() if self.cgroup is not None else None
+        if sampled is not None:
+            cpu, mem, rates = sampled
+        else:
+            cpu = self.sample_cpu(dt)
+            mem = self.sample_memory()
+            rates = self.sample_io()
         gpu = self.sample_gpu()
+        if self.schedule is not None and self.schedule.enabled:
+            self._check_triggers(now, cpu, mem)
+        self.probe_fs_latency()
+        if self.metrics.energy is not None:
+            self.metrics.energy.observe(time.time(), self._gpu_power)
+        
+        if self.memory_watch is not None and mem > 0:
+            warning = self.memory_watch.observe(time.time(), mem * 1024 * 1024)
+            if warning and self.on_memory_warning:
+                self.on_memory_warning(warning)
+        
+        try:
+            node_mem_percent = psutil.virtual_memory().percent
+        except (AttributeError, OSError):
+            node_mem_percent = None
+        
+        if rates:
+            self.metrics.timeline.append({
+                "t": round(time.time(), 3), "cpu": cpu, "mem": round(mem, 2), "gpu": gpu,
+                "read_bps": rates["read_bps"], "net_rx_bps": rates["net_rx_bps"],
+                "node_mem_percent": node_mem_percent, "dt": round(dt, 3),
+            })
         return cpu, mem, gpu
     
+    def _check_triggers(self, now: float, cpu: float, mem: float):
+        """用本次采样检查突发触发条件（只读取已有数据和一个 cgroup 文件，不额外遍历进程）"""
+        if self.cgroup is not None:
+            processes = self.cgroup.process_count()
+        else:
+            processes = 1 + len(self._children)
+        idle = now - self.activity() if self.activity is not None else None
+        self.schedule.observe(now, cpu, mem, processes, idle)
+    
+    def burst(self, reason: str):
+        """
+        立即采样并在一段时间内按最小间隔密集采样（如收到信号、训练即将结束）
+        
+        Args:
+            reason: 触发原因（计入采样统计）
+        """
+        if self.schedule is None or not self.schedule.enabled:
+            return
+        self.schedule.trigger(reason, time.monotonic())
+        self._wake.set()
+    
     def get_metrics(self) -> ResourceMetrics:
         """
         获取累积的资源指标
@@ -142,3 +752,67 @@ class SystemMonitor:
             资源使用指标对象
         """
         return self.metrics
+    
+    def start_background(self, interval: float = 2.0):
+        """
+        在后台线程中采样：有自适应计划时按计划调整间隔，否则按固定间隔
+        
+        Args:
+            interval: 采样间隔（秒，没有 schedule 时使用）
+        """
+        schedule = self.schedule or AdaptiveSchedule(min_interval=interval, enabled=False)
+        self.schedule = schedule
+        stats = {"samples": 0, "cpu_seconds": 0.0, "wall_seconds": 0.0, "start": time.monotonic()}
+        self._sampling_stats = stats
+        schedule.start(stats["start"])
+        
+        def _loop():
+            while not self._stop_event.is_set():
+                # 采样开销：采样线程自身的 CPU 时间（不含 nvidia-smi 等子进程）和耗时
+                cpu_started, wall_started = time.thread_time(), time.perf_counter()
+                self.sample_all()
+                stats["cpu_seconds"] += time.thread_time() - cpu_started
+                stats["wall_seconds"] += time.perf_counter() - wall_started
+                stats["samples"] += 1
+                self._wake.wait(schedule.next_interval(time.monotonic()))
+                self._wake.clear()
+        
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=_loop, name="resource-sampler", daemon=True)
+        self._thread.start()
+    
+    def stop_background(self) -> ResourceMetrics:
+        """
+        停止后台采样
+        
+        Returns:
+            累积的资源指标
+        """
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+            self.metrics.sampling = self._sampling_summary()
+        if self.cgroup is not None:
+            self.cgroup.close()
+        return self.metrics
+    
+    def _sampling_summary(self) -> Dict:
+        """采样统计：模式、次数、各触发原因次数，以及与按最小间隔固定采样相比的采样数和开销"""
+        schedule, stats = self.schedule, self._sampling_stats
+        duration = time.monotonic() - stats["start"]
+        samples = stats["samples"]
+        return {
+            "mode": "adaptive" if schedule.enabled else "fixed",
+            "samples": samples,
+            "duration_seconds": round(duration, 1),
+            "min_interval": schedule.min_interval,
+            "max_interval": schedule.max_interval if schedule.enabled else schedule.min_interval,
+            # 按最小间隔固定采样需要的次数
+            "fixed_rate_samples": int(duration / schedule.min_interval) + 1 if schedule.min_interval > 0 else samples,
+            "triggers": dict(schedule.triggers),
+            "cpu_seconds": round(stats["cpu_seconds"], 3),
+            "wall_seconds": round(stats["wall_seconds"], 3),
+            "cpu_ms_per_sample": round(stats["cpu_seconds"] / samples * 1000, 2) if samples else None,
+        }
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+CPU 放置策略模块
+根据节点拓扑（sysfs）和分配到的 GPU，把训练进程绑定到 GPU 所在 NUMA 节点的 CPU 上，
+并按分配到的核心数设置 OMP/MKL 等线程数，避免线程过度订阅
+"""
+import os
+import re
+import shutil
+from pathlib import Path
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Mapping, Optional
+
+from .probe import parse_cpulist
+
+
+# 按分配到的核心数设置的线程数环境变量
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+# 同一节点上的 rank 数（用于在多个 rank 之间划分 CPU）；Slurm 取作业步的值，
+# 批处理脚本中继承的 SLURM_NTASKS_PER_NODE 不代表实际启动的进程数
+_LOCAL_SIZE_ENV_VARS = ("LOCAL_WORLD_SIZE", "SLURM_STEP_TASKS_PER_NODE", "OMPI_COMM_WORLD_LOCAL_SIZE",
+                        "MPI_LOCALNRANKS")
+
+
+@dataclass
+class Placement:
+    """一次放置决策"""
+    cpus: List[int] = field(default_factory=list)
+    numa_nodes: List[int] = field(default_factory=list)
+    gpus: List[int] = field(default_factory=list)
+    threads: Optional[int] = None
+    env: Dict[str, str] = field(default_factory=dict)
+    membind: bool = False
+    reason: str = ""
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data["cpus"] = format_cpulist(self.cpus)
+        return data
+
+
+def format_cpulist(cpus: List[int]) -> str:
+    """把 CPU 编号列表压缩为 sysfs 格式（如 "0-3,8-11"）"""
+    ranges = []
+    for cpu in sorted(set(cpus)):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(f"{start}-{end}" if start != end else f"{start}" for start, end in ranges)
+
+
+def core_groups(cpus: List[int], root: Path = Path("/")) -> List[List[int]]:
+    """
+    按物理核心对 CPU 分组（同一核心的超线程在同一组）
+
+    Args:
+        cpus: 逻辑 CPU 编号列表
+        root: 文件系统根目录（测试时可指向伪造的 sysfs）
+
+    Returns:
+        每个物理核心一组，按组内最小 CPU 编号排序（无法读取拓扑时每个 CPU 一组）
+    """
+    groups: Dict[str, List[int]] = {}
+    for cpu in sorted(cpus):
+        path = root / f"sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list"
+        try:
+            siblings = path.read_text().strip()
+        except OSError:
+            siblings = str(cpu)
+        groups.setdefault(siblings, []).append(cpu)
+    return sorted(groups.values())
+
+
+def _local_size(environ: Mapping[str, str]) -> int:
+    for name in _LOCAL_SIZE_ENV_VARS:
+        value = re.split(r"[(,]", environ.get(name) or "")[0]  # Slurm 可能写成 "4(x2)" 或 "2,1"
+        if value.isdigit() and int(value) > 0:
+            return int(value)
+    return 1
+
+
+def plan_placement(node_info: Optional[Dict], local_rank: int = 0,
+                   gpu_indices: Optional[List[int]] = None,
+                   allowed_cpus: Optional[List[int]] = None,
+                   environ: Optional[Mapping[str, str]] = None,
+                   threads="auto", membind: bool = False,
+                   root: Path = Path("/")) -> Placement:
+    """
+    计算训练进程的 CPU 放置
+
+    1. 候选 CPU 为当前进程允许使用的 CPU（调度器分配的范围）；
+    2. 分配到的 GPU 所在 NUMA 节点的 CPU 与候选 CPU 有交集时，只使用交集；
+    3. 同一节点上有多个 rank 共享同一组 CPU 时，按 local_rank 平均划分；
+    4. 线程数为所得 CPU 覆盖的物理核心数（已显式设置 OMP_NUM_THREADS 时不覆盖）。
+
+    Args:
+        node_info: 节点能力探测结果（probe.load_node_info 的返回值）
+        local_rank: 节点内 rank 编号
+        gpu_indices: CUDA_VISIBLE_DEVICES 对应的物理 GPU 编号（None 表示全部可见）
+        allowed_cpus: 允许使用的 CPU（默认取当前进程的亲和性）
+        environ: 环境变量（默认 os.environ）
+        threads: "auto"、整数或 None（不设置线程数）
+        membind: 是否同时把内存绑定到对应 NUMA 节点（需要 numactl）
+        root: 文件系统根目录
+
+    Returns:
+        Placement
+    """
+    environ = os.environ if environ is None else environ
+    if allowed_cpus is None:
+        allowed_cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+    placement = Placement(cpus=list(allowed_cpus))
+    node_info = node_info or {}
+    local_size = _local_size(environ)
+
+    # 本 rank 使用的 GPU：可见 GPU 多于 rank 数时按 local_rank 划分
+    devices = (node_info.get("gpu") or {}).get("devices") or []
+    all_visible = gpu_indices if gpu_indices is not None else [device["index"] for device in devices]
+    visible = all_visible
+    if visible and local_size > 1 and len(visible) >= local_size:
+        per_rank = len(visible) // local_size
+        visible = visible[local_rank * per_rank:(local_rank + 1) * per_rank]
+    placement.gpus = list(visible)
+
+    numa_cpus = {item["node"]: set(parse_cpulist(item.get("cpus", ""))) for item in node_info.get("numa") or []}
+    gpu_numa = sorted({device["numa_node"] for device in devices
+                       if device["index"] in visible and device.get("numa_node") is not None})
+    local = set()
+    for node in gpu_numa:
+        local |= numa_cpus.get(node, set())
+    candidates = sorted(local & set(allowed_cpus))
+
+    # 共享同一组 CPU 的 rank 数及本 rank 的序号
+    sharing, index = local_size, local_rank
+    if candidates:
+        placement.cpus = candidates
+        placement.numa_nodes = gpu_numa
+        placement.reason = f"GPU {','.join(map(str, placement.gpus))} 位于 NUMA {','.join(map(str, gpu_numa))}"
+        # 同一 NUMA 节点上的其他 GPU 由其他 rank 使用
+        peers = [device["index"] for device in devices
+                 if device.get("numa_node") in gpu_numa and device["index"] in all_visible]
+        per_rank = max(1, len(placement.gpus))
+        sharing = min(local_size, max(1, len(peers) // per_rank))
+        index = peers.index(placement.gpus[0]) // per_rank if placement.gpus[0] in peers else 0
+    else:
+        placement.reason = "无 GPU NUMA 信息，使用分配到的全部 CPU"
+
+    # 按物理核心划分，避免一个 rank 拿到另一个 rank 所用核心的超线程
+    groups = core_groups(placement.cpus, root)
+    if sharing > 1 and len(groups) >= sharing:
+        per_rank = len(groups) // sharing
+        index %= sharing
+        groups = groups[index * per_rank:(index + 1) * per_rank]
+        placement.cpus = sorted(cpu for group in groups for cpu in group)
+        placement.reason += f"，与 {sharing - 1} 个 rank 平分"
+
+    if threads == "auto":
+        placement.threads = len(groups) or None
+    elif threads:
+        placement.threads = int(threads)
+    # 用户已显式设置 OMP_NUM_THREADS 时不改动任何线程数
+    if placement.threads and "OMP_NUM_THREADS" not in environ:
+        placement.env = {name: str(placement.threads) for name in THREAD_ENV_VARS}
+
+    placement.membind = bool(membind and placement.numa_nodes and shutil.which("numactl"))
+    return placement
+
+
+def membind_prefix(placement: Placement) -> List[str]:
+    """
+    生成内存绑定的命令前缀
+
+    Args:
+        placement: 放置决策
+
+    Returns:
+        numactl 命令前缀，不需要绑定时返回空列表
+    """
+    if not placement.membind:
+        return []
+    return ["numactl", f"--membind={','.join(map(str, placement.numa_nodes))}"]
+
+
+def apply_affinity(pid: int, placement: Placement) -> bool:
+    """
+    把进程绑定到放置决策中的 CPU（之后创建的线程和子进程会继承）
+
+    Args:
+        pid: 进程 PID
+        placement: 放置决策
+
+    Returns:
+        是否成功
+    """
+    if not placement.cpus or not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        os.sched_setaffinity(pid, placement.cpus)
+        return True
+    except OSError:
+        return False
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+节点能力探测模块
+并行采集 GPU 型号/数量/显存、驱动和 CUDA 版本、CPU 拓扑、NUMA 布局、内存以及 PyTorch/CUDA 可用性，
+输出 JSON，并按主机名缓存（带有效期），包装器启动时直接复用缓存结果
+
+本文件不依赖包内其他模块，可直接运行:
+    python probe.py              # 输出 JSON（优先使用缓存）
+    python probe.py --refresh    # 忽略缓存重新探测
+"""
+import os
+import re
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 上不加锁
+    fcntl = None
+
+
+SCHEMA_VERSION = 1
+DEFAULT_CACHE_DIR = "~/.hpc_run/nodes"
+DEFAULT_TTL = 24 * 3600
+
+# 在训练使用的解释器中执行，探测 PyTorch 和 CUDA 是否可用
+_TORCH_SCRIPT = (
+    "import json\n"
+    "try:\n"
+    "    import torch\n"
+    "except ImportError:\n"
+    "    print(json.dumps({'installed': False}))\n"
+    "else:\n"
+    "    cuda = torch.cuda.is_available()\n"
+    "    print(json.dumps({'installed': True, 'version': torch.__version__,\n"
+    "                      'cuda': torch.version.cuda, 'cuda_available': cuda,\n"
+    "                      'device_count': torch.cuda.device_count() if cuda else 0,\n"
+    "                      'cudnn': torch.backends.cudnn.version() if cuda else None}))\n"
+)
+
+
+def _run(args: List[str], timeout: float) -> Optional[str]:
+    """运行命令并返回标准输出，失败时返回 None"""
+    try:
+        return subprocess.run(args, capture_output=True, text=True, timeout=timeout, check=True).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _read(path: Path) -> Optional[str]:
+    """读取文本文件，失败时返回 None"""
+    try:
+        return path.read_text().strip()
+    except OSError:
+        return None
+
+
+def parse_cpulist(text: str) -> List[int]:
+    """
+    解析 sysfs 中的 CPU 列表（如 "0-3,8-11"）
+
+    Args:
+        text: CPU 列表字符串
+
+    Returns:
+        CPU 编号列表
+    """
+    cpus = []
+    for part in (text or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def _sysfs_pci_path(root: Path, bus_id: str) -> Path:
+    """nvidia-smi 的 PCI 地址（00000000:3B:00.0）转换为 sysfs 路径（0000:3b:00.0）"""
+    domain, _, rest = bus_id.strip().lower().partition(":")
+    return root / "sys/bus/pci/devices" / f"{domain[-4:]}:{rest}"
+
+
+def probe_gpus(root: Path = Path("/"), timeout: float = 10.0) -> Dict:
+    """
+    探测 GPU 型号、数量、显存、驱动版本及所在 NUMA 节点
+
+    Args:
+        root: 文件系统根目录（测试时可指向伪造的 sysfs）
+        timeout: nvidia-smi 超时时间（秒）
+
+    Returns:
+        {"count", "driver", "cuda_driver", "devices"}，无 GPU 时 count 为 0
+    """
+    nvidia_smi = shutil.which("nvidia-smi")
+    result = {"count": 0, "driver": None, "cuda_driver": None, "devices": []}
+    if not nvidia_smi:
+        return result
+
+    output = _run([nvidia_smi, "--query-gpu=index,name,memory.total,driver_version,compute_cap,pci.bus_id",
+                   "--format=csv,noheader,nounits"], timeout)
+    for line in (output or "").splitlines():
+        fields = [field.strip() for field in line.split(",")]
+        if len(fields) < 6:
+            continue
+        index, name, memory, driver, compute_cap, bus_id = fields[:6]
+        numa = _read(_sysfs_pci_path(root, bus_id) / "numa_node")
+        try:
+            memory_mb = int(float(memory))
+        except ValueError:
+            memory_mb = None
+        result["devices"].append({
+            "index": int(index) if index.isdigit() else len(result["devices"]),
+            "name": name,
+            "memory_mb": memory_mb,
+            "compute_cap": compute_cap,
+            "pci_bus_id": bus_id,
+            # sysfs 中 -1 表示未知
+            "numa_node": int(numa) if numa and numa.lstrip("-").isdigit() and int(numa) >= 0 else None,
+        })
+        result["driver"] = driver
+    result["count"] = len(result["devices"])
+
+    # 驱动支持的最高 CUDA 版本只出现在 nvidia-smi 的默认输出中
+    header = _run([nvidia_smi], timeout)
+    match = re.search(r"CUDA Version:\s*([\d.]+)", header or "")
+    if match:
+        result["cuda_driver"] = match.group(1)
+    return result
+
+
+def probe_nvcc(timeout: float = 10.0) -> Optional[str]:
+    """探测 nvcc（CUDA 工具包）版本，未安装时返回 None"""
+    nvcc = shutil.which("nvcc")
+    if not nvcc:
+        return None
+    match = re.search(r"release ([\d.]+)", _run([nvcc, "--version"], timeout) or "")
+    return match.group(1) if match else None
+
+
+def probe_cpu(root: Path = Path("/")) -> Dict:
+    """
+    从 /proc 和 sysfs 读取 CPU 拓扑
+
+    Args:
+        root: 文件系统根目录
+
+    Returns:
+        {"model", "sockets", "cores", "logical", "allowed"}
+    """
+    model = None
+    cpuinfo = _read(root / "proc/cpuinfo") or ""
+    match = re.search(r"^model name\s*:\s*(.+)$", cpuinfo, re.MULTILINE)
+    if match:
+        model = match.group(1).strip()
+
+    packages, cores = set(), set()
+    cpu_dirs = sorted((root / "sys/devices/system/cpu").glob("cpu[0-9]*"))
+    for cpu_dir in cpu_dirs:
+        package = _read(cpu_dir / "topology/physical_package_id")
+        core = _read(cpu_dir / "topology/core_id")
+        if package is not None:
+            packages.add(package)
+            cores.add((package, core))
+
+    allowed = None
+    if root == Path("/") and hasattr(os, "sched_getaffinity"):
+        allowed = len(os.sched_getaffinity(0))
+    return {
+        "model": model,
+        "sockets": len(packages) or None,
+        "cores": len(cores) or None,
+        "logical": len(cpu_dirs) or os.cpu_count(),
+        "allowed": allowed,  # 当前进程可用的 CPU 数（受调度器分配限制）
+    }
+
+
+def probe_numa(root: Path = Path("/")) -> List[Dict]:
+    """
+    读取 NUMA 节点布局
+
+    Args:
+        root: 文件系统根目录
+
+    Returns:
+        每个节点一个字典 {"node", "cpus", "memory_mb"}，非 NUMA 系统返回空列表
+    """
+    nodes = []
+    for node_dir in sorted((root / "sys/devices/system/node").glob("node[0-9]*"),
+                           key=lambda path: int(path.name[4:])):
+        meminfo = _read(node_dir / "meminfo") or ""
+        match = re.search(r"MemTotal:\s*(\d+)\s*kB", meminfo)
+        nodes.append({
+            "node": int(node_dir.name[4:]),
+            "cpus": _read(node_dir / "cpulist") or "",
+            "memory_mb": int(match.group(1)) // 1024 if match else None,
+        })
+    return nodes
+
+
+def probe_memory(root: Path = Path("/")) -> Optional[int]:
+    """读取节点内存总量（MB）"""
+    match = re.search(r"MemTotal:\s*(\d+)\s*kB", _read(root / "proc/meminfo") or "")
+    return int(match.group(1)) // 1024 if match else None
+
+
+def probe_torch(python: str, timeout: float = 60.0) -> Dict:
+    """
+    在指定解释器中探测 PyTorch 版本和 CUDA 可用性（导入 torch 可能需要数秒）
+
+    Args:
+        python: Python 解释器路径
+        timeout: 超时时间（秒）
+
+    Returns:
+        {"installed", "version", "cuda", "cuda_available", "device_count", "cudnn"}
+    """
+    output = _run([python, "-c", _TORCH_SCRIPT], timeout)
+    if not output:
+        return {"installed": None, "error": "探测失败或超时"}
+    try:
+        return json.loads(output.strip().splitlines()[-1])
+    except (ValueError, IndexError):
+        return {"installed": None, "error": "无法解析输出"}
+
+
+def probe_node(python: Optional[str] = None, root: Path = Path("/"), timeout: float = 60.0) -> Dict:
+    """
+    并行探测节点能力
+
+    Args:
+        python: 用于探测 PyTorch 的解释器（默认当前解释器）
+        root: 文件系统根目录
+        timeout: 单项探测的超时时间（秒）
+
+    Returns:
+        节点能力字典（可直接序列化为 JSON）
+    """
+    python = python or sys.executable
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=4, thread_name_prefix="probe") as executor:
+        # 耗时的外部命令并行执行
+        torch_future = executor.submit(probe_torch, python, timeout)
+        gpus_future = executor.submit(probe_gpus, root, min(timeout, 10.0))
+        nvcc_future = executor.submit(probe_nvcc, min(timeout, 10.0))
+        cpu, numa, memory = probe_cpu(root), probe_numa(root), probe_memory(root)
+        gpus, nvcc, torch = gpus_future.result(), nvcc_future.result(), torch_future.result()
+
+    return {
+        "schema": SCHEMA_VERSION,
+        "hostname": socket.gethostname(),
+        "probed_at": time.time(),
+        "probe_seconds": round(time.monotonic() - started, 3),
+        "python": python,
+        "gpu": gpus,
+        "cuda": {"driver": gpus.pop("cuda_driver"), "nvcc": nvcc},
+        "cpu": cpu,
+        "numa": numa,
+        "memory_mb": memory,
+        "torch": torch,
+    }
+
+
+def cache_path(cache_dir: str = DEFAULT_CACHE_DIR, hostname: Optional[str] = None) -> Path:
+    """节点缓存文件路径（每个主机名一个文件）"""
+    return Path(os.path.expanduser(cache_dir)) / f"{hostname or socket.gethostname()}.json"
+
+
+def load_node_info(cache_dir: str = DEFAULT_CACHE_DIR, ttl: float = DEFAULT_TTL,
+                   python: Optional[str] = None, refresh: bool = False) -> Dict:
+    """
+    读取节点能力（缓存有效时直接返回缓存，否则重新探测并写入缓存）
+
+    同一节点上同时启动的多个进程通过文件锁只探测一次。
+
+    Args:
+        cache_dir: 缓存目录
+        ttl: 缓存有效期（秒）
+        python: 用于探测 PyTorch 的解释器（与缓存中的不同时重新探测）
+        refresh: 是否忽略缓存
+
+    Returns:
+        节点能力字典，附带 cached 字段表示是否来自缓存
+    """
+    python = python or sys.executable
+    path = cache_path(cache_dir)
+
+    def _cached() -> Optional[Dict]:
+        if refresh:
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (info.get("schema") != SCHEMA_VERSION or info.get("python") != python
+                or time.time() - info.get("probed_at", 0) > ttl):
+            return None
+        info["cached"] = True
+        return info
+
+    info = _cached()
+    if info is not None:
+        return info
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lock_fd = None
+    if fcntl is not None:
+        lock_fd = os.open(str(path) + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+    try:
+        # 等锁期间其他进程可能已经完成探测
+        info = _cached()
+        if info is not None:
+            return info
+        info = probe_node(python)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(info, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        info["cached"] = False
+        return info
+    finally:
+        if lock_fd is not None:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+
+
+def summarize(info: Dict) -> str:
+    """
+    生成一行节点摘要（如 "4x NVIDIA A100 80GB, driver 535.104, CUDA 12.2, 64 cores, 2 NUMA"）
+
+    Args:
+        info: 节点能力字典
+
+    Returns:
+        摘要字符串
+    """
+    parts = []
+    gpu = info.get("gpu") or {}
+    if gpu.get("count"):
+        names = sorted({device["name"] for device in gpu["devices"]})
+        parts.append(f"{gpu['count']}x {'/'.join(names)}")
+        if gpu.get("driver"):
+            parts.append(f"driver {gpu['driver']}")
+    else:
+        parts.append("无 GPU")
+    cuda = (info.get("cuda") or {}).get("driver")
+    if cuda:
+        parts.append(f"CUDA {cuda}")
+    cpu = info.get("cpu") or {}
+    if cpu.get("cores"):
+        parts.append(f"{cpu['cores']} cores")
+    if len(info.get("numa") or []) > 1:
+        parts.append(f"{len(info['numa'])} NUMA")
+    if info.get("memory_mb"):
+        parts.append(f"{info['memory_mb'] / 1024:.0f} GB RAM")
+    torch = info.get("torch") or {}
+    if torch.get("installed"):
+        parts.append(f"torch {torch.get('version')}" + ("" if torch.get("cuda_available") else " (CPU)"))
+    return ", ".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="hpc_run 节点能力探测")
+    parser.add_argument("--refresh", action="store_true", help="忽略缓存重新探测")
+    parser.add_argument("--ttl", type=float, default=DEFAULT_TTL, help="缓存有效期（秒）")
+    parser.add_argument("--cache-dir", type=str, default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--python", type=str, default=None, help="用于探测 PyTorch 的解释器")
+    parser.add_argument("--summary", action="store_true", help="只输出一行摘要")
+    args = parser.parse_args()
+
+    info = load_node_info(args.cache_dir, args.ttl, args.python, args.refresh)
+    if args.summary:
+        print(summarize(info))
+    else:
+        print(json.dumps(info, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
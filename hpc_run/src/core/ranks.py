@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+多节点（多 rank）支持模块
+从调度器或 torchrun 环境变量识别当前 rank，生成按 rank 区分的文件名，并汇总各 rank 的完成标记
+"""
+import os
+import re
+import json
+import time
+import socket
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Mapping, Optional
+
+
+# (rank, world_size, local_rank) 环境变量，按优先级排列
+_RANK_ENV_VARS = (
+    ("RANK", "WORLD_SIZE", "LOCAL_RANK"),                                          # torchrun
+    ("SLURM_PROCID", "SLURM_STEP_NUM_TASKS", "SLURM_LOCALID"),                     # Slurm srun
+    ("OMPI_COMM_WORLD_RANK", "OMPI_COMM_WORLD_SIZE", "OMPI_COMM_WORLD_LOCAL_RANK"),  # Open MPI
+    ("PMI_RANK", "PMI_SIZE", "MPI_LOCALRANKID"),                                    # MPICH / Intel MPI
+)
+
+# 只有同时设置了对应变量时才采用的 rank 变量：sbatch 的批处理脚本也会设置 SLURM_PROCID=0 和 SLURM_NTASKS，
+# 不经 srun 直接运行的包装器只是一个进程，只有 srun 启动的作业步（设置 SLURM_STEP_ID）中才是真正的 rank
+_REQUIRED_ENV_VARS = {"SLURM_PROCID": "SLURM_STEP_ID"}
+
+_JOB_ID_ENV_VARS = ("SLURM_JOB_ID", "PBS_JOBID", "LSB_JOBID", "JOB_ID")
+
+
+@dataclass
+class RankInfo:
+    """当前进程在多节点作业中的位置"""
+    rank: int = 0
+    world_size: int = 1
+    local_rank: int = 0
+    node: str = ""
+    job_id: Optional[str] = None
+
+    @property
+    def is_distributed(self) -> bool:
+        """是否为多 rank 作业"""
+        return self.world_size > 1
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def detect_rank(environ: Optional[Mapping[str, str]] = None) -> RankInfo:
+    """
+    从环境变量识别 rank 和 world size
+
+    Args:
+        environ: 环境变量（默认 os.environ）
+
+    Returns:
+        RankInfo，单进程运行时 rank=0、world_size=1
+    """
+    environ = os.environ if environ is None else environ
+    info = RankInfo(node=environ.get("SLURMD_NODENAME") or socket.gethostname())
+    info.job_id = next((environ[name] for name in _JOB_ID_ENV_VARS if environ.get(name)), None)
+
+    for rank_var, size_var, local_var in _RANK_ENV_VARS:
+        required = _REQUIRED_ENV_VARS.get(rank_var)
+        if required and not environ.get(required):
+            continue
+        if environ.get(rank_var) and environ.get(size_var):
+            try:
+                info.rank = int(environ[rank_var])
+                info.world_size = int(environ[size_var])
+                info.local_rank = int(environ.get(local_var) or 0)
+            except ValueError:
+                continue
+            break
+    return info
+
+
+def rank_file_name(name: str, rank_info: RankInfo) -> str:
+    """
+    生成按 rank 区分的文件名，单 rank 时保持原文件名
+
+    例如 .train_complete.json -> .train_complete.rank3.json，train_x.log -> train_x.rank3.log
+
+    Args:
+        name: 原文件名
+        rank_info: rank 信息
+
+    Returns:
+        文件名
+    """
+    if not rank_info.is_distributed:
+        return name
+    stem, dot, suffix = name.rpartition(".")
+    if not stem:
+        return f"{name}.rank{rank_info.rank}"
+    return f"{stem}.rank{rank_info.rank}{dot}{suffix}"
+
+
+def collect_rank_markers(work_dir: Path, marker_file: str) -> List[Dict]:
+    """
+    读取工作目录下所有 rank 的完成标记文件
+
+    Args:
+        work_dir: 工作目录
+        marker_file: 标记文件名（单 rank 形式，如 .train_complete.json）
+
+    Returns:
+        按 rank 排序的完成信息列表（附带 marker_path 字段）
+    """
+    stem, _, suffix = marker_file.rpartition(".")
+    pattern = re.compile(re.escape(stem) + r"\.rank(\d+)\." + re.escape(suffix) + "$")
+    markers = []
+    for path in Path(work_dir).glob(f"{stem}.rank*.{suffix}"):
+        match = pattern.search(path.name)
+        if not match:
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            continue  # 可能正在写入，下次再读
+        info.setdefault("rank", int(match.group(1)))
+        info["marker_path"] = str(path)
+        markers.append(info)
+    markers.sort(key=lambda item: item.get("rank", 0))
+    return markers
+
+
+def sum_rank_energy(markers: List[Dict]) -> Optional[Dict]:
+    """
+    合计各 rank 的能耗
+
+    GPU 能耗只统计各 rank 可见的 GPU，直接相加；RAPL 统计整个 CPU 封装，同一节点上的多个 rank
+    读到的是同一份计数，每个节点只计一次。
+
+    Args:
+        markers: 各 rank 的完成标记
+
+    Returns:
+        总能耗（kWh）、GPU/CPU 分项、平均功率和每步能耗，没有任何 rank 记录能耗时返回 None
+    """
+    gpu_kwh = cpu_kwh = 0.0
+    has_gpu = has_cpu = False
+    nodes = set()
+    duration = 0.0
+    energies = []
+    for item in markers:
+        energy = (item.get("resources") or {}).get("energy")
+        if not energy or energy.get("total_kwh") is None:
+            continue
+        energies.append(energy)
+        duration = max(duration, energy.get("duration_seconds") or 0.0)
+        if energy.get("gpu_kwh") is not None:
+            gpu_kwh += energy["gpu_kwh"]
+            has_gpu = True
+        node = item.get("hostname") or item.get("rank")
+        if energy.get("cpu_kwh") is not None and node not in nodes:
+            nodes.add(node)
+            cpu_kwh += energy["cpu_kwh"]
+            has_cpu = True
+    if not energies:
+        return None
+    total = gpu_kwh + cpu_kwh
+    summary = {
+        "total_kwh": round(total, 6),
+        "gpu_kwh": round(gpu_kwh, 6) if has_gpu else None,
+        "cpu_kwh": round(cpu_kwh, 6) if has_cpu else None,
+        "avg_watts": round(total * 3.6e6 / duration, 1) if duration > 0 else None,
+        "peak_watts": None,  # 各节点的峰值不在同一时刻，不能相加
+        "duration_seconds": round(duration, 1),
+        "ranks": len(energies),
+    }
+    steps = energies[0].get("steps")
+    if steps:
+        summary["steps"] = steps
+        summary["joules_per_step"] = round(total * 3.6e6 / steps, 2)
+    return summary
+
+
+def aggregate_rank_markers(markers: List[Dict], rank_timeout: Optional[float] = None,
+                           now: Optional[float] = None) -> Optional[Dict]:
+    """
+    汇总各 rank 的完成标记
+
+    所有 rank 都完成，或任一 rank 以非零退出码结束时返回汇总结果。第一个 rank 结束超过 rank_timeout 秒后
+    其余 rank 仍未写入标记时（如节点故障、rank 被直接杀死）按未完成汇总，列出缺少的 rank；
+    否则返回 None（继续等待）。
+
+    Args:
+        markers: collect_rank_markers 的返回值
+        rank_timeout: 等待其余 rank 的最长时间（秒），None 或 0 表示一直等待
+        now: 当前时间（Unix 时间戳，默认 time.time()）
+
+    Returns:
+        汇总后的完成信息（格式与单 rank 完成标记兼容，附带 ranks 列表），未就绪时返回 None
+    """
+    if not markers:
+        return None
+    world_size = max(int(item.get("world_size") or 1) for item in markers)
+    failed = [item for item in markers if item.get("return_code") not in (0, None)]
+    missing = sorted(set(range(world_size)) - {item.get("rank") for item in markers})
+    if missing and not failed:
+        first_finished = min((item["timestamp"] for item in markers if item.get("timestamp")), default=None)
+        if not rank_timeout or first_finished is None:
+            return None
+        if (time.time() if now is None else now) - first_finished < rank_timeout:
+            return None
+
+    first = markers[0]
+    slowest = max(markers, key=lambda item: item.get("elapsed_seconds") or 0)
+    # 失败时优先展示第一个失败 rank 的日志
+    focus = failed[0] if failed else first
+    # 内存：优先被 OOM 杀死的 rank，其次失败的 rank，否则为峰值内存最高的 rank
+    oom = [item for item in markers if item.get("oom_killed")]
+    with_memory = [item for item in markers if item.get("memory")]
+    if oom:
+        memory_rank = oom[0]
+    elif failed and focus.get("memory"):
+        memory_rank = focus
+    else:
+        memory_rank = max(with_memory, key=lambda item: item["memory"].get("peak_mb") or 0, default=focus)
+    # 检查点通常只由一个 rank 写入，取实际记录到检查点的 rank
+    checkpoint_rank = next((item for item in markers if (item.get("checkpoint_io") or {}).get("count")),
+                           next((item for item in markers if item.get("checkpoint_io")), first))
+    # 预拷贝最慢的节点决定了训练开始的时间
+    stage_rank = max(markers, key=lambda item: (item.get("stage") or {}).get("seconds") or 0)
+    aggregated = {
+        "status": "failed" if failed else ("incomplete" if missing else "completed"),
+        "start_time": min((item["start_time"] for item in markers if item.get("start_time")), default=None),
+        "end_time": max((item["end_time"] for item in markers if item.get("end_time")), default=None),
+        "start_timestamp": min((item["start_timestamp"] for item in markers if item.get("start_timestamp")),
+                               default=None),
+        "elapsed_seconds": slowest.get("elapsed_seconds"),
+        # 有 rank 未结束时整个作业的退出码未知
+        "return_code": focus.get("return_code") if failed or not missing else None,
+        "command": first.get("command"),
+        "work_dir": first.get("work_dir"),
+        "log_file": focus.get("log_file"),
+        "timestamp": max(item.get("timestamp") or 0 for item in markers),
+        "job_id": first.get("job_id"),
+        "world_size": world_size,
+        "finished_ranks": len(markers),
+        "missing_ranks": missing,
+        "slowest_rank": slowest.get("rank"),
+        "failed_rank": failed[0].get("rank") if failed else None,
+        "resources": slowest.get("resources"),
+        "step_times": slowest.get("step_times"),
+        "events_file": focus.get("events_file"),
+        "ranks": markers,
+    }
+    # 以下字段与单 rank 完成标记一致，没有记录时不写入
+    optional = {
+        "error_index": focus.get("error_index"),
+        "memory": memory_rank.get("memory"),
+        "checkpoint_io": checkpoint_rank.get("checkpoint_io"),
+        "restarts": focus.get("restarts"),
+        "stage": stage_rank.get("stage"),
+        "energy": sum_rank_energy(markers),
+        "release": focus.get("release"),
+    }
+    aggregated.update((key, value) for key, value in optional.items() if value)
+    if with_memory:
+        aggregated["oom_killed"] = bool(oom)
+    return aggregated
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+资源释放模块
+训练结束、完成标记写入后按配置释放计算资源：退出交互式分配的 shell、scancel 当前作业或执行自定义命令。
+释放前有安全等待时间，日志末尾出现指定关键字或工作目录中存在保留文件时取消释放，dry_run 只记录不执行
+"""
+import os
+import shlex
+import signal
+import subprocess
+import threading
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional
+
+import psutil
+
+
+RELEASE_ACTIONS = ("exit_shell", "scancel", "command")
+
+# 交互式分配中 shell 的父进程（salloc 在本地启动 shell，srun --pty / 调度器守护进程在计算节点启动 shell）
+SHELL_LAUNCHERS = {"salloc", "srun", "slurmstepd", "pbs_mom"}
+SHELLS = {"bash", "sh", "zsh", "fish", "tcsh", "csh", "ksh", "dash"}
+
+
+@dataclass
+class ReleasePolicy:
+    """资源释放策略"""
+    action: str = "scancel"
+    command: str = ""
+    when: str = "always"
+    delay: float = 120.0
+    abort_keywords: List[str] = field(default_factory=list)
+    abort_file: str = ".keep_allocation"
+    tail_lines: int = 200
+    dry_run: bool = False
+
+    @classmethod
+    def from_config(cls, release_config: dict) -> Optional["ReleasePolicy"]:
+        """
+        按配置创建释放策略
+
+        Args:
+            release_config: 配置中的 train.on_complete 段
+
+        Returns:
+            ReleasePolicy，未启用时返回 None
+
+        Raises:
+            ValueError: action 或 when 无效，或 action 为 command 但未配置 command
+        """
+        if not release_config.get('enabled', False):
+            return None
+        policy = cls(
+            action=release_config.get('action', 'scancel'),
+            command=release_config.get('command') or "",
+            when=release_config.get('when', 'always'),
+            delay=float(release_config.get('delay', 120)),
+            abort_keywords=[str(keyword) for keyword in release_config.get('abort_keywords') or []],
+            abort_file=release_config.get('abort_file', '.keep_allocation') or "",
+            tail_lines=int(release_config.get('tail_lines', 200)),
+            dry_run=bool(release_config.get('dry_run', False)),
+        )
+        if policy.action not in RELEASE_ACTIONS:
+            raise ValueError(f"未知的 action: {policy.action}（可选 {', '.join(RELEASE_ACTIONS)}）")
+        if policy.when not in ("always", "success", "failure"):
+            raise ValueError(f"未知的 when: {policy.when}（可选 always、success、failure）")
+        if policy.action == "command" and not policy.command:
+            raise ValueError("action 为 command 时必须配置 command")
+        return policy
+
+    def applies(self, return_code: int) -> bool:
+        """按 when 判断本次退出码是否需要释放"""
+        if self.when == "success":
+            return return_code == 0
+        if self.when == "failure":
+            return return_code != 0
+        return True
+
+    def abort_reason(self, log_lines: List[str], work_dir: Path) -> Optional[str]:
+        """
+        检查是否应取消释放
+
+        Args:
+            log_lines: 日志最后几行
+            work_dir: 工作目录（abort_file 的相对路径基准）
+
+        Returns:
+            取消原因，无需取消时返回 None
+        """
+        if self.abort_file and (Path(work_dir) / self.abort_file).exists():
+            return f"存在保留文件 {self.abort_file}"
+        for keyword in self.abort_keywords:
+            for line in log_lines:
+                if keyword in line:
+                    return f"日志包含关键字 {keyword!r}: {line.strip()[:200]}"
+        return None
+
+
+def allocation_shell(pid: Optional[int] = None) -> Optional[psutil.Process]:
+    """
+    查找当前进程所在交互式分配的 shell
+
+    沿父进程向上查找父进程为 salloc、srun 或调度器守护进程的 shell，即退出后分配随之结束的那个 shell。
+
+    Args:
+        pid: 起始进程 PID（默认当前进程）
+
+    Returns:
+        shell 进程，不在交互式分配中（如批处理作业）时返回 None
+    """
+    try:
+        process = psutil.Process(pid or os.getpid())
+        for ancestor in process.parents():
+            parent = ancestor.parent()
+            if parent is None:
+                break
+            if ancestor.name() in SHELLS and parent.name() in SHELL_LAUNCHERS:
+                return ancestor
+    except psutil.Error:
+        return None
+    return None
+
+
+def release_argv(policy: ReleasePolicy, environ: Optional[Mapping[str, str]] = None,
+                 **values) -> List[str]:
+    """
+    生成 scancel 或自定义释放命令的参数列表
+
+    Args:
+        policy: 释放策略
+        environ: 环境变量（默认 os.environ，读取 SLURM_JOB_ID）
+        **values: 自定义命令中可用的其他占位符（如 return_code、work_dir、marker）
+
+    Returns:
+        参数列表
+
+    Raises:
+        RuntimeError: scancel 时找不到作业 ID
+    """
+    environ = os.environ if environ is None else environ
+    job_id = environ.get("SLURM_JOB_ID") or environ.get("PBS_JOBID") or ""
+    if policy.action == "scancel":
+        if not job_id:
+            raise RuntimeError("未找到 SLURM_JOB_ID，无法 scancel")
+        return ["scancel", job_id]
+    return shlex.split(policy.command.format(job_id=job_id, **values))
+
+
+def execute_release(policy: ReleasePolicy, argv: Optional[List[str]], timeout: float = 60.0) -> Dict:
+    """
+    执行释放动作
+
+    释放期间忽略 SIGTERM 和 SIGHUP：scancel 和退出 shell 都会向包装器自身发送这些信号，
+    忽略后包装器仍能记录释放结果（调度器在 KillWait 之后才会强制结束）。
+
+    Args:
+        policy: 释放策略
+        argv: scancel 或自定义命令的参数列表（exit_shell 时忽略）
+        timeout: 命令超时时间（秒）
+
+    Returns:
+        包含 status（released / failed）和 detail 的字典
+    """
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGTERM, getattr(signal, 'SIGHUP', None)):
+            if signum is not None:
+                signal.signal(signum, signal.SIG_IGN)
+
+    if policy.action == "exit_shell":
+        shell = allocation_shell()
+        if shell is None:
+            return {"status": "failed", "detail": "未找到交互式分配的 shell"}
+        try:
+            # 交互式 shell 忽略 SIGTERM，SIGHUP 使其退出，salloc 随之释放分配
+            shell.send_signal(signal.SIGHUP)
+        except psutil.Error as e:
+            return {"status": "failed", "detail": f"向 shell（PID {shell.pid}）发送 SIGHUP 失败: {e}"}
+        return {"status": "released", "detail": f"已向 shell（PID {shell.pid}）发送 SIGHUP"}
+
+    try:
+        result = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                timeout=timeout, text=True)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return {"status": "failed", "detail": str(e)}
+    output = result.stdout.strip()[-500:]
+    if result.returncode != 0:
+        return {"status": "failed", "detail": f"退出码 {result.returncode}: {output}"}
+    return {"status": "released", "detail": output}
@@ -3,7 +3,9 @@
 报告生成模块
 负责生成任务执行的基础报告
 """
-from typing import Dict
+import shlex
+import statistics
+from typing import Dict, List, Optional
 
 
 class ReportGenerator:
@@ -69,3 +71,462 @@ class ReportGenerator:
 """
         
         return report
+    
+    def generate_history_markdown(self, elapsed: Optional[float], runtimes: List[float],
+                                  slow_factor: float = 1.5) -> str:
+        """
+        生成与历史运行对比的 Markdown 片段
+        
+        Args:
+            elapsed: 本次运行时长（秒）
+            runtimes: 同一命令最近成功运行的时长列表（秒）
+            slow_factor: 超过历史中位数多少倍视为慢运行
+            
+        Returns:
+            Markdown 格式的报告片段
+        """
+        median = statistics.median(runtimes)
+        report = f"""
+### 历史对比
+
+**历史中位数:** {median:.2f}s（最近 {len(runtimes)} 次成功运行）  
+**历史范围:** {min(runtimes):.2f}s ~ {max(runtimes):.2f}s  
+"""
+        if elapsed is not None and median > 0:
+            ratio = float(elapsed) / median
+            report += f"**本次/中位数:** {ratio:.2f}x\n"
+            if ratio > slow_factor:
+                report += f"\n⚠️ **本次运行明显慢于历史记录（超过 {slow_factor} 倍）**\n"
+        
+        return report
+    
+    def generate_progress_markdown(self, entries: List[Dict], elapsed: Optional[float] = None) -> str:
+        """
+        生成训练进度摘要的 Markdown 消息（多个 rank/作业合并为一条）
+        
+        Args:
+            entries: ProgressDigest.entries() 的返回值
+            elapsed: 已运行时长（秒，可选）
+        
+        Returns:
+            Markdown 格式的消息
+        """
+        report = "## 训练进度\n\n"
+        if elapsed is not None:
+            report += f"**已运行:** {elapsed / 3600:.1f}h\n\n"
+        
+        for entry in entries:
+            steps = entry.get('steps')
+            total = entry.get('total_steps')
+            if steps is None:
+                progress = "无 step 输出"
+            elif total:
+                progress = f"step {steps}/{total} ({steps / total * 100:.1f}%)"
+            else:
+                progress = f"step {steps}"
+            parts = [progress]
+            rate = entry.get('steps_per_second')
+            if rate is not None:
+                parts.append(f"{rate:.2f} steps/s")
+                if total and steps is not None and rate > 0 and total > steps:
+                    parts.append(f"剩余约 {(total - steps) / rate / 3600:.1f}h")
+            if entry.get('gpu') is not None:
+                parts.append(f"GPU {entry['gpu']:.0f}%")
+            if entry.get('exited'):
+                parts.append("已退出")
+            elif (entry.get('idle_seconds') or 0) > 600:
+                parts.append(f"⚠️ {entry['idle_seconds'] / 60:.0f} 分钟无输出")
+            report += f"- **{entry.get('label')}:** {'，'.join(parts)}\n"
+        
+        return report
+    
+    def generate_errors_markdown(self, error_index: Dict, contexts: List) -> str:
+        """
+        生成错误定位的 Markdown 片段
+        
+        Args:
+            error_index: 完成标记文件中的 error_index 字段
+            contexts: (标题, 索引条目, 上下文行列表) 列表
+        
+        Returns:
+            Markdown 格式的报告片段
+        """
+        report = f"""
+### 错误定位
+
+**错误行数:** {error_index.get('errors')}  
+**警告行数:** {error_index.get('warnings')}
+"""
+        for title, entry, lines in contexts:
+            report += f"\n**{title}**（训练输出第 {entry.get('line')} 行）: `{entry.get('text')}`\n\n```\n"
+            report += "".join(lines)
+            report += "\n```\n"
+        
+        return report
+    
+    def generate_memory_warning_markdown(self, warning: Dict) -> str:
+        """
+        生成内存预警消息
+        
+        Args:
+            warning: memory_warning 事件
+        
+        Returns:
+            Markdown 格式的消息
+        """
+        report = f"""## 内存预警
+
+**使用量:** {warning.get('used_mb')} MB / {warning.get('limit_mb')} MB（{(warning.get('fraction') or 0):.0%}，上限来自 {warning.get('limit_source')}）  
+"""
+        if warning.get('growth_mb_per_min') is not None:
+            report += f"**增长速率:** {warning['growth_mb_per_min']} MB/min  \n"
+        if warning.get('eta_seconds') is not None:
+            report += f"**预计 OOM:** 约 {warning['eta_seconds'] / 60:.0f} 分钟后  \n"
+        if warning.get('psi_some_avg10') is not None:
+            report += f"**内存压力 (PSI some avg10):** {warning['psi_some_avg10']}%  \n"
+        
+        return report
+    
+    def generate_checkpoint_slow_markdown(self, event: Dict) -> str:
+        """
+        生成检查点写入变慢的提醒消息
+        
+        Args:
+            event: checkpoint_slow 事件
+        
+        Returns:
+            Markdown 格式的消息
+        """
+        size_mb = (event.get('size_bytes') or 0) / 1024 / 1024
+        baseline = event.get('baseline_mbps')
+        bandwidth = event.get('bandwidth_mbps')
+        ratio = f"，为基线的 {bandwidth / baseline:.0%}" if bandwidth is not None and baseline else ""
+        return f"""## 检查点写入变慢
+
+**检查点:** {event.get('name')}（{size_mb:.1f} MB）  
+**写入带宽:** {bandwidth} MB/s（基线 {baseline} MB/s{ratio}）  
+**耗时:** {event.get('duration')}s  
+"""
+    
+    def generate_memory_markdown(self, memory: Dict) -> str:
+        """
+        生成内存上限与峰值的 Markdown 片段（OOM 时附峰值内存时间线）
+        
+        Args:
+            memory: 完成标记文件中的 memory 字段
+        
+        Returns:
+            Markdown 格式的报告片段
+        """
+        report = "\n### 内存\n\n"
+        if memory.get('oom_killed'):
+            report += "❌ **OOM-killed:** 训练进程因内存不足被杀死\n\n"
+        limit = memory.get('limit_mb')
+        fraction = memory.get('peak_fraction')
+        source = memory.get('limit_source')
+        if memory.get('peak_mb') is None:
+            # 进程在第一次采样前退出，只有上限
+            report += "**峰值:** 无采样数据" + (f" / 上限 {limit} MB（来自 {source}）" if limit else "") + "  \n"
+        else:
+            report += (f"**峰值:** {memory['peak_mb']} MB"
+                       + (f" / 上限 {limit} MB（{fraction:.0%}，来自 {source}）" if limit else "")
+                       + "  \n")
+        if memory.get('psi_some_avg10_max') is not None:
+            report += f"**最大内存压力 (PSI some avg10):** {memory['psi_some_avg10_max']}%  \n"
+        warnings = memory.get('warnings') or []
+        if warnings:
+            report += f"**预警次数:** {len(warnings)}（首次于 {warnings[0].get('used_mb')} MB）  \n"
+        
+        timeline = memory.get('timeline') or []
+        if timeline:
+            # 最多取 12 个点，保留峰值所在的点
+            step = -(-len(timeline) // 12)
+            points = timeline[::step]
+            peak = max(timeline, key=lambda p: p.get('mem_mb') or 0)
+            if peak not in points:
+                points = sorted(points + [peak], key=lambda p: p['t'])
+            start = timeline[0]['t']
+            report += "\n| 时间 | 内存 | PSI |\n|---|---|---|\n"
+            for point in points:
+                psi = point.get('psi')
+                offset = point['t'] - start
+                offset = f"+{offset / 60:.1f} min" if timeline[-1]['t'] - start >= 120 else f"+{offset:.0f}s"
+                report += (f"| {offset} | {point['mem_mb']} MB "
+                           f"| {f'{psi}%' if psi is not None else 'N/A'} |\n")
+        
+        return report
+    
+    def generate_node_markdown(self, node: Dict) -> str:
+        """
+        生成运行节点信息的 Markdown 片段
+        
+        Args:
+            node: 完成标记文件中的 node_probe 字段（节点能力探测结果）
+        
+        Returns:
+            Markdown 格式的报告片段
+        """
+        from .probe import summarize
+        return f"""
+### 运行节点
+
+**{node.get('hostname', 'N/A')}:** {summarize(node)}
+"""
+    
+    def generate_restarts_markdown(self, restarts: Dict) -> str:
+        """
+        生成自动重启记录的 Markdown 片段
+        
+        Args:
+            restarts: 完成标记文件中的 restarts 字段
+        
+        Returns:
+            Markdown 格式的报告片段
+        """
+        status = {
+            "succeeded": "✅ 一次成功",
+            "recovered": "✅ 重启后成功",
+            "exhausted": "❌ 重启次数或时间用尽",
+            "failed": "❌ 失败（不可重试）",
+        }.get(restarts.get('final_status'), restarts.get('final_status'))
+        report = f"""
+### 自动重启
+
+**最终状态:** {status}  
+**重启次数:** {restarts.get('restarts')}  
+**浪费时长:** {restarts.get('wasted_seconds')}s
+"""
+        attempts = restarts.get('attempts') or []
+        if len(attempts) > 1 or restarts.get('final_status') != 'succeeded':
+            report += "\n| 次数 | 开始时间 | 运行时长 | 退出码 | 恢复自 | 原因 |\n"
+            report += "|---|---|---|---|---|---|\n"
+            for attempt in attempts:
+                report += (f"| {attempt.get('attempt')} | {attempt.get('start_time')} "
+                           f"| {attempt.get('elapsed_seconds')}s | {attempt.get('return_code')} "
+                           f"| {attempt.get('resume_from') or '-'} | {attempt.get('reason') or '-'} |\n")
+        
+        return report
+    
+    def generate_checkpoint_markdown(self, checkpoint_io: Dict) -> str:
+        """
+        生成检查点 I/O 的 Markdown 片段
+        
+        Args:
+            checkpoint_io: 完成标记文件中的 checkpoint_io 字段
+        
+        Returns:
+            Markdown 格式的报告片段
+        """
+        fraction = checkpoint_io.get('time_fraction')
+        bandwidth = checkpoint_io.get('mean_bandwidth_mbps')
+        report = f"""
+### 检查点 I/O
+
+**检查点数:** {checkpoint_io.get('count')}（共 {checkpoint_io.get('total_mb')} MB）  
+**写入耗时:** {checkpoint_io.get('total_seconds')}s{f"（占运行时间 {fraction:.1%}）" if fraction is not None else ""}  
+**平均写入带宽:** {f"{bandwidth} MB/s" if bandwidth is not None else "N/A"}
+"""
+        for slow in checkpoint_io.get('slow') or []:
+            report += (f"\n⚠️ **写入变慢:** {slow['name']} {slow['bandwidth_mbps']} MB/s，"
+                       f"基线 {slow['baseline_mbps']} MB/s\n")
+        
+        return report
+    
+    def generate_stage_markdown(self, stage: Dict) -> str:
+        """
+        生成数据集预拷贝的 Markdown 片段
+        
+        Args:
+            stage: 完成标记文件中的 stage 字段
+        
+        Returns:
+            Markdown 格式的报告片段
+        """
+        if stage.get('error'):
+            return f"\n### 数据集预拷贝\n\n❌ 预拷贝失败，使用原路径: {stage['error']}\n"
+        bandwidth = stage.get('bandwidth_mbps')
+        command = f"  \n**改写后的命令:** `{stage['command']}`" if stage.get('command') else ""
+        report = f"""
+### 数据集预拷贝
+
+**本地目录:** `{stage.get('dir')}`{"（已清理）" if stage.get('cleaned_up') else ""}  
+**耗时:** {stage.get('seconds')}s，复制 {stage.get('copied_mb')} MB，跳过未变化的 {stage.get('skipped_mb')} MB  
+**带宽:** {f"{bandwidth} MB/s" if bandwidth is not None else "N/A"}{command}
+
+| 源路径 | 本地副本 | 方式 | 文件数 | 复制 | 耗时 | 带宽 |
+|--------|----------|------|--------|------|------|------|
+"""
+        for item in stage.get('paths') or []:
+            if item.get('error'):
+                report += f"| `{item['source']}` | ❌ {item['error']} | {item['mode']} | | | | |\n"
+                continue
+            bandwidth = item.get('bandwidth_mbps')
+            report += (f"| `{item['source']}` | `{item['local']}` | {item['mode']} "
+                       f"| {item['files']}（跳过 {item['skipped_files']}） | {item['copied_mb']} MB "
+                       f"| {item['seconds']}s | {f'{bandwidth} MB/s' if bandwidth is not None else 'N/A'} |\n")
+        
+        return report
+    
+    def generate_release_markdown(self, release: Dict) -> str:
+        """
+        生成计算资源释放的 Markdown 片段
+        
+        Args:
+            release: 完成标记文件中的 release 字段（已合并包装器的 release 事件）
+        
+        Returns:
+            Markdown 格式的报告片段
+        """
+        status = {
+            "released": "✅ 已释放",
+            "dry_run": "📝 dry run（未执行）",
+            "pending": "⏳ 等待释放（未收到结果）",
+            "aborted": "⏸️ 已取消",
+            "skipped": "➖ 未释放",
+            "failed": "❌ 释放失败",
+        }.get(release.get('status'), release.get('status'))
+        action = shlex.join(release['argv']) if release.get('argv') else release.get('action')
+        lines = [f"**状态:** {status}", f"**动作:** {action}"]
+        if release.get('exit_to_release_seconds') is not None:
+            lines.append(f"**训练结束到释放:** {release['exit_to_release_seconds']}s"
+                         f"（安全延迟 {release.get('delay_seconds')}s）")
+        if release.get('reason'):
+            lines.append(f"**原因:** {release['reason']}")
+        if release.get('detail') and release.get('status') == 'failed':
+            lines.append(f"**错误:** {release['detail']}")
+        
+        return "\n### 计算资源释放\n\n" + "  \n".join(lines) + "\n"
+    
+    def generate_step_markdown(self, step_times: Dict) -> str:
+        """
+        生成步时分布的 Markdown 片段
+        
+        Args:
+            step_times: 完成标记文件中的 step_times 字段
+            
+        Returns:
+            Markdown 格式的报告片段
+        """
+        observed = step_times.get('observed_steps')
+        resumed = f"（本次运行 {observed} 步）" if observed and observed != step_times.get('steps') else ""
+        report = f"""
+### 步时分布
+
+**步数:** {step_times.get('steps')}{resumed}  
+**平均步时:** {step_times.get('mean')}s  
+**p50 / p95 / p99:** {step_times.get('p50')}s / {step_times.get('p95')}s / {step_times.get('p99')}s
+"""
+        if step_times.get('baseline') is not None:
+            report += f"**基线步时:** {step_times['baseline']}s\n"
+        
+        for slowdown in step_times.get('slowdowns') or []:
+            recovered = slowdown.get('recovered_step')
+            status = f"于 step {recovered} 恢复" if recovered is not None else "未恢复"
+            report += (f"\n⚠️ **持续降速:** step {slowdown['step']}（开始后 {slowdown['elapsed']}s）"
+                       f"步时 {slowdown['step_time']}s，为基线的 "
+                       f"{slowdown['step_time'] / slowdown['baseline']:.1f} 倍，{status}\n")
+        
+        return report
+    
+    def generate_ranks_markdown(self, completion_info: Dict) -> str:
+        """
+        生成多节点作业各 rank 汇总的 Markdown 片段
+        
+        Args:
+            completion_info: 汇总后的完成信息（包含 ranks 列表）
+            
+        Returns:
+            Markdown 格式的报告片段
+        """
+        ranks = completion_info.get('ranks') or []
+        world_size = completion_info.get('world_size', len(ranks))
+        report = f"""
+### 各节点汇总
+
+**作业 ID:** {completion_info.get('job_id') or 'N/A'}  
+**已结束 rank:** {len(ranks)}/{world_size}
+"""
+        if completion_info.get('failed_rank') is not None:
+            report += f"\n❌ **rank {completion_info['failed_rank']} 首先失败**\n"
+        missing = completion_info.get('missing_ranks')
+        if missing and completion_info.get('status') == 'incomplete':
+            report += f"\n⚠️ **超时未结束的 rank:** {', '.join(str(rank) for rank in missing)}\n"
+        
+        report += "\n| rank | 节点 | 运行时长 | 退出码 | CPU 平均 | GPU 平均 | 峰值内存 |\n"
+        report += "|---|---|---|---|---|---|---|\n"
+        for item in ranks:
+            resources = item.get('resources') or {}
+            gpu = resources.get('gpu_avg')
+            rank = item.get('rank')
+            label = f"**{rank}** 🐢" if rank == completion_info.get('slowest_rank') and len(ranks) > 1 else f"{rank}"
+            report += (f"| {label} | {item.get('node') or item.get('hostname', 'N/A')} "
+                       f"| {item.get('elapsed_seconds')}s | {item.get('return_code')} "
+                       f"| {resources.get('cpu_avg', 'N/A')}% "
+                       f"| {f'{gpu}%' if gpu is not None else 'N/A'} "
+                       f"| {resources.get('max_memory_mb', 'N/A')} MB |\n")
+        
+        if len(ranks) > 1:
+            report += f"\n🐢 最慢 rank: {completion_info.get('slowest_rank')}\n"
+        energy = completion_info.get('energy')
+        if energy:
+            report += f"\n{self._energy_lines(energy)}"
+        
+        return report
+    
+    def _energy_lines(self, energy: Optional[Dict]) -> str:
+        """能耗的 Markdown 行（单 rank 的资源汇总和多 rank 的合计共用）"""
+        if not energy or energy.get('total_kwh') is None:
+            return ""
+        parts = [f"{name} {energy[key]} kWh" for name, key in (("GPU", 'gpu_kwh'), ("CPU", 'cpu_kwh'))
+                 if energy.get(key) is not None]
+        peak = f"，峰值 {energy['peak_watts']} W" if energy.get('peak_watts') is not None else ""
+        lines = (f"**能耗:** {energy['total_kwh']} kWh（{' / '.join(parts)}），"
+                 f"平均 {energy.get('avg_watts')} W{peak}  \n")
+        if energy.get('joules_per_step') is not None:
+            lines += f"**每步能耗:** {energy['joules_per_step']} J（{energy['steps']} 步）  \n"
+        return lines
+    
+    def generate_resources_markdown(self, resources: Dict) -> str:
+        """
+        生成资源使用和瓶颈判断的 Markdown 片段
+        
+        Args:
+            resources: 完成标记文件中的 resources 字段
+            
+        Returns:
+            Markdown 格式的报告片段
+        """
+        gpu = resources.get('gpu_avg')
+        report = f"""
+### 资源使用
+
+**CPU 平均:** {resources.get('cpu_avg')}%  
+**GPU 平均:** {f'{gpu}%' if gpu is not None else 'N/A'}  
+**峰值内存:** {resources.get('max_memory_mb')} MB
+"""
+        io = resources.get('io')
+        if io:
+            report += (f"**磁盘读取:** {io.get('read_mb')} MB（{io.get('read_ops')} 次，"
+                       f"峰值 {io.get('peak_read_mbps')} MB/s）  \n"
+                       f"**磁盘写入:** {io.get('write_mb')} MB（{io.get('write_ops')} 次，"
+                       f"峰值 {io.get('peak_write_mbps')} MB/s）  \n")
+        network = resources.get('network')
+        if network:
+            report += f"**节点网络:** 接收 {network.get('rx_mb')} MB / 发送 {network.get('tx_mb')} MB  \n"
+        report += self._energy_lines(resources.get('energy'))
+        sampling = resources.get('sampling')
+        if sampling and sampling.get('samples'):
+            triggers = "、".join(f"{reason} ×{count}" for reason, count in sampling.get('triggers', {}).items())
+            report += (f"**采样:** {sampling['mode']}，{sampling['samples']} 次"
+                       f"（按 {sampling.get('min_interval')}s 固定间隔需 {sampling.get('fixed_rate_samples')} 次），"
+                       f"开销 CPU {sampling.get('cpu_seconds')} s（{sampling.get('cpu_ms_per_sample')} ms/次）"
+                       f"{f'，突发触发: {triggers}' if triggers else ''}  \n")
+        fs_latency = resources.get('fs_latency_ms')
+        if fs_latency:
+            report += f"**工作目录元数据延迟:** 平均 {fs_latency.get('avg')} ms / 最大 {fs_latency.get('max')} ms  \n"
+        
+        bottleneck = resources.get('bottleneck')
+        if bottleneck and bottleneck.get('label') != 'unknown':
+            report += f"\n**瓶颈判断:** `{bottleneck['label']}` — {bottleneck.get('reason')}\n"
+        
+        return report
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+自动重启模块
+根据退出码和日志中的错误特征判断失败是否为瞬时故障（NCCL 超时、ECC 错误、数据服务断连等），
+在同一次资源分配内按有限次数和退避间隔重启训练，并把命令指向最新的检查点
+"""
+import os
+import re
+import glob
+import shlex
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Mapping, Optional, Tuple
+
+
+# 默认视为瞬时故障的日志特征
+DEFAULT_RETRYABLE_PATTERNS = [
+    r"NCCL.*(?:[Tt]imeout|timed out)",
+    r"Watchdog caught collective operation timeout",
+    r"NCCL error.*(?:unhandled system error|remote process exited)",
+    r"uncorrectable ECC error",
+    r"CUDA error: (?:ECC error|uncorrectable NVLink error|unspecified launch failure)",
+    r"Connection reset by peer",
+    r"Temporary failure in name resolution",
+    r"(?:Read|Connect) timed out",
+]
+
+
+@dataclass
+class Attempt:
+    """一次运行尝试"""
+    attempt: int
+    start_time: str
+    elapsed_seconds: float = 0.0
+    return_code: Optional[int] = None
+    retryable: bool = False
+    reason: str = ""
+    resume_from: Optional[str] = None
+    delay_seconds: float = 0.0
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+@dataclass
+class RestartPolicy:
+    """重启策略"""
+    max_restarts: int = 2
+    exit_codes: List[int] = field(default_factory=list)
+    log_patterns: List[str] = field(default_factory=lambda: list(DEFAULT_RETRYABLE_PATTERNS))
+    backoff: float = 30.0
+    backoff_factor: float = 2.0
+    max_backoff: float = 600.0
+    resume_args: str = ""
+    checkpoint_glob: str = ""
+    min_remaining: float = 600.0
+
+    def __post_init__(self):
+        self._regex = (re.compile("|".join(f"(?:{pattern})" for pattern in self.log_patterns))
+                       if self.log_patterns else None)
+
+    @classmethod
+    def from_config(cls, restart_config: dict) -> Optional["RestartPolicy"]:
+        """
+        按配置创建重启策略
+
+        Args:
+            restart_config: 配置中的 train.restart 段
+
+        Returns:
+            RestartPolicy，未启用时返回 None
+
+        Raises:
+            re.error: log_patterns 中有无效的正则
+        """
+        if not restart_config.get('enabled', False):
+            return None
+        patterns = restart_config.get('log_patterns')
+        return cls(
+            max_restarts=int(restart_config.get('max_restarts', 2)),
+            exit_codes=[int(code) for code in restart_config.get('exit_codes') or []],
+            log_patterns=list(DEFAULT_RETRYABLE_PATTERNS if patterns is None else patterns),
+            backoff=float(restart_config.get('backoff', 30)),
+            backoff_factor=float(restart_config.get('backoff_factor', 2)),
+            max_backoff=float(restart_config.get('max_backoff', 600)),
+            resume_args=restart_config.get('resume_args') or "",
+            checkpoint_glob=restart_config.get('checkpoint_glob') or "",
+            min_remaining=float(restart_config.get('min_remaining', 600)),
+        )
+
+    def match_line(self, line: str) -> Optional[str]:
+        """
+        检查一行输出是否包含瞬时故障特征
+
+        Returns:
+            匹配到的文本，未匹配时返回 None
+        """
+        if self._regex is None:
+            return None
+        match = self._regex.search(line)
+        return match.group(0) if match else None
+
+    def delay(self, restart_index: int) -> float:
+        """第 restart_index 次重启（从 1 开始）前的等待时间（秒）"""
+        return min(self.max_backoff, self.backoff * self.backoff_factor ** (restart_index - 1))
+
+    def classify(self, return_code: int, log_match: Optional[str]) -> Tuple[bool, str]:
+        """
+        判断一次失败是否可重试
+
+        Args:
+            return_code: 退出码
+            log_match: 本次尝试中第一个匹配到的日志特征
+
+        Returns:
+            (是否可重试, 原因)
+        """
+        if return_code == 0:
+            return False, "成功"
+        if return_code in self.exit_codes:
+            return True, f"退出码 {return_code}"
+        if log_match:
+            return True, f"日志匹配: {log_match.strip()[:200]}"
+        return False, f"退出码 {return_code}，未匹配瞬时故障特征"
+
+    def resume_command(self, command_parts: List[str], work_dir: str) -> Tuple[List[str], Optional[str]]:
+        """
+        生成从最新检查点恢复的命令
+
+        Args:
+            command_parts: 原始命令参数列表
+            work_dir: 工作目录（checkpoint_glob 的相对路径基准）
+
+        Returns:
+            (新的命令参数列表, 使用的检查点路径)；未配置 resume_args 或找不到检查点时返回原命令
+        """
+        if not self.resume_args:
+            return list(command_parts), None
+        checkpoint = latest_checkpoint(work_dir, self.checkpoint_glob) if self.checkpoint_glob else None
+        if "{checkpoint}" in self.resume_args and checkpoint is None:
+            return list(command_parts), None
+        # 检查点路径先加引号再拆分，路径中的空格不会把它拆成多个参数
+        args = shlex.split(self.resume_args.format(checkpoint=shlex.quote(checkpoint) if checkpoint else ""))
+        return list(command_parts) + args, checkpoint
+
+
+def latest_checkpoint(work_dir: str, pattern: str) -> Optional[str]:
+    """
+    查找最新的检查点（按修改时间）
+
+    Args:
+        work_dir: 工作目录
+        pattern: 检查点路径的 glob 模式（相对于工作目录，支持 **）
+
+    Returns:
+        检查点路径，没有匹配时返回 None
+    """
+    paths = glob.glob(os.path.join(work_dir, os.path.expanduser(pattern)), recursive=True)
+    candidates = []
+    for path in paths:
+        try:
+            candidates.append((os.path.getmtime(path), path))
+        except OSError:
+            continue
+    return max(candidates)[1] if candidates else None
+
+
+def allocation_remaining(environ: Optional[Mapping[str, str]] = None) -> Optional[float]:
+    """
+    当前资源分配的剩余时间（秒）
+
+    Slurm 23.02 及以后在作业环境中提供 SLURM_JOB_END_TIME（Unix 时间戳）。
+
+    Returns:
+        剩余秒数，无法确定时返回 None
+    """
+    environ = os.environ if environ is None else environ
+    value = environ.get("SLURM_JOB_END_TIME", "")
+    if value.isdigit() and int(value) > 0:
+        return int(value) - time.time()
+    return None
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+节点共享采样模块
+同一节点上的多个包装器共享一个采样进程：由第一个包装器按需启动，最后一个包装器离开后自动退出。
+采样进程把设备级数据（GPU 利用率/显存/功耗/温度、节点 CPU 和内存）写入 mmap 共享环形缓冲区，
+每个槽位用 seqlock 协议保护，读取方无需加锁
+
+本文件不依赖包内其他模块，可作为独立进程运行:
+    python sampler.py --serve --interval 2
+"""
+import os
+import sys
+import mmap
+import time
+import zlib
+import struct
+import shutil
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 不支持共享采样
+    fcntl = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+MAGIC = b"HPCSMPL1"
+VERSION = 1
+MAX_GPUS = 16
+N_SLOTS = 64
+
+# 头部：magic, version, n_slots, slot_size, max_gpus, write_count, heartbeat, interval, sampler_pid
+_HEADER = struct.Struct("<8sIIIIQddI")
+HEADER_SIZE = 64
+# 槽位：seq（seqlock，写入中为奇数）
+_SEQ = struct.Struct("<Q")
+# 槽位数据：index, timestamp, cpu%, mem_used_mb, mem_total_mb, n_gpus, 每块 GPU 5 个 float
+_PAYLOAD = struct.Struct("<QddddI4x" + "f" * (MAX_GPUS * 5))
+SLOT_SIZE = _SEQ.size + _PAYLOAD.size
+GPU_FIELDS = ("util", "mem_used_mb", "mem_total_mb", "power_w", "temp_c")
+
+
+def sharing_key(environ: Optional[Dict[str, str]] = None, cgroup_file: str = "/proc/self/cgroup") -> str:
+    """
+    共享范围的标识：同一作业的包装器共享一个采样进程
+
+    采样进程运行在启动它的作业的 cgroup 中，只能看到该作业分配到的 GPU，
+    因此同一用户在同一节点上的不同作业（如作业数组的多个任务）不能共享。
+
+    Args:
+        environ: 环境变量（默认 os.environ）
+        cgroup_file: 当前进程的 cgroup 描述文件
+
+    Returns:
+        Slurm 作业号（"job<id>"）；不在 Slurm 作业中时为 cgroup 路径的哈希（"cg<hex>"），都不可用时为空字符串
+    """
+    environ = os.environ if environ is None else environ
+    job_id = environ.get("SLURM_JOB_ID")
+    if job_id:
+        return f"job{job_id}"
+    try:
+        with open(cgroup_file, "rb") as f:
+            content = f.read()
+    except OSError:
+        return ""
+    return f"cg{zlib.crc32(content):08x}" if content.strip() else ""
+
+
+def default_base_path() -> Path:
+    """共享文件的路径前缀（优先使用内存文件系统 /dev/shm，按用户和作业区分）"""
+    shm = Path("/dev/shm")
+    base_dir = shm if shm.is_dir() and os.access(shm, os.W_OK) else Path(tempfile.gettempdir())
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    key = sharing_key()
+    return base_dir / (f"hpc_run_sampler_{uid}_{key}" if key else f"hpc_run_sampler_{uid}")
+
+
+def _pid_alive(pid: int) -> bool:
+    """检查进程是否存在"""
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def query_gpus(nvidia_smi: Optional[str]) -> List[Dict]:
+    """
+    通过一次 nvidia-smi 调用查询所有 GPU 的设备级数据
+
+    Args:
+        nvidia_smi: nvidia-smi 路径
+
+    Returns:
+        每块 GPU 一个字典，无 GPU 或查询失败时返回空列表
+    """
+    if not nvidia_smi:
+        return []
+    try:
+        output = subprocess.check_output(
+            [nvidia_smi, "--query-gpu=utilization.gpu,memory.used,memory.total,power.draw,temperature.gpu",
+             "--format=csv,noheader,nounits"],
+            timeout=5,
+        )
+    except (subprocess.TimeoutExpired, subprocess.CalledProcessError, OSError):
+        return []
+
+    gpus = []
+    for line in output.decode().strip().splitlines():
+        values = []
+        for item in line.split(","):
+            try:
+                values.append(float(item))
+            except ValueError:
+                values.append(float("nan"))  # 如 [N/A]
+        if len(values) == len(GPU_FIELDS):
+            gpus.append(dict(zip(GPU_FIELDS, values)))
+    return gpus[:MAX_GPUS]
+
+
+def visible_gpu_indices(environ: Optional[Dict[str, str]] = None) -> Optional[List[int]]:
+    """
+    解析 CUDA_VISIBLE_DEVICES 中的 GPU 编号
+
+    Args:
+        environ: 环境变量（默认 os.environ）
+
+    Returns:
+        GPU 编号列表；未设置或使用 UUID 形式时返回 None（表示统计所有 GPU）
+    """
+    environ = os.environ if environ is None else environ
+    value = environ.get("CUDA_VISIBLE_DEVICES")
+    if value is None or not value.strip():
+        return None
+    try:
+        return [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        return None
+
+
+class SampleRing:
+    """mmap 共享环形缓冲区"""
+
+    def __init__(self, path: Path, create: bool = False):
+        """
+        打开（或创建）共享缓冲区
+
+        Args:
+            path: 缓冲区文件路径
+            create: 是否新建（采样进程使用）
+        """
+        self.path = Path(path)
+        size = HEADER_SIZE + SLOT_SIZE * N_SLOTS
+        if create:
+            tmp_path = self.path.with_name(self.path.name + f".{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.truncate(size)
+            os.replace(tmp_path, self.path)
+        fd = os.open(self.path, os.O_RDWR if create else os.O_RDONLY)
+        try:
+            self._mm = mmap.mmap(fd, size, access=mmap.ACCESS_WRITE if create else mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        if create:
+            self._write_header(0, 0.0, 0.0)
+        elif self._mm[:8] != MAGIC:
+            self._mm.close()
+            raise ValueError(f"共享采样缓冲区格式不正确: {self.path}")
+
+    def close(self):
+        self._mm.close()
+
+    def header(self) -> Dict:
+        """读取头部"""
+        magic, version, n_slots, slot_size, max_gpus, count, heartbeat, interval, pid = \
+            _HEADER.unpack_from(self._mm, 0)
+        return {"version": version, "write_count": count, "heartbeat": heartbeat,
+                "interval": interval, "pid": pid}
+
+    def _write_header(self, count: int, heartbeat: float, interval: float):
+        _HEADER.pack_into(self._mm, 0, MAGIC, VERSION, N_SLOTS, SLOT_SIZE, MAX_GPUS,
+                          count, heartbeat, interval, os.getpid())
+
+    def write(self, sample: Dict, interval: float):
+        """
+        写入一个样本（仅采样进程调用）
+
+        Args:
+            sample: 样本字典（timestamp、cpu、mem_used_mb、mem_total_mb、gpus）
+            interval: 采样间隔（写入头部供读取方判断数据是否过期）
+        """
+        count = self.header()["write_count"]
+        base = HEADER_SIZE + SLOT_SIZE * (count % N_SLOTS)
+        gpus = sample.get("gpus") or []
+        flat = []
+        for i in range(MAX_GPUS):
+            gpu = gpus[i] if i < len(gpus) else {}
+            flat.extend(gpu.get(name, 0.0) for name in GPU_FIELDS)
+
+        seq = _SEQ.unpack_from(self._mm, base)[0]
+        _SEQ.pack_into(self._mm, base, seq + 1)  # 奇数：写入中
+        _PAYLOAD.pack_into(self._mm, base + _SEQ.size, count, sample["timestamp"], sample.get("cpu", 0.0),
+                           sample.get("mem_used_mb", 0.0), sample.get("mem_total_mb", 0.0), len(gpus), *flat)
+        _SEQ.pack_into(self._mm, base, seq + 2)  # 偶数：写入完成
+        self._write_header(count + 1, time.time(), interval)
+
+    def latest(self, retries: int = 8) -> Optional[Dict]:
+        """
+        读取最新样本（seqlock：序号为奇数或前后不一致时重试）
+
+        Returns:
+            样本字典，缓冲区为空或多次重试仍失败时返回 None
+        """
+        for _ in range(retries):
+            count = self.header()["write_count"]
+            if count == 0:
+                return None
+            base = HEADER_SIZE + SLOT_SIZE * ((count - 1) % N_SLOTS)
+            seq_before = _SEQ.unpack_from(self._mm, base)[0]
+            if seq_before & 1:
+                continue
+            values = _PAYLOAD.unpack_from(self._mm, base + _SEQ.size)
+            if _SEQ.unpack_from(self._mm, base)[0] != seq_before or values[0] != count - 1:
+                continue
+            index, timestamp, cpu, mem_used, mem_total, n_gpus = values[:6]
+            flat = values[6:]
+            gpus = [dict(zip(GPU_FIELDS, flat[i * 5:(i + 1) * 5])) for i in range(n_gpus)]
+            return {"index": index, "timestamp": timestamp, "cpu": cpu,
+                    "mem_used_mb": mem_used, "mem_total_mb": mem_total, "gpus": gpus}
+        return None
+
+
+class SharedSamplerClient:
+    """共享采样客户端：登记使用、按需启动采样进程、读取最新样本"""
+
+    def __init__(self, interval: float = 2.0, base_path: Optional[Path] = None, grace: float = 15.0):
+        """
+        初始化客户端
+
+        Args:
+            interval: 采样间隔（秒，仅在本客户端启动采样进程时生效）
+            base_path: 共享文件路径前缀（默认按用户和作业放在 /dev/shm）
+            grace: 最后一个客户端离开后采样进程继续保留的时间（秒）
+
+        Raises:
+            RuntimeError: 当前平台不支持共享采样
+        """
+        if fcntl is None:
+            raise RuntimeError("当前平台不支持共享采样（缺少 fcntl）")
+        self.interval = interval
+        self.grace = grace
+        self.base_path = Path(base_path) if base_path else default_base_path()
+        self.buffer_path = self.base_path.with_name(self.base_path.name + ".buf")
+        self.lock_path = self.base_path.with_name(self.base_path.name + ".lock")
+        self.clients_dir = self.base_path.with_name(self.base_path.name + ".clients")
+        self.lease_path = self.clients_dir / str(os.getpid())
+        self._ring: Optional[SampleRing] = None
+        self._last_restart = 0.0
+
+    def __enter__(self):
+        self.join()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.leave()
+
+    def join(self):
+        """登记本进程，必要时启动采样进程"""
+        with _FileLock(self.lock_path):
+            self.clients_dir.mkdir(parents=True, exist_ok=True)
+            self.lease_path.touch()
+            if not self._sampler_alive():
+                self._spawn_sampler()
+
+    def leave(self):
+        """注销本进程（采样进程发现没有客户端后自行退出）"""
+        if self._ring:
+            self._ring.close()
+            self._ring = None
+        try:
+            self.lease_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def latest(self, max_age: Optional[float] = None) -> Optional[Dict]:
+        """
+        读取最新的设备级样本
+
+        Args:
+            max_age: 样本最长有效期（秒，默认为采样间隔的 3 倍且不少于 10 秒）
+
+        Returns:
+            样本字典，无可用数据或数据过期时返回 None（过期时会尝试重启采样进程）
+        """
+        max_age = max_age or max(self.interval * 3, 10.0)
+        if self._ring is None and self.buffer_path.exists():
+            try:
+                self._ring = SampleRing(self.buffer_path)
+            except (OSError, ValueError):
+                self._ring = None
+        sample = self._ring.latest() if self._ring else None
+        if sample and time.time() - sample["timestamp"] <= max_age:
+            return sample
+
+        # 采样进程可能已退出（如被 OOM killer 结束），限制重启频率
+        if time.time() - self._last_restart > max_age:
+            self._last_restart = time.time()
+            if self._ring:
+                self._ring.close()
+                self._ring = None
+            self.join()
+        return None
+
+    def _sampler_alive(self) -> bool:
+        """采样进程是否存活且在持续写入"""
+        if not self.buffer_path.exists():
+            return False
+        try:
+            ring = SampleRing(self.buffer_path)
+        except (OSError, ValueError):
+            return False
+        try:
+            header = ring.header()
+        finally:
+            ring.close()
+        if not _pid_alive(header["pid"]):
+            return False
+        # 刚启动尚未写入第一个样本时 heartbeat 为 0
+        stale_after = max(header["interval"] * 5, 30.0)
+        return header["heartbeat"] == 0 or time.time() - header["heartbeat"] < stale_after
+
+    def _spawn_sampler(self):
+        """以独立会话启动采样进程（不随包装器退出）"""
+        subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "--serve",
+             "--interval", str(self.interval), "--grace", str(self.grace), "--base", str(self.base_path)],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True, close_fds=True,
+        )
+        # 等待缓冲区就绪，避免后续客户端重复启动
+        deadline = time.time() + 5
+        while time.time() < deadline and not self._sampler_alive():
+            time.sleep(0.05)
+
+
+class _FileLock:
+    """基于 flock 的跨进程互斥锁"""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+
+
+def _live_clients(clients_dir: Path) -> int:
+    """统计存活的客户端数量，顺带清理已退出进程留下的登记文件"""
+    alive = 0
+    for lease in clients_dir.glob("*"):
+        try:
+            pid = int(lease.name)
+        except ValueError:
+            continue
+        if _pid_alive(pid):
+            alive += 1
+        else:
+            try:
+                lease.unlink()
+            except FileNotFoundError:
+                pass
+    return alive
+
+
+def _sample_node(nvidia_smi: Optional[str]) -> Dict:
+    """采集一次设备级数据"""
+    sample = {"timestamp": time.time(), "gpus": query_gpus(nvidia_smi)}
+    if psutil is not None:
+        memory = psutil.virtual_memory()
+        sample["cpu"] = psutil.cpu_percent(interval=None)
+        sample["mem_used_mb"] = (memory.total - memory.available) / 1024 / 1024
+        sample["mem_total_mb"] = memory.total / 1024 / 1024
+    return sample
+
+
+def serve(base_path: Path, interval: float, grace: float):
+    """
+    采样进程主循环
+
+    Args:
+        base_path: 共享文件路径前缀
+        interval: 采样间隔（秒）
+        grace: 没有客户端后继续保留的时间（秒）
+    """
+    buffer_path = base_path.with_name(base_path.name + ".buf")
+    lock_path = base_path.with_name(base_path.name + ".lock")
+    clients_dir = base_path.with_name(base_path.name + ".clients")
+    clients_dir.mkdir(parents=True, exist_ok=True)
+
+    ring = SampleRing(buffer_path, create=True)
+    nvidia_smi = shutil.which("nvidia-smi")
+    if psutil is not None:
+        psutil.cpu_percent(interval=None)
+    idle_since = None
+
+    try:
+        while True:
+            started = time.monotonic()
+            ring.write(_sample_node(nvidia_smi), interval)
+
+            if _live_clients(clients_dir) == 0:
+                idle_since = idle_since or time.monotonic()
+                if time.monotonic() - idle_since >= grace:
+                    # 在锁内确认并删除缓冲区，避免与正在登记的客户端竞争
+                    with _FileLock(lock_path):
+                        if _live_clients(clients_dir) == 0:
+                            buffer_path.unlink()
+                            return
+                    idle_since = None
+            else:
+                idle_since = None
+
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        ring.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="hpc_run 节点共享采样进程")
+    parser.add_argument("--serve", action="store_true", help="运行采样进程")
+    parser.add_argument("--interval", type=float, default=2.0)
+    parser.add_argument("--grace", type=float, default=15.0)
+    parser.add_argument("--base", type=str, default=None)
+    args = parser.parse_args()
+
+    base_path = Path(args.base) if args.base else default_base_path()
+    if args.serve:
+        serve(base_path, args.interval, args.grace)
+        return 0
+
+    # 调试：打印最新样本
+    ring = SampleRing(base_path.with_name(base_path.name + ".buf"))
+    print(ring.header(), ring.latest())
+    ring.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+数据集预拷贝模块
+启动训练前把配置的数据集路径复制（或解压归档）到节点本地存储（$TMPDIR），避免训练时在共享文件系统上
+对海量小文件做元数据操作。有界线程池并行复制、按大块读写；目标目录中的清单记录每个已复制文件的源文件
+大小和修改时间，重新运行时跳过未变化的文件。训练命令的参数和环境变量改写为指向本地副本
+"""
+import os
+import re
+import time
+import shutil
+import tarfile
+import zipfile
+import tempfile
+import threading
+from pathlib import Path
+from collections import deque
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 上不加锁
+    fcntl = None
+
+
+# 目标目录中的清单文件（每行：相对路径、源文件大小、源文件 mtime_ns）
+MANIFEST_FILE = ".hpc_run_stage_manifest"
+# 同一节点上的多个 rank 共用本地副本，第一个 rank 复制时其他 rank 等待
+LOCK_FILE = ".hpc_run_stage.lock"
+
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz", ".zip")
+
+
+def archive_suffix(path: Path) -> Optional[str]:
+    """归档文件的后缀（不是归档时返回 None）"""
+    name = path.name.lower()
+    return next((suffix for suffix in ARCHIVE_SUFFIXES if name.endswith(suffix)), None)
+
+
+@dataclass
+class StageSpec:
+    """一个要预拷贝的路径"""
+    source: str
+    name: str = ""
+    extract: Optional[bool] = None  # None 表示按后缀自动判断
+    env: str = ""
+
+    @classmethod
+    def from_config(cls, item) -> "StageSpec":
+        """
+        按配置创建（字符串或包含 source、name、extract、env 的字典）
+
+        Raises:
+            ValueError: 缺少 source
+        """
+        if isinstance(item, str):
+            item = {"source": item}
+        if not item.get('source'):
+            raise ValueError("train.stage.paths 中的每一项都需要 source")
+        return cls(source=str(item['source']), name=item.get('name') or "",
+                   extract=item.get('extract'), env=item.get('env') or "")
+
+    @property
+    def source_path(self) -> Path:
+        return Path(os.path.expandvars(os.path.expanduser(self.source)))
+
+    def should_extract(self) -> bool:
+        """是否解压（源为归档文件且未显式关闭）"""
+        if self.extract is not None:
+            return bool(self.extract) and self.source_path.is_file()
+        return self.source_path.is_file() and archive_suffix(self.source_path) is not None
+
+    def local_name(self) -> str:
+        """本地副本的名称（默认取源路径的最后一段，解压时去掉归档后缀）"""
+        if self.name:
+            return self.name
+        name = self.source_path.name
+        suffix = archive_suffix(self.source_path)
+        if suffix and self.should_extract():
+            name = name[:-len(suffix)]
+        return name
+
+
+@dataclass
+class StageResult:
+    """一个路径的预拷贝结果"""
+    source: str
+    local: str
+    mode: str  # copy 或 extract
+    files: int = 0
+    copied_files: int = 0
+    skipped_files: int = 0
+    copied_bytes: int = 0
+    skipped_bytes: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "source": self.source,
+            "local": self.local,
+            "mode": self.mode,
+            "files": self.files,
+            "copied_files": self.copied_files,
+            "skipped_files": self.skipped_files,
+            "copied_mb": round(self.copied_bytes / 1024 / 1024, 2),
+            "skipped_mb": round(self.skipped_bytes / 1024 / 1024, 2),
+            "seconds": round(self.seconds, 2),
+            "bandwidth_mbps": (round(self.copied_bytes / 1024 / 1024 / self.seconds, 1)
+                               if self.seconds > 0 and self.copied_bytes else None),
+            "error": self.error,
+        }
+
+
+class Manifest:
+    """已复制文件的清单（追加写入，中断后下次运行仍能识别已完成的文件）"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, Tuple[int, int]] = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.rstrip("\n").rsplit("\t", 2)
+                    if len(parts) == 3 and line.endswith("\n"):
+                        self.entries[parts[0]] = (int(parts[1]), int(parts[2]))
+        except (OSError, ValueError):
+            self.entries = {}
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def is_current(self, rel: str, size: int, mtime_ns: int, local: Path) -> bool:
+        """本地文件是否是该源文件的完整副本"""
+        if self.entries.get(rel) != (size, mtime_ns):
+            return False
+        try:
+            return local.stat().st_size == size
+        except OSError:
+            return False
+
+    def add(self, rel: str, size: int, mtime_ns: int):
+        with self._lock:
+            self._file.write(f"{rel}\t{size}\t{mtime_ns}\n")
+
+    def close(self):
+        self._file.close()
+
+
+def copy_file(source: Path, target: Path, buffer: bytearray) -> int:
+    """
+    按大块读写复制一个文件（共享文件系统上大块顺序读远快于小块读）
+
+    Args:
+        source: 源文件
+        target: 目标文件
+        buffer: 读写缓冲区（每个线程复用一个）
+
+    Returns:
+        复制的字节数
+
+    Raises:
+        OSError: 读写失败
+    """
+    view = memoryview(buffer)
+    total = 0
+    with open(source, "rb", buffering=0) as fin, open(target, "wb", buffering=0) as fout:
+        while True:
+            n = fin.readinto(buffer)
+            if not n:
+                break
+            fout.write(view[:n])
+            total += n
+    return total
+
+
+def _walk_files(root: Path) -> Iterator[Tuple[str, bool]]:
+    """
+    遍历目录下的所有文件（只用 scandir 的类型信息，不 stat，stat 放到线程池中并行）
+
+    Yields:
+        (相对路径, 是否为目录)；目录先于其中的文件返回
+    """
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        with os.scandir(root / rel_dir if rel_dir else root) as entries:
+            for entry in entries:
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    yield rel, True
+                    stack.append(rel)
+                elif entry.is_file():
+                    yield rel, False
+
+
+def stage_tree(source: Path, target: Path, workers: int = 8, block_size: int = 8 << 20,
+               result: Optional[StageResult] = None) -> StageResult:
+    """
+    并行复制目录（或单个文件），跳过清单中记录且未变化的文件
+
+    Args:
+        source: 源目录或文件
+        target: 本地目标路径
+        workers: 复制线程数（同时也并行了 stat 等元数据操作）
+        block_size: 读写块大小（字节）
+        result: 累计结果（可选）
+
+    Returns:
+        StageResult
+
+    Raises:
+        OSError: 读写失败（如本地空间不足）
+    """
+    result = result or StageResult(source=str(source), local=str(target), mode="copy")
+    if source.is_file():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        manifest_dir, items = target.parent, [(target.name, source, target)]
+    else:
+        target.mkdir(parents=True, exist_ok=True)
+        manifest_dir, items = target, _iter_tree(source, target)
+    manifest = Manifest(manifest_dir / MANIFEST_FILE)
+    local = threading.local()
+    lock = threading.Lock()
+
+    def _copy(item):
+        rel, src, dst = item
+        st = os.stat(src)
+        if manifest.is_current(rel, st.st_size, st.st_mtime_ns, dst):
+            with lock:
+                result.files += 1
+                result.skipped_files += 1
+                result.skipped_bytes += st.st_size
+            return
+        buffer = getattr(local, "buffer", None)
+        if buffer is None:
+            buffer = local.buffer = bytearray(block_size)
+        copied = copy_file(src, dst, buffer)
+        os.chmod(dst, st.st_mode & 0o777)
+        os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+        manifest.add(rel, st.st_size, st.st_mtime_ns)
+        with lock:
+            result.files += 1
+            result.copied_files += 1
+            result.copied_bytes += copied
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="stage") as executor:
+            # 限制排队的任务数，文件数很多时不会一次性创建几百万个 Future；result() 抛出第一个失败
+            pending = deque()
+            for item in items:
+                pending.append(executor.submit(_copy, item))
+                if len(pending) >= workers * 64:
+                    pending.popleft().result()
+            for future in pending:
+                future.result()
+    finally:
+        manifest.close()
+    return result
+
+
+def _iter_tree(source: Path, target: Path) -> Iterator[Tuple[str, Path, Path]]:
+    """遍历源目录，创建本地目录结构，逐个返回 (相对路径, 源文件, 目标文件)"""
+    for rel, is_dir in _walk_files(source):
+        if is_dir:
+            (target / rel).mkdir(exist_ok=True)
+        else:
+            yield rel, source / rel, target / rel
+
+
+def extract_archive(source: Path, target: Path, block_size: int = 8 << 20,
+                    result: Optional[StageResult] = None) -> StageResult:
+    """
+    把归档解压到本地目录（顺序大块读取归档，共享文件系统上只有一个大文件的读取）
+
+    清单中记录归档本身的大小和修改时间，归档未变化且上次解压完成时跳过。
+
+    Args:
+        source: 归档文件（tar、tar.gz/bz2/xz 或 zip）
+        target: 本地目标目录
+        block_size: 读取缓冲区大小（字节）
+        result: 累计结果（可选）
+
+    Returns:
+        StageResult
+
+    Raises:
+        OSError, tarfile.TarError, zipfile.BadZipFile: 读取或解压失败
+    """
+    result = result or StageResult(source=str(source), local=str(target), mode="extract")
+    st = source.stat()
+    target.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(target / MANIFEST_FILE)
+    try:
+        # 清单只在解压完成后写入，记录存在即表示上次已完整解压
+        if manifest.entries.get(source.name) == (st.st_size, st.st_mtime_ns):
+            result.skipped_bytes += st.st_size
+            return result
+        with open(source, "rb", buffering=block_size) as f:
+            if archive_suffix(source) == ".zip":
+                with zipfile.ZipFile(f) as archive:
+                    members = [info for info in archive.infolist() if not info.is_dir()]
+                    archive.extractall(target)
+                    result.copied_files += len(members)
+                    result.files += len(members)
+            else:
+                # 流式读取（r|*），不回退查找成员
+                with tarfile.open(fileobj=f, mode="r|*") as archive:
+                    for member in archive:
+                        if hasattr(tarfile, "data_filter"):
+                            archive.extract(member, target, filter="data")
+                        elif not (member.name.startswith("/") or ".." in Path(member.name).parts):
+                            # 没有解压过滤器的旧版本 Python：跳过会写到目标目录之外的成员
+                            archive.extract(member, target)
+                        if member.isfile():
+                            result.copied_files += 1
+                            result.files += 1
+        result.copied_bytes += st.st_size
+        manifest.add(source.name, st.st_size, st.st_mtime_ns)
+    finally:
+        manifest.close()
+    return result
+
+
+def stage_root(stage_dir: Optional[str] = None) -> Path:
+    """
+    本地预拷贝目录（默认 $TMPDIR/hpc_run_stage，Slurm 等调度器通常把 $TMPDIR 设为作业的本地临时目录）
+
+    Args:
+        stage_dir: 配置的目录（支持 ~ 和环境变量）
+
+    Returns:
+        目录路径
+    """
+    if stage_dir:
+        return Path(os.path.expandvars(os.path.expanduser(stage_dir)))
+    return Path(os.environ.get("TMPDIR") or tempfile.gettempdir()) / "hpc_run_stage"
+
+
+class _StageLock:
+    """同一节点上多个 rank 共用本地副本时的文件锁（不支持 fcntl 时不加锁）"""
+
+    def __init__(self, root: Path):
+        self._fd = os.open(root / LOCK_FILE, os.O_CREAT | os.O_RDWR, 0o600)
+
+    def __enter__(self):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+
+
+def stage_paths(specs: List[StageSpec], root: Path, workers: int = 8,
+                block_size: int = 8 << 20) -> List[StageResult]:
+    """
+    预拷贝所有路径（某个路径失败时记录错误并继续下一个）
+
+    Args:
+        specs: 要预拷贝的路径
+        root: 本地预拷贝目录
+        workers: 复制线程数
+        block_size: 读写块大小（字节）
+
+    Returns:
+        每个路径的结果（本地名称重复时依次加 _2、_3 后缀，顺序不变时结果稳定，续传仍然有效）
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    results = []
+    used = set()
+    with _StageLock(root):
+        for spec in specs:
+            source = spec.source_path
+            name = spec.local_name()
+            suffix = 1
+            while name in used:
+                suffix += 1
+                name = f"{spec.local_name()}_{suffix}"
+            used.add(name)
+            target = root / name
+            extract = spec.should_extract()
+            result = StageResult(source=str(source), local=str(target), mode="extract" if extract else "copy")
+            started = time.monotonic()
+            try:
+                if not source.exists():
+                    raise FileNotFoundError(f"源路径不存在: {source}")
+                if extract:
+                    extract_archive(source, target, block_size, result)
+                else:
+                    stage_tree(source, target, workers, block_size, result)
+            except (OSError, tarfile.TarError, zipfile.BadZipFile) as e:
+                result.error = str(e)
+            result.seconds = time.monotonic() - started
+            results.append(result)
+    return results
+
+
+def rewrite_argument(arg: str, source: str, local: str) -> str:
+    """
+    把参数中的源路径替换为本地路径（只替换完整的路径前缀，如 /data/x 不会匹配 /data/xyz）
+
+    Args:
+        arg: 命令行参数（可以是 --data=/path 或逗号分隔的列表）
+        source: 源路径
+        local: 本地路径
+
+    Returns:
+        改写后的参数
+    """
+    source = source.rstrip("/") or "/"
+    pattern = r"(^|[=,:])" + re.escape(source) + r"(?=$|[/,:])"
+    return re.sub(pattern, lambda m: m.group(1) + local, arg)
+
+
+def rewrite_command(command_parts: List[str], results: List[StageResult], specs: List[StageSpec],
+                    env: Optional[Dict[str, str]] = None) -> Tuple[List[str], Dict[str, str]]:
+    """
+    把命令参数中的源路径改写为本地副本，并按配置设置环境变量（失败的路径保持不变）
+
+    Args:
+        command_parts: 命令参数列表
+        results: stage_paths 的结果
+        specs: 对应的预拷贝配置
+        env: 需要设置的环境变量（在其基础上添加）
+
+    Returns:
+        (新的参数列表, 新增的环境变量)
+    """
+    env = dict(env or {})
+    parts = list(command_parts)
+    for spec, result in zip(specs, results):
+        if result.error:
+            continue
+        # 配置中写的路径和展开后的绝对路径都替换
+        sources = {spec.source, str(spec.source_path), os.path.abspath(spec.source_path)}
+        for source in sorted(sources, key=len, reverse=True):
+            parts = [rewrite_argument(arg, source, result.local) for arg in parts]
+        if spec.env:
+            env[spec.env] = result.local
+    return parts, env
+
+
+def cleanup_stage(local_paths: List[str], root: Path):
+    """
+    删除本地副本（预拷贝目录中没有其他内容时一并删除）
+
+    Args:
+        local_paths: 本地副本路径（StageResult.local）
+        root: 本地预拷贝目录
+    """
+    for local in local_paths:
+        local = Path(local)
+        if local.is_dir() and not local.is_symlink():
+            shutil.rmtree(local, ignore_errors=True)
+        else:
+            try:
+                local.unlink()
+            except OSError:
+                pass
+    # 单个文件的清单和多 rank 共用的锁文件位于预拷贝目录下
+    for name in (MANIFEST_FILE, LOCK_FILE):
+        try:
+            (root / name).unlink()
+        except OSError:
+            pass
+    try:
+        root.rmdir()
+    except OSError:
+        pass
+
+
+def summarize_stage(results: List[StageResult], seconds: float) -> Dict:
+    """
+    汇总（写入完成标记）
+
+    Args:
+        results: 每个路径的结果
+        seconds: 总耗时（秒）
+
+    Returns:
+        总耗时、复制量、带宽和每个路径的结果
+    """
+    copied = sum(result.copied_bytes for result in results)
+    return {
+        "seconds": round(seconds, 2),
+        "copied_mb": round(copied / 1024 / 1024, 2),
+        "skipped_mb": round(sum(result.skipped_bytes for result in results) / 1024 / 1024, 2),
+        "files": sum(result.files for result in results),
+        "bandwidth_mbps": round(copied / 1024 / 1024 / seconds, 1) if seconds > 0 and copied else None,
+        "paths": [result.to_dict() for result in results],
+    }
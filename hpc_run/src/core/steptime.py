@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+步时统计模块
+根据训练输出中的 step 行计算每步耗时，维护有界直方图并检测持续性的降速
+"""
+import re
+import math
+import statistics
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+# 第一个捕获组为当前步号，可选的第二个捕获组为总步数（如 "step 100/5000"）
+DEFAULT_STEP_PATTERN = r"\bstep[\s=:]*(\d+)(?:\s*/\s*(\d+))?"
+
+
+class StepHistogram:
+    """对数分桶直方图，内存占用固定，与步数无关"""
+
+    def __init__(self, min_value: float = 1e-4, max_value: float = 3600.0, growth: float = 1.05):
+        """
+        初始化直方图
+
+        Args:
+            min_value: 最小可区分值（秒）
+            max_value: 最大值（秒），超出的值计入最后一个桶
+            growth: 相邻桶边界的比值（决定相对精度）
+        """
+        self.min_value = min_value
+        self._log_growth = math.log(growth)
+        self.growth = growth
+        self.counts = [0] * (int(math.log(max_value / min_value) / self._log_growth) + 2)
+        self.total = 0
+        self.sum = 0.0
+
+    def add(self, value: float):
+        """添加一个观测值"""
+        if value <= self.min_value:
+            index = 0
+        else:
+            index = min(int(math.log(value / self.min_value) / self._log_growth) + 1, len(self.counts) - 1)
+        self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        估算分位数（返回所在桶的几何中点）
+
+        Args:
+            q: 分位数（0~100）
+
+        Returns:
+            分位数估计值（秒），无数据时返回 None
+        """
+        if not self.total:
+            return None
+        rank = max(1, math.ceil(self.total * q / 100.0))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                if index == 0:
+                    return self.min_value
+                lower = self.min_value * self.growth ** (index - 1)
+                return lower * math.sqrt(self.growth)
+        return None
+
+
+@dataclass
+class Slowdown:
+    """一次持续降速"""
+    step: int
+    elapsed: float  # 相对训练开始的秒数
+    step_time: float
+    baseline: float
+    recovered_step: Optional[int] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "step": self.step,
+            "elapsed": round(self.elapsed, 2),
+            "step_time": round(self.step_time, 4),
+            "baseline": round(self.baseline, 4),
+            "recovered_step": self.recovered_step,
+        }
+
+
+@dataclass
+class StepTimer:
+    """从输出行的到达时间推算步时，检测相对本次运行基线的持续降速"""
+    pattern: str = DEFAULT_STEP_PATTERN
+    warmup_steps: int = 5        # 跳过的前几步（编译、预热、首个 batch 加载）
+    baseline_steps: int = 50     # 用于计算基线的步数
+    window: int = 20             # 滑动窗口步数
+    factor: float = 1.5          # 窗口中位数超过基线多少倍视为降速
+    sustain: int = 3             # 连续多少个窗口超标才报告（避免偶发抖动）
+    total_steps: Optional[int] = None  # 总步数（未配置时尝试从输出中解析）
+    histogram: StepHistogram = field(default_factory=StepHistogram)
+    slowdowns: List[Slowdown] = field(default_factory=list)
+
+    def __post_init__(self):
+        self._regex = re.compile(self.pattern)
+        self._has_group = self._regex.groups > 0
+        self._start: Optional[float] = None
+        self._last_time: Optional[float] = None
+        self._last_step: Optional[int] = None
+        self._steps = 0
+        self._observed = 0
+        # 自 _last_time 以来经过的步数（同一次读取到的多行共用一个到达时间）
+        self._pending = 0
+        self._baseline_samples: List[float] = []
+        self.baseline: Optional[float] = None
+        self._recent: deque = deque(maxlen=self.window)
+        self._since_window = 0
+        self._over_count = 0
+        self._active: Optional[Slowdown] = None
+
+    @property
+    def steps(self) -> int:
+        """当前步数（输出中带步号时为最近一次的步号，恢复训练后从检查点的步号继续）"""
+        return self._steps
+
+    @property
+    def last_step(self) -> Optional[int]:
+        """最近一次从输出中解析到的步号（正则没有捕获组或尚未匹配时为 None）"""
+        return self._last_step
+
+    @property
+    def observed_steps(self) -> int:
+        """本次运行中观测到的步数（含第一步）"""
+        return self._observed
+
+    def observe(self, line: str, now: float) -> Optional[Slowdown]:
+        """
+        处理一行输出
+
+        Args:
+            line: 输出行
+            now: 该行到达时的单调时钟时间
+
+        Returns:
+            新检测到的降速（仅在开始降速时返回一次），否则返回 None
+        """
+        if self._start is None:
+            self._start = now
+        match = self._regex.search(line)
+        if not match:
+            return None
+
+        step = None
+        if self._has_group:
+            try:
+                step = int(match.group(1))
+            except (TypeError, ValueError):
+                step = None
+            if self._regex.groups > 1 and match.group(2):
+                self.total_steps = int(match.group(2))
+
+        if self._last_time is None:
+            self._last_time, self._last_step = now, step
+            self._observed += 1
+            self._steps = step if step is not None else self._steps + 1
+            return None
+
+        # 步号递增时按跨越的步数平摊；步号回退（如新 epoch 重新计数）或无步号时视为一步
+        delta = 1
+        if step is not None and self._last_step is not None and step > self._last_step:
+            delta = step - self._last_step
+        elif step is not None and self._last_step is not None and step == self._last_step:
+            return None
+
+        self._last_step = step
+        self._observed += delta
+        self._steps = step if step is not None else self._steps + delta
+        self._pending += delta
+        # 同一次读取到的多行共用一个到达时间：先累计步数，下一批输出到达时把整段时间平摊到这些步上
+        if now <= self._last_time:
+            return None
+        interval = (now - self._last_time) / self._pending
+        self._last_time, self._pending = now, 0
+        return self._record(interval, self._steps, now)
+
+    def _record(self, interval: float, step: int, now: float) -> Optional[Slowdown]:
+        """记录一个步时并更新降速检测状态"""
+        if self._observed <= self.warmup_steps:
+            return None
+        self.histogram.add(interval)
+
+        if self.baseline is None:
+            self._baseline_samples.append(interval)
+            if len(self._baseline_samples) >= self.baseline_steps:
+                self.baseline = statistics.median(self._baseline_samples)
+                self._baseline_samples = []
+            return None
+
+        self._recent.append(interval)
+        self._since_window += 1
+        if len(self._recent) < self.window or self._since_window < self.window // 2 or self.baseline <= 0:
+            return None
+
+        # 每半个窗口评估一次滑动窗口中位数
+        self._since_window = 0
+        current = statistics.median(self._recent)
+        if current > self.baseline * self.factor:
+            self._over_count += 1
+            if self._over_count >= self.sustain and self._active is None:
+                self._active = Slowdown(step, now - self._start, current, self.baseline)
+                self.slowdowns.append(self._active)
+                return self._active
+        else:
+            self._over_count = 0
+            if self._active is not None:
+                self._active.recovered_step = step
+                self._active = None
+        return None
+
+    def summary(self) -> Optional[Dict]:
+        """
+        汇总步时分布（写入完成标记文件）
+
+        Returns:
+            包含步数、p50/p95/p99、平均值、基线和降速记录的字典，无步时数据时返回 None
+        """
+        if not self.histogram.total:
+            return None
+        return {
+            "steps": self._steps,
+            "observed_steps": self._observed,
+            "total_steps": self.total_steps,
+            "samples": self.histogram.total,
+            "mean": round(self.histogram.sum / self.histogram.total, 4),
+            "p50": round(self.histogram.percentile(50), 4),
+            "p95": round(self.histogram.percentile(95), 4),
+            "p99": round(self.histogram.percentile(99), 4),
+            "baseline": round(self.baseline, 4) if self.baseline is not None else None,
+            "slowdowns": [slowdown.to_dict() for slowdown in self.slowdowns],
+        }
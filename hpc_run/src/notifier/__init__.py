@@ -2,6 +2,8 @@
 通知器模块
 提供多种通知方式的抽象接口和具体实现
 """
-from .base import Notifier, build_notifier
+from .base import (Notifier, MultiNotifier, ChannelResult, build_notifier, build_notifiers,
+                   register_notifier, channel_names)
 
-__all__ = ['Notifier', 'build_notifier']
+__all__ = ['Notifier', 'MultiNotifier', 'ChannelResult', 'build_notifier', 'build_notifiers',
+           'register_notifier', 'channel_names']
@@ -1,44 +1,231 @@
 """
-通知器基类和工厂函数
+通知器基类、注册表和工厂函数
 """
+import time
+import inspect
+import importlib
+import threading
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Union
 
 
 class Notifier(ABC):
     """通知器抽象基类"""
-    
+
     @abstractmethod
     def send_markdown(self, content: str) -> None:
         """
         发送 Markdown 格式的消息
-        
+
         Args:
             content: Markdown 格式的消息内容
         """
         pass
 
 
+# 通知器注册表：名称 -> "模块:类名"，模块相对于本包，在首次使用时才导入
+_REGISTRY: Dict[str, str] = {
+    'console': '.console:ConsoleNotifier',
+    'xxtui': '.xxtui:XxtuiNotifier',
+    'webhook': '.webhook:WebhookNotifier',
+    'email': '.mail:EmailNotifier',
+}
+
+# 第三方通知器可通过该 entry point 分组注册
+ENTRY_POINT_GROUP = 'hpc_run.notifiers'
+
+
+def register_notifier(name: str, target: Union[str, type]):
+    """
+    注册通知器
+
+    Args:
+        name: 通知器名称
+        target: 通知器类，或 "模块路径:类名" 字符串（延迟导入）
+    """
+    _REGISTRY[name.lower()] = target
+
+
+def _load_notifier_class(name: str) -> type:
+    """按名称加载通知器类（注册表优先，其次 entry point）"""
+    target = _REGISTRY.get(name)
+    if target is None:
+        try:
+            from importlib.metadata import entry_points
+            for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+                if entry_point.name == name:
+                    return entry_point.load()
+        except (ImportError, TypeError):
+            pass
+        raise ValueError(f'不支持的通知器类型: {name}')
+
+    if isinstance(target, type):
+        return target
+    module_name, _, class_name = target.partition(':')
+    package = __package__ if module_name.startswith('.') else None
+    return getattr(importlib.import_module(module_name, package), class_name)
+
+
 def build_notifier(name: str, **kwargs) -> Notifier:
     """
     通知器工厂函数
-    
+
     Args:
         name: 通知器类型名称（如 'xxtui'）
-        **kwargs: 通知器初始化参数
-        
+        **kwargs: 通知器初始化参数（忽略通知器不接受的参数）
+
     Returns:
         通知器实例
-        
+
     Raises:
         ValueError: 不支持的通知器类型
     """
     name = (name or 'xxtui').lower()
-    
-    if name == 'xxtui':
-        from .xxtui import XxtuiNotifier
-        return XxtuiNotifier(**kwargs)
-    elif name == 'console':
-        from .console import ConsoleNotifier
-        return ConsoleNotifier(**kwargs)
-    
-    raise ValueError(f'不支持的通知器类型: {name}')
+    cls = _load_notifier_class(name)
+
+    parameters = inspect.signature(cls.__init__).parameters
+    if not any(p.kind == inspect.Parameter.VAR_KEYWORD for p in parameters.values()):
+        kwargs = {key: value for key, value in kwargs.items() if key in parameters}
+    return cls(**kwargs)
+
+
+@dataclass
+class ChannelResult:
+    """单个通道的发送结果"""
+    channel: str
+    ok: bool
+    latency: float  # 秒；超时时为已等待的时间
+    error: Optional[str] = None
+
+
+class MultiNotifier(Notifier):
+    """多通道通知器：在线程池中并发发送，每个通道有独立的超时时间"""
+
+    def __init__(self, channels: Dict[str, Notifier], timeouts: Optional[Dict[str, float]] = None,
+                 default_timeout: float = 10.0, max_workers: int = 4):
+        """
+        初始化多通道通知器
+
+        Args:
+            channels: 通道名称 -> 通知器
+            timeouts: 通道名称 -> 超时时间（秒）
+            default_timeout: 未单独配置的通道的超时时间（秒）
+            max_workers: 线程池大小
+        """
+        self.channels = channels
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(channels) or 1)),
+                                            thread_name_prefix='notifier')
+        self._lock = threading.Lock()
+        # 各通道历次发送耗时（秒）
+        self.latencies: Dict[str, List[float]] = {name: [] for name in channels}
+        self.last_results: Dict[str, ChannelResult] = {}
+
+    def _send_one(self, name: str, notifier: Notifier, content: str) -> ChannelResult:
+        started = time.monotonic()
+        try:
+            notifier.send_markdown(content)
+            result = ChannelResult(name, True, time.monotonic() - started)
+        except Exception as e:
+            result = ChannelResult(name, False, time.monotonic() - started, str(e))
+        with self._lock:
+            self.latencies[name].append(result.latency)
+            self.last_results[name] = result
+        return result
+
+    def send_all(self, content: str, wait_for_results: bool = True,
+                 only: Optional[List[str]] = None) -> Dict[str, ChannelResult]:
+        """
+        并发发送到所有通道
+
+        Args:
+            content: Markdown 格式的消息内容
+            wait_for_results: 是否等待结果（最长等待各通道自己的超时时间）；
+                为 False 时立即返回，结果稍后出现在 last_results 中
+            only: 只发送到这些通道（可选，默认全部通道）
+
+        Returns:
+            通道名称 -> 发送结果（超时的通道标记为失败，但其发送线程会在后台继续完成）
+        """
+        started = time.monotonic()
+        futures = {name: self._executor.submit(self._send_one, name, notifier, content)
+                   for name, notifier in self.channels.items() if only is None or name in only}
+        if not wait_for_results:
+            return {}
+
+        results = {}
+        # 按超时时间从短到长依次等待，慢通道不影响快通道的结果
+        for name in sorted(futures, key=lambda n: self.timeouts.get(n, self.default_timeout)):
+            remaining = started + self.timeouts.get(name, self.default_timeout) - time.monotonic()
+            done, _ = wait([futures[name]], timeout=max(0.0, remaining))
+            if done:
+                results[name] = futures[name].result()
+            else:
+                results[name] = ChannelResult(name, False, time.monotonic() - started, '超时')
+        return results
+
+    def send_markdown(self, content: str) -> None:
+        """
+        发送 Markdown 消息到所有通道
+
+        Raises:
+            RuntimeError: 所有通道均发送失败
+        """
+        results = self.send_all(content)
+        for result in results.values():
+            status = '✅' if result.ok else f'❌ {result.error}'
+            print(f'[通知] {result.channel}: {status} ({result.latency * 1000:.0f} ms)')
+        if results and not any(result.ok for result in results.values()):
+            raise RuntimeError('所有通知通道均发送失败')
+
+    def close(self):
+        """关闭线程池（不等待仍在进行的发送）"""
+        self._executor.shutdown(wait=False)
+
+
+def channel_names(notifier_config: dict) -> List[str]:
+    """
+    从通知配置中解析通道列表
+
+    type 可以是单个名称、逗号分隔的名称或列表。
+
+    Args:
+        notifier_config: 配置中的 notification 段
+
+    Returns:
+        通道名称列表（小写）
+    """
+    value = notifier_config.get('type') or 'console'
+    if isinstance(value, str):
+        value = value.split(',')
+    return [str(name).strip().lower() for name in value if str(name).strip()]
+
+
+def build_notifiers(notifier_config: dict) -> MultiNotifier:
+    """
+    按配置构建多通道通知器
+
+    每个通道的初始化参数取自同名配置段（如 notification.xxtui），
+    通道超时时间为该段的 timeout 加 2 秒余量（未配置时 10 秒）。
+
+    Args:
+        notifier_config: 配置中的 notification 段
+
+    Returns:
+        MultiNotifier 实例（无法创建的通道会被跳过并打印错误）
+    """
+    channels: Dict[str, Notifier] = {}
+    timeouts: Dict[str, float] = {}
+    for name in channel_names(notifier_config):
+        options = dict(notifier_config.get(name) or {})
+        try:
+            channels[name] = build_notifier(name, **options)
+        except Exception as e:
+            print(f'[错误] 创建通知器失败 ({name}): {e}')
+            continue
+        if options.get('timeout'):
+            timeouts[name] = float(options['timeout']) + 2
+    return MultiNotifier(channels, timeouts)
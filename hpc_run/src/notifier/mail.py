@@ -0,0 +1,67 @@
+"""
+邮件通知器实现
+通过 SMTP 发送邮件（可使用集群内的本地 SMTP 中继）
+"""
+import smtplib
+from email.message import EmailMessage
+from typing import List, Optional, Union
+from .base import Notifier
+
+
+class EmailNotifier(Notifier):
+    """邮件通知器"""
+    
+    def __init__(self, recipients: Union[str, List[str]] = None, sender: str = 'hpc_run@localhost',
+                 host: str = 'localhost', port: int = 25, timeout: float = 10,
+                 subject: str = '训练通知', username: Optional[str] = None,
+                 password: Optional[str] = None, starttls: bool = False):
+        """
+        初始化邮件通知器
+        
+        Args:
+            recipients: 收件人（字符串或列表）
+            sender: 发件人
+            host: SMTP 服务器地址
+            port: SMTP 服务器端口
+            timeout: 连接超时时间（秒）
+            subject: 邮件标题
+            username: SMTP 用户名（可选）
+            password: SMTP 密码（可选）
+            starttls: 是否使用 STARTTLS
+            
+        Raises:
+            ValueError: 收件人缺失
+        """
+        if isinstance(recipients, str):
+            recipients = [item.strip() for item in recipients.split(',') if item.strip()]
+        if not recipients:
+            raise ValueError('邮件收件人缺失！请在配置文件中指定 notification.email.recipients')
+        self.recipients = recipients
+        self.sender = sender
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.subject = subject
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+    
+    def send_markdown(self, content: str) -> None:
+        """
+        以纯文本邮件发送 Markdown 消息
+        
+        Args:
+            content: Markdown 格式的消息内容
+        """
+        message = EmailMessage()
+        message['Subject'] = self.subject
+        message['From'] = self.sender
+        message['To'] = ', '.join(self.recipients)
+        message.set_content(content)
+        
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or '')
+            smtp.send_message(message)
@@ -0,0 +1,62 @@
+"""
+Webhook 通知器实现
+将消息以 JSON 形式 POST 到任意 URL（如企业微信、钉钉、飞书机器人或自建服务）
+"""
+import json
+import urllib.request
+import urllib.error
+from typing import Dict, Optional
+from .base import Notifier
+
+
+class WebhookNotifier(Notifier):
+    """Webhook 通知器"""
+    
+    def __init__(self, url: str = '', timeout: float = 5, headers: Optional[Dict[str, str]] = None,
+                 content_key: str = 'content', extra: Optional[Dict] = None):
+        """
+        初始化 Webhook 通知器
+        
+        Args:
+            url: 接收消息的 URL
+            timeout: 请求超时时间（秒）
+            headers: 额外的 HTTP 请求头
+            content_key: 消息内容在 JSON 中的字段名
+            extra: 附加到 JSON 中的固定字段
+            
+        Raises:
+            ValueError: URL 缺失
+        """
+        if not url:
+            raise ValueError('Webhook URL 缺失！请在配置文件中指定 notification.webhook.url')
+        self.url = url
+        self.timeout = timeout
+        self.headers = {'Content-Type': 'application/json'}
+        self.headers.update(headers or {})
+        self.content_key = content_key
+        self.extra = extra or {}
+    
+    def send_markdown(self, content: str) -> None:
+        """
+        发送 Markdown 消息
+        
+        Args:
+            content: Markdown 格式的消息内容
+            
+        Raises:
+            RuntimeError: 请求失败或返回非 2xx 状态码
+        """
+        payload = dict(self.extra)
+        payload[self.content_key] = content
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+            headers=self.headers,
+            method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                if not 200 <= response.status < 300:
+                    raise RuntimeError(f'Webhook 返回状态码 {response.status}')
+        except (urllib.error.URLError, OSError) as e:
+            raise RuntimeError(f'Webhook 请求失败: {e}')
@@ -10,6 +10,8 @@ import time
 from pathlib import Path
 from typing import Dict, Any, Union, Optional
 
+from .terminal import ProgressLineFilter
+
 
 class ConfigLoader:
     """配置加载器类，处理配置文件的加载、路径解析和验证"""
@@ -187,14 +189,19 @@ class ConfigLoader:
             print("       本工具的核心功能是训练完成后发送通知")
             return False
         
-        notifier_type = self.get('notification.type', '').lower()
+        notifier_type = self.get('notification.type', '')
         if not notifier_type:
             print("[ERROR] 配置错误: 缺失必需项 'notification.type'")
-            print("       可选值: 'console'（控制台）或 'xxtui'（推送通知）")
+            print("       可选值: 'console'、'xxtui'、'webhook'、'email'，多个通道可用列表或逗号分隔")
             return False
         
+        # 支持多个通道：字符串、逗号分隔字符串或列表
+        if isinstance(notifier_type, str):
+            notifier_type = notifier_type.split(',')
+        channels = [str(name).strip().lower() for name in notifier_type]
+        
         # 验证 xxtui 配置
-        if notifier_type == 'xxtui':
+        if 'xxtui' in channels:
             # 先从配置文件获取，如果不存在或为空，再检查环境变量
             api_key = self.get('notification.xxtui.api_key', '')
             if not api_key or api_key.strip() == '':
@@ -206,6 +213,14 @@ class ConfigLoader:
                 print("       方式 2: 设置环境变量 export XXTUI_KEY='your-api-key'")
                 return False
         
+        if 'webhook' in channels and not self.get('notification.webhook.url'):
+            print("[ERROR] 配置错误: 选择了 webhook 通知器但未设置 notification.webhook.url")
+            return False
+        
+        if 'email' in channels and not self.get('notification.email.recipients'):
+            print("[ERROR] 配置错误: 选择了 email 通知器但未设置 notification.email.recipients")
+            return False
+        
         return True
 
 
@@ -237,6 +252,8 @@ class Logger:
     def __init__(self, enable_console: bool = True):
         self.enable_console = enable_console
         self.logs = []
+        self._line_filter = ProgressLineFilter()
+        self._line_start = True
 
     def info(self, msg: str):
         text = f"[INFO] {msg}"
@@ -250,13 +267,23 @@ class Logger:
             print(text)
         self.logs.append(text + "\n")
 
-    def write_child(self, line: str):
-        """实时打印子进程输出"""
-        text = "    " + line
+    def write_child(self, text: str):
+        """实时打印子进程输出（任意片段；进度条重绘只保留最终状态）"""
         if self.enable_console:
-            sys.stdout.write(text)
+            # 每行（包括 \r 重绘的行）开头缩进
+            indented = text.replace("\r\n", "\n").replace("\n", "\n    ").replace("\r", "\r    ")
+            if self._line_start:
+                indented = "    " + indented
+            self._line_start = indented.endswith("\n    ")
+            if self._line_start:
+                indented = indented[:-4]
+            sys.stdout.write(indented)
             sys.stdout.flush()
-        self.logs.append(line)
+        self.logs.extend(self._line_filter.feed(text))
+
+    def flush_child(self):
+        """子进程输出结束，保存最后一行未换行的输出"""
+        self.logs.extend(self._line_filter.flush())
 
     def save(self, log_target: str, process_info: dict):
         """保存日志到文件或目录"""
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+终端输出过滤模块
+理解回车符和 ANSI 光标控制序列，把进度条（如 tqdm）的反复重绘折叠为最终状态再写入日志
+"""
+import os
+import re
+import time
+import codecs
+from typing import IO, Iterator, List
+
+
+# 换行、回车，以及 ANSI 转义序列（CSI 序列单独捕获参数和结束字符）
+_CONTROL = re.compile(r"\r\n|\n|\r|\x1b\[([0-9;?]*)[ -/]*([@-~])|\x1b[@-Z\\-_]")
+# 片段末尾不完整的转义序列（留到下一个片段再处理）
+_PARTIAL_ESCAPE = re.compile(r"\x1b(\[[0-9;?]*[ -/]*)?$")
+
+
+class ProgressLineFilter:
+    """
+    流式输出过滤器
+
+    输入任意切分的输出片段，返回应写入日志的完整行：
+    被回车符重写的行只保留最终状态（可选每隔一段时间保留一次中间状态），
+    颜色等 ANSI 序列不写入日志。终端输出不经过本过滤器，保持实时刷新。
+    """
+
+    def __init__(self, sample_interval: float = 0.0, max_line: int = 64 * 1024,
+                 collapse: bool = True, clock=time.monotonic):
+        """
+        初始化过滤器
+
+        Args:
+            sample_interval: 每隔多少秒把一次重绘的中间状态写入日志（0 表示只保留最终状态）
+            max_line: 单行最大字符数，超过后强制输出（防止不换行的输出无限累积）
+            collapse: 是否折叠重绘（为 False 时按原样逐行输出）
+            clock: 时钟函数（便于测试时替换）
+        """
+        self.sample_interval = sample_interval
+        self.max_line = max_line
+        self.collapse = collapse
+        self._clock = clock
+        self._line = ""
+        self._cursor = 0
+        self._pending = ""
+        self._skip_lines = 0          # 光标上移后，重绘已写入日志的行时不再重复输出
+        self._last_sample = clock()
+        self.redraws = 0              # 被折叠掉的重绘次数
+
+    def _write(self, text: str):
+        """在光标位置写入文本（覆盖已有字符）"""
+        if not text:
+            return
+        line, cursor = self._line, self._cursor
+        if cursor == len(line):
+            self._line = line + text
+        elif cursor > len(line):
+            self._line = line + " " * (cursor - len(line)) + text
+        else:
+            self._line = line[:cursor] + text + line[cursor + len(text):]
+        self._cursor = cursor + len(text)
+
+    def _newline(self, lines: List[str]):
+        """结束当前行"""
+        if self._skip_lines > 0:
+            self._skip_lines -= 1
+        else:
+            lines.append(self._line + "\n")
+        self._line = ""
+        self._cursor = 0
+
+    def _control(self, token: str, params: str, final: str, lines: List[str]):
+        """处理一个控制字符或转义序列"""
+        if token == "\r":
+            if self._line:
+                self.redraws += 1
+                if (self.sample_interval > 0 and self._skip_lines == 0
+                        and self._clock() - self._last_sample >= self.sample_interval):
+                    lines.append(self._line + "\n")
+                    self._last_sample = self._clock()
+            self._cursor = 0
+            return
+        if not final:
+            return  # 其他转义序列（不影响行内容）
+
+        count = int(params.split(";")[0]) if params[:1].isdigit() else 1
+        if final == "K":
+            mode = params or "0"
+            if mode == "0":
+                self._line = self._line[:self._cursor]
+            elif mode == "1":
+                self._line = " " * self._cursor + self._line[self._cursor:]
+            else:
+                self._line = ""
+        elif final == "G":
+            self._cursor = max(0, count - 1)
+        elif final == "C":
+            self._cursor += count
+        elif final == "D":
+            self._cursor = max(0, self._cursor - count)
+        elif final in "AF":
+            # 光标上移：接下来的 count 行是对已写入日志的行的重绘，折叠掉
+            self._skip_lines += count
+            self.redraws += 1
+            self._line = ""
+            self._cursor = 0
+        # 颜色（m）等其余 CSI 序列不写入日志
+
+    def feed(self, text: str) -> List[str]:
+        """
+        输入一段输出
+
+        Args:
+            text: 输出片段（可以在任意位置切分）
+
+        Returns:
+            应写入日志的完整行（以换行符结尾）
+        """
+        lines: List[str] = []
+        if self._pending:
+            text, self._pending = self._pending + text, ""
+        # 快速路径：普通文本只按换行切分
+        if not self.collapse or ("\r" not in text and "\x1b" not in text):
+            parts = text.split("\n")
+            for part in parts[:-1]:
+                if self.collapse:
+                    self._write(part)
+                    self._newline(lines)
+                else:
+                    lines.append(self._line + part + "\n")
+                    self._line = ""
+            if self.collapse:
+                self._write(parts[-1])
+            else:
+                self._line += parts[-1]
+        else:
+            partial = _PARTIAL_ESCAPE.search(text, max(0, len(text) - 64))
+            if partial:
+                text, self._pending = text[:partial.start()], partial.group(0)
+            position = 0
+            for match in _CONTROL.finditer(text):
+                self._write(text[position:match.start()])
+                token = match.group(0)
+                if token in ("\n", "\r\n"):
+                    self._newline(lines)
+                else:
+                    self._control(token, match.group(1) or "", match.group(2) or "", lines)
+                position = match.end()
+            self._write(text[position:])
+
+        if len(self._line) > self.max_line:
+            lines.append(self._line + "\n")
+            self._line = ""
+            self._cursor = 0
+        return lines
+
+    def flush(self) -> List[str]:
+        """
+        输出尚未换行的最后一行（输出结束时调用）
+
+        Returns:
+            应写入日志的行（可能为空）
+        """
+        lines = []
+        if self._line.strip():
+            self._skip_lines = 0
+            self._newline(lines)
+        self._line = ""
+        self._cursor = 0
+        return lines
+
+
+def read_output(stream: IO[bytes], chunk_size: int = 64 * 1024) -> Iterator[str]:
+    """
+    从子进程的二进制管道读取输出
+
+    每次返回管道中已有的数据（不等待换行），进度条的重绘能实时显示在终端上。
+
+    Args:
+        stream: 子进程的 stdout（二进制模式）
+        chunk_size: 单次最多读取的字节数
+
+    Yields:
+        解码后的文本片段（UTF-8，非法字节替换为 U+FFFD）
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    fd = stream.fileno()
+    while True:
+        data = os.read(fd, chunk_size)
+        if not data:
+            break
+        text = decoder.decode(data)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
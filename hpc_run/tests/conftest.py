@@ -0,0 +1,32 @@
+"""测试公共设置：把 hpc_run 目录加入导入路径（与在该目录下运行脚本时一致），以及伪造的 nvidia-smi"""
+import os
+import stat
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def fake_nvidia_smi(tmp_path, monkeypatch):
+    """
+    返回一个函数：在 PATH 最前面放一个伪造的 nvidia-smi，输出给定的 CSV 行
+
+    Returns:
+        函数 (lines) -> 调用记录文件（每次调用追加一行）
+    """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+    def install(lines):
+        calls = bin_dir / "calls"
+        output = "\n".join(lines)
+        script = bin_dir / "nvidia-smi"
+        script.write_text(f"#!/bin/sh\necho call >> {calls}\ncat <<'EOF'\n{output}\nEOF\n")
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        return calls
+
+    return install
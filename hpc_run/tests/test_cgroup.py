@@ -0,0 +1,105 @@
+"""cgroup 计数读取测试（在临时目录中伪造 procfs 和 cgroupfs）"""
+import os
+
+from src.core.cgroup import CGROUP_MOUNT, cgroup_path, open_cgroup
+from src.core.memwatch import read_oom_kills
+from src.core.monitor import SystemMonitor
+
+
+MB = 1024 * 1024
+
+
+def fake_cgroup(root, pid, proc_cgroup, relative=None, files=None):
+    """
+    写入 /proc/<pid>/cgroup，并在 cgroupfs 中创建 relative 目录及其计数文件
+
+    Returns:
+        cgroup 目录（relative 为 None 时为 None）
+    """
+    (root / f"proc/{pid}").mkdir(parents=True)
+    (root / f"proc/{pid}/cgroup").write_text(proc_cgroup)
+    if relative is None:
+        return None
+    path = root / CGROUP_MOUNT / relative
+    path.mkdir(parents=True)
+    for name, content in (files or {}).items():
+        (path / name).write_text(content)
+    return path
+
+
+V2_FILES = {
+    "cpu.stat": "usage_usec 1000000\nuser_usec 800000\nsystem_usec 200000\n",
+    "memory.current": str(600 * MB),
+    "memory.stat": f"anon {400 * MB}\nfile {200 * MB}\ninactive_file {100 * MB}\n",
+    "memory.peak": str(900 * MB),
+    "memory.events": "low 0\nhigh 0\nmax 3\noom 1\noom_kill 1\n",
+    "io.stat": "8:0 rbytes=1000 wbytes=2000 rios=10 wios=20 dbytes=0 dios=0\n"
+               "259:0 rbytes=500 wbytes=0 rios=5 wios=0 dbytes=0 dios=0\n",
+    "cgroup.procs": "101\n102\n103\n",
+}
+
+
+def test_reads_v2_counters(tmp_path):
+    path = fake_cgroup(tmp_path, 101, "0::/system.slice/job_1/step_0\n", "system.slice/job_1/step_0", V2_FILES)
+    assert cgroup_path(101, tmp_path) == path
+
+    accounting = open_cgroup(101, tmp_path)
+    counters = accounting.read()
+    assert counters.cpu_usec == 1000000
+    assert counters.memory_current == 600 * MB
+    # 工作集不含可回收的非活跃页缓存
+    assert counters.working_set == 500 * MB
+    assert counters.memory_peak == 900 * MB
+    # io.stat 按设备求和
+    assert (counters.read_bytes, counters.write_bytes) == (1500, 2000)
+    assert (counters.read_ops, counters.write_ops) == (15, 20)
+    assert accounting.process_count() == 3
+    assert read_oom_kills(path) == 1
+
+
+def test_missing_controllers_read_as_zero(tmp_path):
+    fake_cgroup(tmp_path, 101, "0::/job_1\n", "job_1", {"cpu.stat": "usage_usec 5\n"})
+    accounting = open_cgroup(101, tmp_path)
+    counters = accounting.read()
+    assert counters.cpu_usec == 5
+    assert counters.memory_current == 0 and counters.memory_peak is None
+    assert counters.read_bytes == 0
+    assert not accounting.has_memory()
+    assert read_oom_kills(accounting.path) is None
+
+
+def test_v1_layout_is_not_used(tmp_path):
+    fake_cgroup(tmp_path, 101, "12:memory:/slurm/uid_1000/job_1\n"
+                               "11:cpu,cpuacct:/slurm/uid_1000/job_1\n"
+                               "1:name=systemd:/user.slice\n",
+                "memory/slurm/uid_1000/job_1", {"memory.usage_in_bytes": str(MB)})
+    assert cgroup_path(101, tmp_path) is None
+    assert open_cgroup(101, tmp_path) is None
+
+
+def test_monitor_samples_cgroup_counters(tmp_path):
+    pid = os.getpid()
+    path = fake_cgroup(tmp_path, pid, "0::/job_1\n", "job_1", V2_FILES)
+    monitor = SystemMonitor(pid, cgroup_root=tmp_path)
+    assert monitor.metrics.backend == "cgroup"
+
+    cpu, memory_mb, _ = monitor.sample_cgroup()
+    assert cpu == 0.0 and memory_mb == 500
+    # 两次读数之间增加的 usage_usec 按经过的时间换算为 CPU 使用率
+    (path / "cpu.stat").write_text("usage_usec 3000000\n")
+    cpu, _, _ = monitor.sample_cgroup()
+    assert cpu > 0
+    monitor.stop_background()
+
+
+def test_monitor_falls_back_to_psutil(tmp_path, capsys):
+    pid = os.getpid()
+    fake_cgroup(tmp_path, pid, "12:memory:/job_1\n")
+    monitor = SystemMonitor(pid, accounting="cgroup", cgroup_root=tmp_path)
+    assert monitor.cgroup is None
+    assert monitor.metrics.backend == "psutil"
+    assert "未找到 cgroup v2" in capsys.readouterr().out
+
+    cpu, memory_mb, _ = monitor.sample_all()
+    assert cpu is not None and memory_mb > 0
+    monitor.stop_background()
@@ -0,0 +1,23 @@
+"""进度摘要测试"""
+from src.core.digest import ProgressDigest
+
+
+def stats(mono, steps, total=1000):
+    return {"type": "stats", "mono": mono, "steps": steps, "total_steps": total}
+
+
+def test_digest_after_resume_uses_logged_steps():
+    digest = ProgressDigest()
+    digest.ingest("rank 0", [stats(0.0, 100), stats(100.0, 600)])
+    first = digest.entries()[0]
+    assert first["steps"] == 600
+
+    # 重启后从 step 500 的检查点恢复，步号回退
+    digest.ingest("rank 0", [{"type": "exit"}, {"type": "spawn"}, stats(200.0, 520)])
+    entry = digest.entries()[0]
+    assert entry["steps"] == 520 and entry["total_steps"] == 1000
+    assert entry["steps_per_second"] is None
+    assert not entry["exited"]
+
+    digest.ingest("rank 0", [stats(300.0, 720)])
+    assert digest.entries()[0]["steps_per_second"] == 2.0
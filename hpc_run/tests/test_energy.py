@@ -0,0 +1,100 @@
+"""能耗统计测试（伪造 sysfs 中的 RAPL 计数和 nvidia-smi）"""
+import os
+import time
+
+import pytest
+
+from src.core.energy import POWERCAP_DIR, EnergyMeter, RaplZone, counter_delta, find_rapl_zones
+from src.core.monitor import SystemMonitor
+
+
+def fake_rapl(root, name, energy_uj, max_range_uj=262143328850):
+    """在伪造的 powercap 目录下创建一个 RAPL 能量域"""
+    path = root / POWERCAP_DIR / name
+    path.mkdir(parents=True)
+    (path / "name").write_text("package-0\n" if name.count(":") == 1 else "core\n")
+    (path / "max_energy_range_uj").write_text(f"{max_range_uj}\n")
+    (path / "energy_uj").write_text(f"{energy_uj}\n")
+    return path
+
+
+def test_finds_only_package_zones(tmp_path):
+    fake_rapl(tmp_path, "intel-rapl:0", 1000)
+    fake_rapl(tmp_path, "intel-rapl:0:0", 500)
+    psys = fake_rapl(tmp_path, "intel-rapl:1", 1000)
+    (psys / "name").write_text("psys\n")
+    zones = find_rapl_zones(tmp_path)
+    assert [zone.name for zone in zones] == ["package-0"]
+    assert zones[0].last_uj == 1000
+
+
+def test_rapl_counter_wraparound(tmp_path):
+    assert counter_delta(900, 100, 1000) == 200
+    zone = fake_rapl(tmp_path, "intel-rapl:0", 900_000, max_range_uj=1_000_000)
+    meter = EnergyMeter(tmp_path)
+    meter.observe(100.0, None)
+    # 计数器越过 max_energy_range_uj 后从 0 重新开始
+    (zone / "energy_uj").write_text("100000\n")
+    meter.observe(110.0, None)
+    assert meter.cpu_joules == pytest.approx(0.2)
+    summary = meter.summary()
+    assert summary["cpu_kwh"] == round(0.2 / 3.6e6, 6)
+    assert summary["gpu_kwh"] is None
+
+
+def test_unreadable_rapl_is_reported(tmp_path, monkeypatch):
+    fake_rapl(tmp_path, "intel-rapl:0", 1000)
+
+    def denied(self):
+        raise PermissionError(13, "Permission denied", str(self.path / "energy_uj"))
+
+    # 较新的内核默认只允许 root 读取 energy_uj（测试可能以 root 运行，直接替换读取函数）
+    monkeypatch.setattr(RaplZone, "read", denied)
+    meter = EnergyMeter(tmp_path)
+    assert meter.zones == []
+    assert "Permission denied" in meter.rapl_error
+    meter.observe(0.0, 100.0)
+    meter.observe(10.0, 100.0)
+    summary = meter.summary()
+    # GPU 部分照常统计，错误写入汇总
+    assert summary["gpu_kwh"] == round(1000 / 3.6e6, 6)
+    assert summary["cpu_kwh"] is None
+    assert "Permission denied" in summary["error"]
+
+
+def test_rapl_becomes_unreadable_mid_run(tmp_path, monkeypatch):
+    fake_rapl(tmp_path, "intel-rapl:0", 1000)
+    meter = EnergyMeter(tmp_path)
+
+    def denied(self):
+        raise PermissionError("denied")
+
+    monkeypatch.setattr(RaplZone, "read", denied)
+    meter.observe(0.0, None)
+    assert meter.summary() == {"error": "RAPL 计数读取失败: denied"}
+
+
+def test_gpu_power_over_uneven_intervals():
+    meter = EnergyMeter(rapl=False)
+    for t, watts in ((0.0, 100.0), (1.0, 100.0), (4.0, 200.0), (4.5, None), (10.0, 300.0)):
+        meter.observe(t, watts)
+    # 梯形积分: 100*1 + (100+200)/2*3；读数缺失的一段不计入
+    assert meter.gpu_joules == pytest.approx(550.0)
+    summary = meter.summary(steps=55)
+    assert summary["duration_seconds"] == 10.0
+    assert summary["peak_watts"] == 300.0
+    assert summary["joules_per_step"] == 10.0
+
+
+def test_monitor_integrates_nvidia_smi_power(fake_nvidia_smi):
+    # 两块 GPU，只统计 CUDA_VISIBLE_DEVICES 中的第 1 块
+    fake_nvidia_smi(["10, [N/A]", "50, 250.0"])
+    meter = EnergyMeter(rapl=False)
+    monitor = SystemMonitor(os.getpid(), gpu_indices=[1], accounting="psutil", energy_meter=meter)
+    for pause in (0.05, 0.2, 0.1):
+        monitor.sample_all()
+        time.sleep(pause)
+    monitor.sample_all()
+    assert meter.gpu_joules == pytest.approx(250.0 * (meter.last_time - meter.first_time))
+    assert meter.peak_watts == 250.0
+    assert monitor.stop_background().summary()["energy"]["gpu_kwh"] is not None
@@ -0,0 +1,45 @@
+"""内存压力跟踪测试"""
+import json
+import sys
+
+import train_wrapper
+from src.core.memwatch import MemoryWatch
+from src.core.reporter import ReportGenerator
+
+
+MB = 1024 * 1024
+
+
+def run_job(tmp_path, config):
+    work_dir = tmp_path / "run"
+    work_dir.mkdir()
+    (work_dir / "job.py").write_text("import time\nprint('step 1')\ntime.sleep(1.5)\n")
+    assert train_wrapper.run_training(str(work_dir), f"{sys.executable} job.py", "logs", config=config) == 0
+    return json.loads((work_dir / ".train_complete.json").read_text())
+
+
+def test_summary_without_samples_has_no_peak(tmp_path):
+    watch = MemoryWatch(4096 * MB, "node", psi_path=tmp_path / "missing")
+    summary = watch.summary(0)
+    assert "peak_mb" not in summary and summary["limit_mb"] == 4096.0
+    assert "无采样数据" in ReportGenerator().generate_memory_markdown(summary)
+
+    watch.observe(100.0, 1024 * MB)
+    summary = watch.summary(0)
+    assert summary["peak_mb"] == 1024.0 and summary["peak_fraction"] == 0.25
+
+
+def test_no_memory_section_when_monitor_disabled(tmp_path):
+    # monitor.enabled 默认关闭，内存跟踪得不到读数，不写入完成标记
+    marker = run_job(tmp_path, {"train": {}, "monitor": {"node_probe": False}})
+    assert "memory" not in marker
+    assert "oom_killed" not in marker
+    assert isinstance(marker["node"], str) and "node_probe" not in marker
+
+
+def test_memory_section_when_monitor_enabled(tmp_path):
+    config = {"train": {}, "monitor": {"enabled": True, "interval": 0.2, "shared_sampler": False,
+                                       "node_probe": False, "energy": {"enabled": False}}}
+    marker = run_job(tmp_path, config)
+    assert marker["memory"]["peak_mb"] > 0
+    assert marker["oom_killed"] is False
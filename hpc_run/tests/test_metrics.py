@@ -0,0 +1,89 @@
+"""指标导出测试（抓取 /metrics 并检查 textfile 的标签格式）"""
+import urllib.error
+import urllib.request
+
+import pytest
+
+from src.core.metrics import (
+    OPENMETRICS_CONTENT_TYPE, PROMETHEUS_CONTENT_TYPE, MetricsRegistry, MetricsServer, TextfileExporter,
+)
+
+
+LABELS = {"run": "exp1", "job_id": "42", "rank": 0}
+
+
+@pytest.fixture
+def server():
+    registry = MetricsRegistry()
+    registry.counter("hpc_run_job_output_lines", "Output lines written to the log").set(120, **LABELS)
+    registry.gauge("hpc_run_job_steps", "Training steps parsed from the output").set(12.5, **LABELS)
+    registry.histogram("hpc_run_monitor_poll_duration_seconds", "Duration of one monitor check",
+                       buckets=(0.1, 1.0)).observe(0.5)
+    server = MetricsServer(registry, "127.0.0.1", 0).start()
+    yield server
+    server.close()
+
+
+def scrape(server, path="/metrics", accept=None):
+    host, port = server.address
+    request = urllib.request.Request(f"http://{host}:{port}{path}")
+    if accept:
+        request.add_header("Accept", accept)
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return response.headers["Content-Type"], response.read().decode("utf-8")
+
+
+def test_scrape_prometheus_text(server):
+    content_type, body = scrape(server)
+    assert content_type == PROMETHEUS_CONTENT_TYPE
+    # 0.0.4 格式中 counter 的 TYPE 带 _total，且没有 # EOF
+    assert "# TYPE hpc_run_job_output_lines_total counter\n" in body
+    assert 'hpc_run_job_output_lines_total{job_id="42",rank="0",run="exp1"} 120\n' in body
+    assert 'hpc_run_job_steps{job_id="42",rank="0",run="exp1"} 12.5\n' in body
+    assert 'hpc_run_monitor_poll_duration_seconds_bucket{le="0.1"} 0\n' in body
+    assert 'hpc_run_monitor_poll_duration_seconds_bucket{le="+Inf"} 1\n' in body
+    assert "hpc_run_monitor_poll_duration_seconds_sum 0.5\n" in body
+    assert "# EOF" not in body
+
+
+def test_scrape_openmetrics(server):
+    content_type, body = scrape(server, accept="application/openmetrics-text;version=1.0.0,text/plain;q=0.5")
+    assert content_type == OPENMETRICS_CONTENT_TYPE
+    assert "# TYPE hpc_run_job_output_lines counter\n" in body
+    assert 'hpc_run_job_output_lines_total{job_id="42",rank="0",run="exp1"} 120\n' in body
+    assert body.endswith("# EOF\n")
+
+
+def test_scrape_unknown_path(server):
+    with pytest.raises(urllib.error.HTTPError) as excinfo:
+        scrape(server, "/")
+    assert excinfo.value.code == 404
+    # 查询参数不影响路径匹配
+    assert scrape(server, "/metrics?name=x")[1]
+
+
+def test_textfile_label_format(tmp_path):
+    path = tmp_path / "hpc_run.prom"
+    labels = {"run": 'exp "a"\\b\nc', "job_id": "42", "rank": None}
+    exporter = TextfileExporter(path, labels)
+    exporter.source = lambda: {"steps": 7, "lines": 3, "max_memory_mb": 2}
+    exporter.set_phase("running")
+
+    text = path.read_text()
+    # 标签按名称排序，值中的反斜杠、双引号和换行按规范转义，None 写为空字符串
+    series = 'job_id="42",rank="",run="exp \\"a\\"\\\\b\\nc"'
+    assert f"hpc_run_job_steps{{{series}}} 7\n" in text
+    assert f"hpc_run_job_output_lines_total{{{series}}} 3\n" in text
+    assert f"hpc_run_job_memory_max_bytes{{{series}}} 2097152\n" in text
+    # phase 标签与作业标签一起排序
+    assert 'hpc_run_job_phase{job_id="42",phase="running",rank="",run="exp \\"a\\"\\\\b\\nc"} 1\n' in text
+    assert 'hpc_run_job_phase{job_id="42",phase="failed",rank=""' in text
+    assert "# TYPE hpc_run_job_output_lines_total counter\n" in text
+    assert "# EOF" not in text
+    # 每个样本一行，转义后的换行不会拆开样本
+    assert all(line.startswith(("#", "hpc_run_")) for line in text.splitlines())
+    # 原子替换不留下临时文件
+    assert [p.name for p in tmp_path.iterdir()] == ["hpc_run.prom"]
+
+    exporter.close(remove=True)
+    assert not path.exists()
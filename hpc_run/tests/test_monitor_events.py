@@ -0,0 +1,61 @@
+"""监控程序事件提醒测试"""
+from src.core.events import EventWriter
+from train_monitor import alert_settings, report_new_events
+
+
+class RecordingNotifier:
+    """记录提交的消息，不真正发送"""
+    channels = ["fake"]
+
+    def __init__(self):
+        self.messages = []
+
+    def send_all(self, message, wait_for_results=True):
+        self.messages.append(message)
+
+
+def write_events(path, *events):
+    writer = EventWriter(path)
+    for event_type, fields in events:
+        writer.emit(event_type, **fields)
+    writer.close()
+
+
+MEMORY_WARNING = ("memory_warning", {"used_mb": 900.0, "limit_mb": 1000.0, "fraction": 0.9,
+                                     "slope_mb_per_s": 1.0, "eta_seconds": 100.0})
+SLOWDOWN = ("slowdown", {"step": 10, "elapsed": 5.0, "step_time": 2.0, "baseline": 1.0})
+
+
+def test_memory_warning_is_sent_with_default_config(tmp_path):
+    path = tmp_path / "train.events.jsonl"
+    write_events(path, MEMORY_WARNING, SLOWDOWN)
+    notifier = RecordingNotifier()
+    report_new_events(str(path), 0, notifier, alerts=alert_settings({}))
+    # 内存预警默认发送，降速提醒默认关闭
+    assert len(notifier.messages) == 1
+    assert "内存" in notifier.messages[0]
+
+
+def test_alerts_follow_their_own_settings(tmp_path):
+    path = tmp_path / "train.events.jsonl"
+    write_events(path, MEMORY_WARNING, SLOWDOWN)
+    notifier = RecordingNotifier()
+    report_new_events(str(path), 0, notifier,
+                      alerts=alert_settings({"on_slowdown": True, "on_memory_warning": False}))
+    assert len(notifier.messages) == 1
+    assert "降速" in notifier.messages[0]
+
+
+def test_checkpoint_slow_has_its_own_setting(tmp_path):
+    path = tmp_path / "train.events.jsonl"
+    write_events(path, ("checkpoint_slow", {"name": "step_100.pt", "bandwidth_mbps": 50.0, "baseline_mbps": 200.0,
+                                            "size_bytes": 1024 ** 3, "duration": 20.5}))
+    notifier = RecordingNotifier()
+    report_new_events(str(path), 0, notifier, alerts=alert_settings({}))
+    assert len(notifier.messages) == 1
+    assert "step_100.pt（1024.0 MB）" in notifier.messages[0]
+    assert "基线的 25%" in notifier.messages[0]
+
+    notifier = RecordingNotifier()
+    report_new_events(str(path), 0, notifier, alerts=alert_settings({"on_checkpoint_slow": False}))
+    assert notifier.messages == []
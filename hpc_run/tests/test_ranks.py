@@ -0,0 +1,108 @@
+"""多 rank 完成标记汇总测试"""
+from src.core.ranks import aggregate_rank_markers, detect_rank
+from src.core.reporter import ReportGenerator
+
+
+def marker(rank, return_code=0, elapsed=100.0, hostname="node1", **fields):
+    info = {
+        "rank": rank, "world_size": 3, "return_code": return_code, "elapsed_seconds": elapsed,
+        "start_time": "2026-01-01 00:00:00", "end_time": "2026-01-01 00:01:40", "start_timestamp": 1.0,
+        "command": "python train.py", "log_file": f"/logs/train.rank{rank}.log",
+        "events_file": f"/logs/train.rank{rank}.events.jsonl", "hostname": hostname, "job_id": "42",
+        "resources": {"cpu_avg": 100.0, "gpu_avg": 90.0, "max_memory_mb": 1000.0,
+                      "energy": {"total_kwh": 0.3, "gpu_kwh": 0.2, "cpu_kwh": 0.1,
+                                 "duration_seconds": elapsed, "steps": 1000}},
+        "memory": {"peak_mb": 1000.0, "limit_mb": 4000, "peak_fraction": 0.25, "limit_source": "cgroup",
+                   "oom_killed": False},
+        "oom_killed": False,
+    }
+    info.update(fields)
+    return info
+
+
+def test_failed_rank_keeps_error_and_oom_details():
+    error_index = {"count": 2, "first_error": {"offset": 10, "line": "CUDA out of memory"}}
+    markers = [
+        marker(0, checkpoint_io={"count": 2, "records": []}, stage={"seconds": 5.0, "paths": []}),
+        # rank 1 与 rank 0 在同一节点，被 OOM killer 杀死，rank 2 尚未结束
+        marker(1, return_code=-9, elapsed=60.0, error_index=error_index,
+               memory={"peak_mb": 3990.0, "limit_mb": 4000, "peak_fraction": 0.998, "limit_source": "cgroup",
+                       "oom_killed": True},
+               oom_killed=True,
+               stage={"seconds": 9.0, "paths": []}),
+    ]
+    aggregated = aggregate_rank_markers(markers)
+    assert aggregated["status"] == "failed"
+    assert aggregated["failed_rank"] == 1
+    assert aggregated["log_file"] == "/logs/train.rank1.log"
+    assert aggregated["events_file"] == "/logs/train.rank1.events.jsonl"
+    assert aggregated["error_index"] == error_index
+    assert aggregated["oom_killed"] is True
+    assert aggregated["memory"]["peak_mb"] == 3990.0
+    assert aggregated["checkpoint_io"]["count"] == 2
+    assert aggregated["stage"]["seconds"] == 9.0
+    assert "restarts" not in aggregated and "release" not in aggregated
+
+    # 同一节点的 RAPL 能耗只计一次
+    energy = aggregated["energy"]
+    assert energy["gpu_kwh"] == 0.4 and energy["cpu_kwh"] == 0.1
+    assert energy["total_kwh"] == 0.5 and energy["ranks"] == 2
+
+    report = ReportGenerator().generate_ranks_markdown(aggregated)
+    assert "rank 1 首先失败" in report
+    assert "0.5 kWh" in report
+    assert "OOM" in ReportGenerator().generate_memory_markdown(aggregated["memory"])
+
+
+def test_completed_job_waits_for_all_ranks():
+    markers = [marker(0), marker(1, hostname="node2")]
+    assert aggregate_rank_markers(markers) is None
+
+    markers.append(marker(2, elapsed=150.0, hostname="node3",
+                          memory={"peak_mb": 2000.0, "limit_mb": 4000, "oom_killed": False}))
+    aggregated = aggregate_rank_markers(markers)
+    assert aggregated["status"] == "completed"
+    assert aggregated["slowest_rank"] == 2
+    # 未失败时内存取峰值最高的 rank
+    assert aggregated["memory"]["peak_mb"] == 2000.0
+    assert aggregated["oom_killed"] is False
+    assert aggregated["energy"]["cpu_kwh"] == 0.3
+
+
+def test_rank_table_uses_node_name():
+    # 节点能力探测结果单独记录在 node_probe 中，node 始终是节点名
+    probe = {"hostname": "node1", "cpu": {"model": "EPYC", "logical_cores": 64}}
+    markers = [marker(0, node="gpu-node1", node_probe=probe), marker(1, hostname="node2", node="gpu-node2"),
+               marker(2, elapsed=150.0, hostname="node3", node="")]
+    report = ReportGenerator().generate_ranks_markdown(aggregate_rank_markers(markers))
+    assert "| 0 | gpu-node1 |" in report
+    assert "| 1 | gpu-node2 |" in report
+    assert "| **2** 🐢 | node3 |" in report
+    assert "EPYC" not in report
+
+
+def test_slurm_rank_only_inside_a_step():
+    # sbatch -n 4 的批处理脚本中直接运行：只是一个进程
+    batch = {"SLURM_JOB_ID": "42", "SLURM_PROCID": "0", "SLURM_NTASKS": "4", "SLURM_LOCALID": "0"}
+    info = detect_rank(batch)
+    assert (info.rank, info.world_size, info.is_distributed) == (0, 1, False)
+    assert info.job_id == "42"
+
+    # srun 启动的作业步：world size 取作业步的任务数，而不是整个分配的 SLURM_NTASKS
+    step = dict(batch, SLURM_STEP_ID="0", SLURM_PROCID="3", SLURM_STEP_NUM_TASKS="2", SLURM_LOCALID="1")
+    info = detect_rank(step)
+    assert (info.rank, info.world_size, info.local_rank) == (3, 2, 1)
+
+
+def test_missing_ranks_reported_after_timeout():
+    markers = [marker(0, timestamp=1000.0), marker(2, hostname="node3", timestamp=1010.0)]
+    assert aggregate_rank_markers(markers, rank_timeout=600, now=1500.0) is None
+    assert aggregate_rank_markers(markers, now=1e9) is None
+    # 没有结束时间的标记不参与超时判断
+    assert aggregate_rank_markers([marker(0)], rank_timeout=600, now=1e9) is None
+
+    aggregated = aggregate_rank_markers(markers, rank_timeout=600, now=1700.0)
+    assert aggregated["status"] == "incomplete"
+    assert aggregated["missing_ranks"] == [1]
+    assert aggregated["return_code"] is None
+    assert "超时未结束的 rank:** 1" in ReportGenerator().generate_ranks_markdown(aggregated)
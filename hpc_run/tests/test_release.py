@@ -0,0 +1,82 @@
+"""资源释放测试（用桩命令代替 scancel）"""
+import json
+import os
+import signal
+import sys
+
+import pytest
+
+import train_wrapper
+from src.core.release import ReleasePolicy, execute_release
+
+
+@pytest.fixture(autouse=True)
+def restore_signals():
+    """execute_release 会忽略 SIGTERM/SIGHUP，测试结束后恢复"""
+    saved = {signum: signal.getsignal(signum) for signum in (signal.SIGTERM, signal.SIGHUP, signal.SIGINT)}
+    yield
+    for signum, handler in saved.items():
+        signal.signal(signum, handler)
+
+
+def command_policy(command="true", **fields):
+    return ReleasePolicy.from_config(dict({"enabled": True, "action": "command", "command": command}, **fields))
+
+
+def test_release_command_success():
+    result = execute_release(command_policy(), [sys.executable, "-c", "print('job 42 cancelled')"])
+    assert result == {"status": "released", "detail": "job 42 cancelled"}
+
+
+def test_release_command_nonzero_exit():
+    result = execute_release(command_policy(), [sys.executable, "-c", "import sys; print('denied'); sys.exit(3)"])
+    assert result["status"] == "failed"
+    assert result["detail"] == "退出码 3: denied"
+
+
+def test_release_command_timeout():
+    result = execute_release(command_policy(), [sys.executable, "-c", "import time; time.sleep(10)"], timeout=0.5)
+    assert result["status"] == "failed"
+    assert "timed out" in result["detail"]
+
+
+def test_release_runs_after_durable_marker_write(tmp_path, monkeypatch):
+    work_dir = tmp_path / "run"
+    work_dir.mkdir()
+    (work_dir / "job.py").write_text("print('step 1')\n")
+    copy = tmp_path / "marker_seen_by_release.json"
+    stub = tmp_path / "release.py"
+    stub.write_text("import shutil, sys\nshutil.copy(sys.argv[1], sys.argv[2])\n")
+
+    # 记录标记文件的 fsync 与释放命令执行的先后顺序
+    order = []
+    real_fsync, real_execute = os.fsync, train_wrapper.execute_release
+
+    def fsync(fd):
+        order.append(("fsync", os.readlink(f"/proc/self/fd/{fd}")))
+        return real_fsync(fd)
+
+    def execute(policy, argv, *args, **kwargs):
+        order.append(("release", argv))
+        return real_execute(policy, argv, *args, **kwargs)
+
+    monkeypatch.setattr(os, "fsync", fsync)
+    monkeypatch.setattr(train_wrapper, "execute_release", execute)
+    config = {
+        "train": {"on_complete": {"enabled": True, "action": "command", "delay": 0, "abort_file": "",
+                                  "command": f"{sys.executable} {stub} {{marker}} {copy}"}},
+        "monitor": {"node_probe": False},
+    }
+    assert train_wrapper.run_training(str(work_dir), f"{sys.executable} job.py", "logs", config=config) == 0
+
+    marker_path = str(work_dir / ".train_complete.json")
+    synced = [index for index, (kind, path) in enumerate(order) if kind == "fsync" and path.startswith(marker_path)]
+    released = [index for index, (kind, _) in enumerate(order) if kind == "release"]
+    assert synced and released and max(synced) < released[0]
+
+    # 释放命令执行时标记已经完整落盘，且带有释放计划
+    seen = json.loads(copy.read_text())
+    assert seen["return_code"] == 0
+    assert seen["release"]["status"] == "pending"
+    final = json.loads((work_dir / ".train_complete.json").read_text())
+    assert final["release"]["status"] == "pending"
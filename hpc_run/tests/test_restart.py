@@ -0,0 +1,28 @@
+"""瞬时故障重启测试"""
+import os
+import shlex
+
+from src.core.restart import RestartPolicy
+
+
+def test_resume_command_keeps_quoted_arguments(tmp_path):
+    checkpoint_dir = tmp_path / "my checkpoints"
+    checkpoint_dir.mkdir()
+    old, new = checkpoint_dir / "step 100.pt", checkpoint_dir / "step 200.pt"
+    old.write_bytes(b"0")
+    new.write_bytes(b"0")
+    os.utime(old, (1, 1))
+
+    policy = RestartPolicy.from_config({"enabled": True, "resume_args": "--resume {checkpoint}",
+                                        "checkpoint_glob": "my checkpoints/*.pt"})
+    base = shlex.split('python train.py --name "a b"')
+    parts, checkpoint = policy.resume_command(base, str(tmp_path))
+    assert checkpoint == str(new)
+    assert parts == ["python", "train.py", "--name", "a b", "--resume", str(new)]
+
+
+def test_resume_command_without_checkpoint_keeps_command(tmp_path):
+    policy = RestartPolicy.from_config({"enabled": True, "resume_args": "--resume {checkpoint}",
+                                        "checkpoint_glob": "*.pt"})
+    parts, checkpoint = policy.resume_command(["python", "train.py"], str(tmp_path))
+    assert parts == ["python", "train.py"] and checkpoint is None
@@ -0,0 +1,35 @@
+"""共享采样测试"""
+import os
+
+from src.core.monitor import SystemMonitor
+from src.core.sampler import sharing_key
+
+
+class NoSample:
+    """共享采样暂时没有数据"""
+    def latest(self):
+        return None
+
+
+def test_sharing_key_uses_slurm_job(tmp_path):
+    cgroup = tmp_path / "cgroup"
+    cgroup.write_text("0::/system.slice/slurmstepd.scope/job_7/step_0\n")
+    assert sharing_key({"SLURM_JOB_ID": "7"}, str(cgroup)) == "job7"
+    assert sharing_key({"SLURM_JOB_ID": "8"}, str(cgroup)) != sharing_key({"SLURM_JOB_ID": "7"}, str(cgroup))
+
+
+def test_sharing_key_falls_back_to_cgroup(tmp_path):
+    first, second = tmp_path / "a", tmp_path / "b"
+    first.write_text("0::/user.slice/job_1\n")
+    second.write_text("0::/user.slice/job_2\n")
+    assert sharing_key({}, str(first)).startswith("cg")
+    assert sharing_key({}, str(first)) != sharing_key({}, str(second))
+    assert sharing_key({}, str(tmp_path / "missing")) == ""
+
+
+def test_nvidia_smi_fallback_respects_min_interval(fake_nvidia_smi):
+    calls = fake_nvidia_smi(["50, 100.0"])
+    monitor = SystemMonitor(os.getpid(), device_source=NoSample(), accounting="psutil", gpu_min_interval=60)
+    for _ in range(3):
+        assert monitor.sample_gpu() == 50.0
+    assert calls.read_text().count("call") == 1
@@ -0,0 +1,23 @@
+"""自适应采样计划测试"""
+from src.core.monitor import AdaptiveSchedule
+
+
+def test_fixed_interval_by_default():
+    # 只设置了 monitor.interval 的配置保持原有的固定采样间隔
+    schedule = AdaptiveSchedule.from_config({}, 10.0)
+    schedule.start(0.0)
+    assert not schedule.enabled
+    assert [schedule.next_interval(t) for t in (1.0, 200.0, 400.0)] == [10.0, 10.0, 10.0]
+    schedule.trigger("signal", 400.0)
+    assert schedule.next_interval(401.0) == 10.0
+    assert schedule.triggers == {"signal": 1}
+
+
+def test_adaptive_when_enabled():
+    schedule = AdaptiveSchedule.from_config({"adaptive": True, "min_interval": 1, "max_interval": 8,
+                                             "startup": 10, "burst": 5, "factor": 2}, 10.0)
+    schedule.start(0.0)
+    assert schedule.next_interval(5.0) == 1.0
+    assert [schedule.next_interval(t) for t in (20.0, 30.0, 40.0, 50.0)] == [2.0, 4.0, 8.0, 8.0]
+    schedule.trigger("stall", 60.0)
+    assert schedule.next_interval(61.0) == 1.0
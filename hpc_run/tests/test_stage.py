@@ -0,0 +1,70 @@
+"""数据集预拷贝测试（源路径和本地目录包含空格）"""
+import shlex
+import subprocess
+import sys
+
+import train_wrapper
+from src.core.stage import StageSpec, rewrite_argument, rewrite_command, stage_paths
+
+
+def make_dataset(root):
+    """创建一个包含子目录的小数据集"""
+    (root / "train").mkdir(parents=True)
+    (root / "train/a.txt").write_text("a" * 100)
+    (root / "train/b.txt").write_text("b" * 50)
+    (root / "labels.csv").write_text("x,y\n")
+    return root
+
+
+def test_rewrite_argument_matches_whole_prefix():
+    assert rewrite_argument("/data/set", "/data/set", "/tmp/x") == "/tmp/x"
+    assert rewrite_argument("--data=/data/set/train", "/data/set", "/tmp/x") == "--data=/tmp/x/train"
+    assert rewrite_argument("/data/set,/data/set2", "/data/set", "/tmp/x") == "/tmp/x,/data/set2"
+    assert rewrite_argument("/data/setx", "/data/set", "/tmp/x") == "/data/setx"
+
+
+def test_rewrite_keeps_spaces_in_one_argument(tmp_path):
+    source = make_dataset(tmp_path / "shared data")
+    spec = StageSpec(source=str(source), name="my set", env="DATA_DIR")
+    results = stage_paths([spec], tmp_path / "local scratch")
+    assert results[0].error is None and results[0].files == 3
+
+    parts = shlex.split(f"python train.py --data={shlex.quote(str(source))} {shlex.quote(str(source / 'labels.csv'))}")
+    parts, env = rewrite_command(parts, results, [spec])
+    local = str(tmp_path / "local scratch" / "my set")
+    assert parts == ["python", "train.py", f"--data={local}", f"{local}/labels.csv"]
+    assert env == {"DATA_DIR": local}
+    # 引用后的命令重新拆分得到相同的参数
+    assert shlex.split(shlex.join(parts)) == parts
+
+
+def test_restage_skips_unchanged_files(tmp_path):
+    source = make_dataset(tmp_path / "src")
+    spec = StageSpec(source=str(source))
+    first = stage_paths([spec], tmp_path / "scratch")[0]
+    assert first.copied_files == 3 and first.copied_bytes == 154
+
+    (source / "train/b.txt").write_text("changed")
+    second = stage_paths([spec], tmp_path / "scratch")[0]
+    assert (second.copied_files, second.skipped_files) == (1, 2)
+    assert (tmp_path / "scratch/src/train/b.txt").read_text() == "changed"
+
+
+def test_stage_datasets_runs_rewritten_command(tmp_path, capsys):
+    source = make_dataset(tmp_path / "shared data")
+    events = []
+    config = {"enabled": True, "dir": str(tmp_path / "local scratch"), "paths": [str(source)]}
+    command_parts = [sys.executable, "-c", "import os, sys; print(sorted(os.listdir(sys.argv[1])))", str(source)]
+    parts, _, summary = train_wrapper.stage_datasets(config, command_parts,
+                                                     None, lambda kind, **fields: events.append(kind))
+
+    local = str(tmp_path / "local scratch" / "shared data")
+    assert parts[-1] == local
+    assert summary["command"] == shlex.join(parts)
+    assert events == ["stage"]
+    out = capsys.readouterr().out
+    assert f"改写后的命令: {shlex.join(parts)}" in out
+    assert f"-> {shlex.quote(local)}" in out
+    # 记录的命令可以原样在 shell 中执行
+    result = subprocess.run(summary["command"], shell=True, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "['.hpc_run_stage_manifest', 'labels.csv', 'train']"
@@ -0,0 +1,62 @@
+"""步时统计测试"""
+import pytest
+
+from src.core.steptime import StepTimer
+
+
+def test_steps_follow_step_numbers_after_resume():
+    timer = StepTimer(warmup_steps=2, baseline_steps=100)
+    for i, step in enumerate(range(5001, 5011)):
+        timer.observe(f"step {step}/6000 loss=0.1\n", float(i))
+    assert timer.steps == 5010
+    assert timer.observed_steps == 10
+    assert timer.total_steps == 6000
+    # 第一步只作为起点，预热按本次运行观测到的步数计算：10 步中跳过前 2 步，记录 8 个间隔
+    assert timer.histogram.total == 8
+
+
+def test_steps_without_numbers_count_lines():
+    timer = StepTimer(pattern=r"iter done", warmup_steps=0)
+    for i in range(5):
+        timer.observe("iter done\n", float(i))
+    assert timer.steps == 5
+    assert timer.histogram.total == 4
+
+
+def test_lines_from_one_read_do_not_record_zero_intervals():
+    timer = StepTimer(warmup_steps=0)
+    timer.observe("step 1\n", 0.0)
+    # 同一批输出中的三步共用一个到达时间
+    for step in (2, 3, 4):
+        timer.observe(f"step {step}\n", 3.0)
+    assert timer.steps == 4
+    timer.observe("step 5\n", 4.0)
+    assert timer.steps == 5
+    # 第 5 步的 1 秒平摊到上一次记录之后的 3、4、5 三步
+    assert timer.histogram.total == 2
+    assert timer.histogram.sum == pytest.approx(3.0 + 1.0 / 3)
+
+
+@pytest.mark.parametrize("numbered", [True, False])
+def test_batched_output_keeps_step_time(numbered):
+    # 每步 0.01 秒，输出缓冲后每 0.1 秒一次到达 10 行（不带步号时每行算一步）
+    timer = StepTimer(warmup_steps=0) if numbered else StepTimer(pattern=r"^step$", warmup_steps=0)
+    for batch in range(1, 51):
+        for i in range(10):
+            step = (batch - 1) * 10 + i + 1
+            timer.observe(f"step {step}\n" if numbered else "step\n", batch * 0.1)
+    summary = timer.summary()
+    assert summary["p50"] == pytest.approx(0.01, rel=0.05)
+    assert summary["mean"] == pytest.approx(0.01, rel=0.05)
+    assert timer.steps == 500
+
+
+def test_last_step_after_resume():
+    timer = StepTimer()
+    assert timer.last_step is None
+    # 从 step 9900 的检查点恢复：本次运行只经过 51 步，但已处于最后 1%
+    timer.observe("step 9900/10000\n", 0.0)
+    timer.observe("step 9950/10000\n", 5.0)
+    assert timer.last_step == 9950
+    assert timer.observed_steps == 51
+    assert timer.last_step >= 0.99 * timer.total_steps
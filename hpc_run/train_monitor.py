@@ -4,22 +4,36 @@ HPC 训练监控器 - 在登录节点运行
 轮询检测训练完成标记文件，发现完成后发送通知
 
 使用方式: python train_monitor.py
+         python train_monitor.py follow    # 实时跟踪训练日志
 配置文件: config/config.yaml
 """
 import os
+import re
 import sys
 import json
 import time
+import codecs
+import argparse
 from pathlib import Path
 from datetime import datetime
+from typing import Optional, Tuple
 
 # 添加项目路径以导入 src 模块
 sys.path.insert(0, str(Path(__file__).parent))
 
 from src.utils.config_loader import ConfigLoader
 from src.core.reporter import ReportGenerator
-from src.notifier.console import ConsoleNotifier
-from src.notifier.xxtui import XxtuiNotifier
+from src.core.history import RunHistory, command_fingerprint
+from src.core.logstore import read_log_tail
+from src.core.errindex import read_error_context
+from src.core.events import read_events
+from src.core.ranks import collect_rank_markers, aggregate_rank_markers
+from src.core.digest import ProgressDigest, build_rate_limits
+from src.core.follow import LogFollower, tail_offset, load_follow_state, save_follow_state
+from src.core.consumers import DEFAULT_METRIC_PATTERN
+from src.core.metrics import MetricsServer, MonitorMetrics
+from src.utils.terminal import ProgressLineFilter
+from src.notifier.base import MultiNotifier, build_notifiers
 
 
 def check_marker_file(work_dir: Path, marker_file: str) -> dict:
@@ -47,44 +61,243 @@ def check_marker_file(work_dir: Path, marker_file: str) -> dict:
         return None
 
 
-def send_notification(notifier_config: dict, report: str):
+def send_notification(notifier: MultiNotifier, report: str, wait: bool = True):
     """
-    发送通知
+    发送通知（并发发送到所有配置的通道）
     
     Args:
-        notifier_config: 通知器配置
+        notifier: 多通道通知器
         report: 报告内容
+        wait: 是否等待发送结果（最长为各通道的超时时间）；训练进行中的提醒不等待，避免拖慢监控循环
     """
-    notifier_type = notifier_config.get('type', 'console').lower()
-    
-    if notifier_type == 'console':
-        notifier = ConsoleNotifier()
-    elif notifier_type == 'xxtui':
-        xxtui_config = notifier_config.get('xxtui', {})
-        # 优先从配置读取，其次从环境变量
-        api_key = xxtui_config.get('api_key') or os.getenv('XXTUI_KEY')
-        if not api_key:
-            print("[错误] 未配置 xxtui API 密钥")
-            return
-        
-        timeout = xxtui_config.get('timeout', 8)
-        notifier = XxtuiNotifier(api_key=api_key, timeout=timeout)
-    else:
-        print(f"[错误] 未知的通知器类型: {notifier_type}")
+    if not notifier.channels:
+        print("[错误] 没有可用的通知通道")
+        return
+    
+    if not wait:
+        notifier.send_all(report, wait_for_results=False)
+        print(f"[监控器] 通知已提交 (通道: {', '.join(notifier.channels)})")
         return
     
-    # 发送通知
-    title = "训练完成通知"
     try:
         notifier.send_markdown(report)
-        print(f"[监控器] 通知已发送 (类型: {notifier_type})")
+        print(f"[监控器] 通知已发送 (通道: {', '.join(notifier.channels)})")
     except Exception as e:
         print(f"[错误] 发送通知失败: {e}")
 
 
+def open_history(history_config: dict):
+    """
+    按配置打开运行历史数据库
+    
+    Args:
+        history_config: 配置中的 monitor.history 段
+        
+    Returns:
+        RunHistory 实例，未启用或打开失败时返回 None
+    """
+    if not history_config.get('enabled', True):
+        return None
+    
+    db_path = history_config.get('path', '~/.hpc_run/history.db')
+    try:
+        return RunHistory(db_path)
+    except Exception as e:
+        print(f"[警告] 打开运行历史数据库失败: {e}")
+        return None
+
+
+def plan_next_check(start_timestamp: float, expected: float, interval: int, max_interval: int) -> float:
+    """
+    根据预计完成时间计算下一次检查前的等待时间
+    
+    距离预计完成时间越远，等待越久（取剩余时间的一半，不超过 max_interval），
+    接近预计完成时间后退回到固定的检查间隔。
+    
+    Args:
+        start_timestamp: 训练开始时间戳
+        expected: 历史运行时长中位数（秒）
+        interval: 基础检查间隔（秒）
+        max_interval: 最长等待时间（秒）
+        
+    Returns:
+        等待时间（秒）
+    """
+    remaining = start_timestamp + expected - time.time()
+    if remaining <= interval:
+        return interval
+    return min(max(interval, remaining / 2), max(interval, max_interval))
+
+
+def job_labels(work_dir: Path, info: dict) -> dict:
+    """
+    作业的指标标签（与包装器写入的指标文件一致）
+    
+    Args:
+        work_dir: 工作目录
+        info: 运行状态文件或完成标记的内容
+        
+    Returns:
+        run、job_id、rank 标签
+    """
+    return {"run": Path(work_dir).name, "job_id": info.get('job_id') or "", "rank": info.get('rank', 0)}
+
+
+def alert_settings(notifier_config: dict) -> dict:
+    """
+    各类事件是否立即发送提醒
+    
+    Args:
+        notifier_config: 配置中的 notification 段
+        
+    Returns:
+        事件类型 -> 是否发送
+    """
+    return {
+        "slowdown": bool(notifier_config.get('on_slowdown', False)),
+        "memory_warning": bool(notifier_config.get('on_memory_warning', True)),
+        "checkpoint_slow": bool(notifier_config.get('on_checkpoint_slow', True)),
+    }
+
+
+def report_new_events(events_file: str, offset: int, notifier: Optional[MultiNotifier] = None,
+                      digest: Optional[ProgressDigest] = None, label: str = '',
+                      metrics: Optional[MonitorMetrics] = None, labels: Optional[dict] = None,
+                      alerts: Optional[dict] = None) -> int:
+    """
+    增量读取包装器事件流并打印值得关注的事件
+    
+    Args:
+        events_file: 事件文件路径
+        offset: 上次读取结束的字节偏移量
+        notifier: 通知器（传入时按 alerts 对降速、内存预警等事件立即发送提醒）
+        digest: 进度摘要（传入时把新事件汇总进去）
+        label: 事件来源名称（用于进度摘要）
+        metrics: 监控指标（传入时用 stats、spawn、restart 事件更新作业指标）
+        labels: 该作业的指标标签
+        alerts: 事件类型 -> 是否发送提醒（alert_settings 的返回值，默认都不发送）
+        
+    Returns:
+        新的字节偏移量
+    """
+    alerts = alerts or {}
+    try:
+        new_events, offset = read_events(events_file, offset)
+    except OSError as e:
+        print(f"[警告] 读取事件文件失败: {e}")
+        return offset
+    
+    if digest is not None:
+        digest.ingest(label, new_events)
+    
+    last_stats = None
+    for event in new_events:
+        if metrics is not None and event.get('type') in ('spawn', 'restart'):
+            metrics.update_job(labels, {"attempt": event.get('attempt')},
+                               "running" if event['type'] == 'spawn' else "restarting")
+        if event.get('type') == 'stats':
+            last_stats = event
+        elif event.get('type') == 'signal':
+            print(f"[监控器] 训练包装器收到信号: {event.get('signal')}")
+        elif event.get('type') == 'restart':
+            print(f"[监控器] 训练失败，包装器将在 {event.get('delay_seconds', 0):.0f}s 后"
+                  f"第 {event.get('attempt')} 次运行: {event.get('reason')}")
+        elif event.get('type') == 'slowdown':
+            message = (f"## 训练降速提醒\n\n"
+                       f"**step:** {event.get('step')}  \n"
+                       f"**当前步时:** {event.get('step_time')}s  \n"
+                       f"**基线步时:** {event.get('baseline')}s")
+            print(f"[监控器] 检测到训练降速: 步时 {event.get('step_time')}s，基线 {event.get('baseline')}s")
+            if notifier and alerts.get('slowdown'):
+                send_notification(notifier, message, wait=False)
+        elif event.get('type') == 'checkpoint':
+            print(f"[监控器] 检查点 {event.get('name')}: {event.get('size_bytes', 0) / 1024 / 1024:.1f} MB，"
+                  f"耗时 {event.get('duration')}s")
+        elif event.get('type') == 'checkpoint_slow':
+            message = ReportGenerator().generate_checkpoint_slow_markdown(event)
+            print(f"[监控器] 检查点写入变慢: {event.get('bandwidth_mbps')} MB/s，基线 {event.get('baseline_mbps')} MB/s")
+            if notifier and alerts.get('checkpoint_slow'):
+                send_notification(notifier, message, wait=False)
+        elif event.get('type') == 'memory_warning':
+            message = ReportGenerator().generate_memory_warning_markdown(event)
+            print(f"[监控器] 内存预警: {event.get('used_mb')} MB / {event.get('limit_mb')} MB")
+            if notifier and alerts.get('memory_warning'):
+                send_notification(notifier, message, wait=False)
+    
+    if last_stats and metrics is not None:
+        metrics.update_job(labels, last_stats)
+    if last_stats:
+        print(f"[监控器] 已输出 {last_stats.get('lines')} 行，"
+              f"最近 {last_stats.get('idle_seconds', 0):.0f}s 无新输出")
+    return offset
+
+
+def wait_for_release(events_file: str, offset: int, release: dict, interval: float = 5.0,
+                     grace: float = 60.0) -> dict:
+    """
+    等待包装器写入 release 事件（包装器在安全延迟后才释放资源，完成标记中只有释放计划）
+    
+    Args:
+        events_file: 事件文件路径
+        offset: 开始读取的字节偏移量
+        release: 完成标记中的 release 字段
+        interval: 读取间隔（秒）
+        grace: 超过计划释放时间后继续等待的时长（秒）
+        
+    Returns:
+        合并了 release 事件的释放信息；超时时返回原释放计划
+    """
+    deadline = (release.get('planned_at') or time.time()) + grace
+    print(f"[监控器] 等待包装器释放计算资源（最长 {max(0, deadline - time.time()):.0f}s）...")
+    while True:
+        try:
+            new_events, offset = read_events(events_file, offset)
+        except OSError as e:
+            print(f"[警告] 读取事件文件失败: {e}")
+            return release
+        for event in new_events:
+            # 同一秒启动的运行共用事件文件名，按计划释放时间确认是本次运行的事件
+            if event.get('type') == 'release' and event.get('planned_at') == release.get('planned_at'):
+                return {key: value for key, value in event.items()
+                        if key not in ('v', 'seq', 'type', 'wall', 'mono')}
+        if time.time() >= deadline:
+            print("[警告] 未等到包装器的释放结果")
+            return release
+        time.sleep(interval)
+
+
+def send_progress_digest(notifier: MultiNotifier, digest: ProgressDigest, buckets: dict,
+                         elapsed: Optional[float] = None):
+    """
+    发送进度摘要（只发送到令牌桶允许的通道，不等待结果）
+    
+    Args:
+        notifier: 多通道通知器
+        digest: 进度摘要
+        buckets: 通道名称 -> 令牌桶
+        elapsed: 已运行时长（秒，可选）
+    """
+    if not digest.has_updates:
+        return
+    allowed = [name for name in notifier.channels if name not in buckets or buckets[name].take()]
+    if not allowed:
+        print("[监控器] 进度摘要已被限流，跳过本次发送")
+        return
+    message = ReportGenerator().generate_progress_markdown(digest.entries(), elapsed)
+    notifier.send_all(message, wait_for_results=False, only=allowed)
+    print(f"[监控器] 进度摘要已提交 (通道: {', '.join(allowed)})")
+
+
 def monitor_training(work_dir: Path, notifier_config: dict, 
                      marker_file: str = '.train_complete.json',
-                     interval: int = 60):
+                     interval: int = 60,
+                     state_file: str = '.train_running.json',
+                     history: Optional[RunHistory] = None,
+                     history_window: int = 20,
+                     slow_factor: float = 1.5,
+                     max_interval: int = 600,
+                     metrics: Optional[MonitorMetrics] = None,
+                     rank_timeout: float = 1800):
     """
     监控训练任务
     
@@ -93,6 +306,13 @@ def monitor_training(work_dir: Path, notifier_config: dict,
         notifier_config: 通知器配置
         marker_file: 标记文件名
         interval: 检查间隔（秒）
+        state_file: 运行状态文件名
+        history: 运行历史存储（可选，用于预估完成时间和识别慢运行）
+        history_window: 参与统计的最近运行次数
+        slow_factor: 运行时长超过历史中位数的倍数时视为慢运行
+        max_interval: 根据预计完成时间放宽后的最长检查间隔（秒）
+        metrics: 监控指标（可选，由 HTTP /metrics 提供）
+        rank_timeout: 多节点作业第一个 rank 结束后等待其余 rank 的最长时间（秒），0 表示一直等待
     """
     work_dir = Path(work_dir).resolve()
     
@@ -101,16 +321,39 @@ def monitor_training(work_dir: Path, notifier_config: dict,
     print(f"[监控器] 检查间隔: {interval}秒")
     print("-" * 60)
     
+    notifier = build_notifiers(notifier_config)
+    print(f"[监控器] 通知通道: {', '.join(notifier.channels) or '无'}")
+    
     check_count = 0
+    slow_warned = False
+    events_offsets = {}
+    alerts = alert_settings(notifier_config)
+    
+    # 周期性进度摘要（默认关闭）
+    progress_config = notifier_config.get('progress') or {}
+    digest = ProgressDigest() if progress_config.get('enabled', False) else None
+    digest_interval = float(progress_config.get('interval', 3600))
+    buckets = build_rate_limits(notifier_config, notifier.channels) if digest else {}
+    next_digest = time.monotonic() + digest_interval
     
     while True:
         check_count += 1
+        poll_started = time.monotonic()
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         print(f"[监控器] 第 {check_count} 次检查 ({current_time})")
         
-        # 检查标记文件
+        # 检查标记文件（多节点作业等待所有 rank 结束或任一 rank 失败）
         completion_info = check_marker_file(work_dir, marker_file)
+        rank_markers = []
+        if not completion_info:
+            rank_markers = collect_rank_markers(work_dir, marker_file)
+            completion_info = aggregate_rank_markers(rank_markers, rank_timeout)
+            if rank_markers and not completion_info:
+                print(f"[监控器] 已结束 rank: {len(rank_markers)}/{rank_markers[0].get('world_size')}")
+            elif completion_info and completion_info.get('status') == 'incomplete':
+                print(f"[监控器] 等待超过 {rank_timeout:.0f}s，rank "
+                      f"{', '.join(str(rank) for rank in completion_info['missing_ranks'])} 仍未结束")
         
         if completion_info:
             print(f"[监控器] 检测到训练完成！")
@@ -119,17 +362,40 @@ def monitor_training(work_dir: Path, notifier_config: dict,
             print(f"[监控器] 运行时长: {completion_info.get('elapsed_seconds')}s")
             print(f"[监控器] 退出码: {completion_info.get('return_code')}")
             
-            # 读取日志文件最后几行
+            # 读取日志文件最后几行（压缩日志只解压最后几帧）
             log_file = completion_info.get('log_file')
             last_lines = []
             if log_file and Path(log_file).exists():
                 try:
-                    with open(log_file, 'r', encoding='utf-8') as f:
-                        lines = f.readlines()
-                        last_lines = lines[-50:]  # 取最后 50 行
+                    last_lines = read_log_tail(log_file, 50)  # 取最后 50 行
                 except Exception as e:
                     print(f"[警告] 读取日志文件失败: {e}")
             
+            # 失败时按错误索引直接定位第一个和最后一个错误（不扫描整个日志）
+            error_contexts = []
+            error_index = completion_info.get('error_index') or {}
+            if completion_info.get('return_code') != 0 and error_index.get('first_error') and last_lines:
+                first, last = error_index['first_error'], error_index.get('last_error')
+                for title, entry in (("第一个错误", first), ("最后一个错误", last)):
+                    if not entry or (title == "最后一个错误" and entry['offset'] == first['offset']):
+                        continue
+                    try:
+                        error_contexts.append((title, entry, read_error_context(log_file, entry['offset'], 5, 25)))
+                    except Exception as e:
+                        print(f"[警告] 读取错误上下文失败: {e}")
+            
+            # 包装器配置了自动释放时，等待释放结果一并写入报告
+            release = completion_info.get('release')
+            events_file = completion_info.get('events_file')
+            if metrics is not None:
+                for item in rank_markers or [completion_info]:
+                    metrics.update_job(job_labels(work_dir, item), item,
+                                       "completed" if item.get('return_code') == 0 else "failed")
+            if release and release.get('status') == 'pending' and events_file and Path(events_file).exists():
+                if metrics is not None:
+                    metrics.update_job(job_labels(work_dir, completion_info), phase="releasing")
+                release = wait_for_release(events_file, events_offsets.get(events_file, 0), release)
+            
             # 生成报告
             process_info = {
                 "pid": "N/A",  # HPC 模式下没有本地 PID
@@ -144,6 +410,43 @@ def monitor_training(work_dir: Path, notifier_config: dict,
             generator = ReportGenerator()
             report = generator.generate_markdown(process_info)
             
+            if completion_info.get('ranks'):
+                report += generator.generate_ranks_markdown(completion_info)
+            elif completion_info.get('resources'):
+                report += generator.generate_resources_markdown(completion_info['resources'])
+            
+            if completion_info.get('memory'):
+                report += generator.generate_memory_markdown(completion_info['memory'])
+            
+            if completion_info.get('node_probe'):
+                report += generator.generate_node_markdown(completion_info['node_probe'])
+            
+            if completion_info.get('restarts'):
+                report += generator.generate_restarts_markdown(completion_info['restarts'])
+            
+            if completion_info.get('stage'):
+                report += generator.generate_stage_markdown(completion_info['stage'])
+            
+            if completion_info.get('checkpoint_io'):
+                report += generator.generate_checkpoint_markdown(completion_info['checkpoint_io'])
+            
+            if completion_info.get('step_times'):
+                report += generator.generate_step_markdown(completion_info['step_times'])
+            
+            if release:
+                report += generator.generate_release_markdown(release)
+            
+            # 与历史运行时长对比（在记录本次运行之前查询）
+            if history:
+                fingerprint = command_fingerprint(completion_info.get('command', ''))
+                runtimes = history.recent_runtimes(fingerprint, history_window)
+                if runtimes:
+                    report += generator.generate_history_markdown(
+                        completion_info.get('elapsed_seconds'), runtimes, slow_factor)
+            
+            if error_contexts:
+                report += generator.generate_errors_markdown(error_index, error_contexts)
+            
             # 如果有日志，追加最后几行
             if last_lines:
                 report += "\n\n### 日志摘要（最后 50 行）\n\n```\n"
@@ -155,24 +458,226 @@ def monitor_training(work_dir: Path, notifier_config: dict,
             print("=" * 60 + "\n")
             
             # 发送通知
-            send_notification(notifier_config, report)
+            send_notification(notifier, report)
+            if metrics is not None:
+                metrics.sync_latencies(notifier.latencies)
+                metrics.observe_poll(time.monotonic() - poll_started)
+            
+            # 记录运行历史
+            if history:
+                try:
+                    history.record(completion_info)
+                    print(f"[监控器] 已记录运行历史: {history.db_path}")
+                except Exception as e:
+                    print(f"[警告] 记录运行历史失败: {e}")
             
             # 清理标记文件
-            marker_path = work_dir / marker_file
-            try:
-                marker_path.unlink()
-                print(f"[监控器] 已删除标记文件: {marker_path}")
-            except Exception as e:
-                print(f"[警告] 删除标记文件失败: {e}")
+            marker_paths = [Path(item['marker_path']) for item in rank_markers] or [work_dir / marker_file]
+            for marker_path in marker_paths:
+                try:
+                    marker_path.unlink()
+                    print(f"[监控器] 已删除标记文件: {marker_path}")
+                except Exception as e:
+                    print(f"[警告] 删除标记文件失败: {e}")
             
             print(f"[监控器] 监控完成")
+            notifier.close()
             break
         
-        else:
-            print(f"[监控器] 训练尚未完成，等待 {interval} 秒...")
+        wait_seconds = interval
+        state = check_marker_file(work_dir, state_file)
+        sources = [(work_dir.name, state)] if state else []
+        if state is None:
+            # 多节点作业以 rank 0 的状态为准；进度摘要需要读取所有 rank 的事件
+            rank_states = collect_rank_markers(work_dir, state_file)
+            state = rank_states[0] if rank_states else None
+            # 指标需要所有 rank 的状态
+            read_all = digest is not None or metrics is not None
+            sources = [(f"rank {item.get('rank')}", item) for item in rank_states[:None if read_all else 1]]
+        for label, source in sources:
+            labels = job_labels(work_dir, source)
+            events_file = source.get('events_file')
+            if metrics is not None:
+                # 有事件流时阶段由 spawn / restart 事件决定
+                metrics.update_job(labels, source, None if events_file else "running")
+            if events_file and Path(events_file).exists():
+                events_offsets[events_file] = report_new_events(
+                    events_file, events_offsets.get(events_file, 0),
+                    notifier, digest, label, metrics, labels, alerts)
+        
+        if digest and time.monotonic() >= next_digest:
+            running = time.time() - state['start_timestamp'] if state and state.get('start_timestamp') else None
+            send_progress_digest(notifier, digest, buckets, running)
+            next_digest = time.monotonic() + digest_interval
+        
+        if history and state and state.get('start_timestamp'):
+            fingerprint = command_fingerprint(state.get('command', ''))
+            expected = history.median_runtime(fingerprint, history_window)
+            if expected:
+                running = time.time() - state['start_timestamp']
+                eta = datetime.fromtimestamp(state['start_timestamp'] + expected)
+                print(f"[监控器] 已运行 {running:.0f}s，历史中位数 {expected:.0f}s，"
+                      f"预计完成时间 {eta.strftime('%Y-%m-%d %H:%M:%S')}")
+                if not slow_warned and running > expected * slow_factor:
+                    print(f"[警告] 本次运行已超过历史中位数的 {slow_factor} 倍，可能存在性能问题")
+                    slow_warned = True
+                wait_seconds = plan_next_check(state['start_timestamp'], expected, interval, max_interval)
+        
+        if digest:
+            # 按预计完成时间放宽检查间隔时，不错过下一次进度摘要
+            wait_seconds = min(wait_seconds, max(interval, next_digest - time.monotonic()))
+        
+        if metrics is not None:
+            metrics.sync_latencies(notifier.latencies)
+            metrics.observe_poll(time.monotonic() - poll_started)
+        
+        print(f"[监控器] 训练尚未完成，等待 {wait_seconds:.0f} 秒...")
         
         # 等待下一次检查
-        time.sleep(interval)
+        time.sleep(wait_seconds)
+
+
+def find_active_log(work_dir: Path, state_file: str, marker_file: str, rank: int = 0) -> Tuple[Optional[str], bool]:
+    """
+    从包装器的运行状态文件（训练结束后为完成标记）中找到当前日志
+    
+    Args:
+        work_dir: 工作目录
+        state_file: 运行状态文件名
+        marker_file: 完成标记文件名
+        rank: 多节点作业中要跟踪的 rank
+        
+    Returns:
+        (日志文件路径, 是否仍在运行)；找不到时日志路径为 None
+    """
+    for name, running in ((state_file, True), (marker_file, False)):
+        info = check_marker_file(work_dir, name)
+        if info is None:
+            info = next((item for item in collect_rank_markers(work_dir, name) if item.get('rank') == rank), None)
+        if info and info.get('log_file'):
+            return info['log_file'], running
+    return None, False
+
+
+def follow_training(work_dir: Path, state_file: str = '.train_running.json',
+                    marker_file: str = '.train_complete.json', lines: int = 20, from_start: bool = False,
+                    metrics_only: bool = False, pattern: Optional[str] = None, collapse: bool = False,
+                    exit_on_complete: bool = True, rank: int = 0, min_interval: float = 0.2,
+                    max_interval: float = 1.0, check_interval: float = 10.0, out=None):
+    """
+    实时跟踪训练日志（类似 tail -f）
+    
+    按包装器的运行状态文件找到当前日志，从上次保存的进度（或最后几行）开始读取。有新数据时以 min_interval
+    轮询，空闲时轮询间隔逐步加倍到 max_interval；stat 文件名检查轮转/截断、重新读取状态文件检查是否
+    换了新日志都只在空闲时每 check_interval 秒做一次，读取已打开的文件不产生额外的元数据请求。
+    
+    Args:
+        work_dir: 工作目录
+        state_file: 运行状态文件名
+        marker_file: 完成标记文件名
+        lines: 没有保存的进度时先输出最后几行
+        from_start: 从日志开头读取
+        metrics_only: 只输出包含数值指标（如 loss=0.12）的行
+        pattern: 只输出匹配该正则的行
+        collapse: 折叠 \r 重绘的进度条，只输出每行的最终状态
+        exit_on_complete: 训练结束（出现完成标记）后读完剩余内容并退出
+        rank: 多节点作业中要跟踪的 rank
+        min_interval: 最短轮询间隔（秒）
+        max_interval: 最长轮询间隔（秒）
+        check_interval: 检查轮转和新日志的间隔（秒）
+        out: 输出流（默认 sys.stdout）
+    """
+    out = out or sys.stdout
+    work_dir = Path(work_dir).resolve()
+    regexes = []
+    if metrics_only:
+        regexes.append(re.compile(DEFAULT_METRIC_PATTERN))
+    if pattern:
+        regexes.append(re.compile(pattern))
+    line_mode = bool(regexes) or collapse
+    
+    log_file, _ = find_active_log(work_dir, state_file, marker_file, rank)
+    while log_file is None or not Path(log_file).exists():
+        print(f"[监控器] 等待训练开始（{work_dir / state_file}）...", file=sys.stderr)
+        time.sleep(check_interval)
+        log_file, _ = find_active_log(work_dir, state_file, marker_file, rank)
+    
+    def _open(path: str, offset: Optional[int] = None) -> LogFollower:
+        if offset is None:
+            saved = load_follow_state(work_dir)
+            inode = os.stat(path).st_ino
+            if not from_start and saved.get('log_file') == path and saved.get('inode') == inode:
+                offset = saved.get('offset', 0)
+            else:
+                offset = 0 if from_start else tail_offset(path, lines)
+        print(f"[监控器] 跟踪日志: {path}（偏移 {offset}）", file=sys.stderr)
+        return LogFollower(path, offset)
+    
+    def _new_filters():
+        return (codecs.getincrementaldecoder("utf-8")(errors="replace"),
+                ProgressLineFilter(collapse=collapse) if line_mode else None)
+    
+    def _emit(text: str, line_filter):
+        if line_filter is None:
+            out.write(text)
+        else:
+            for line in line_filter.feed(text):
+                if all(regex.search(line) for regex in regexes):
+                    out.write(line)
+        out.flush()
+    
+    follower = _open(log_file)
+    decoder, line_filter = _new_filters()
+    interval = min_interval
+    last_check = last_save = time.monotonic()
+    try:
+        while True:
+            data = follower.read_new()
+            if data:
+                _emit(decoder.decode(data), line_filter)
+                interval = min_interval
+                if time.monotonic() - last_save >= check_interval:
+                    save_follow_state(work_dir, follower)
+                    last_save = time.monotonic()
+                continue
+            
+            if time.monotonic() - last_check >= check_interval:
+                last_check = time.monotonic()
+                status = follower.check()
+                if status == "truncated":
+                    print(f"\n[监控器] 日志被截断，从头读取: {follower.path}", file=sys.stderr)
+                    follower.rewind()
+                    decoder, line_filter = _new_filters()
+                    continue
+                current, running = find_active_log(work_dir, state_file, marker_file, rank)
+                if status == "rotated" or (current and current != str(follower.path)):
+                    # 旧文件已经读完（上面的 read_new 返回空），切换到状态文件指向的日志或同名新文件
+                    next_log = current if current and current != str(follower.path) else str(follower.path)
+                    if Path(next_log).exists():
+                        print(f"\n[监控器] 日志已轮转或训练已重新开始", file=sys.stderr)
+                        follower.close()
+                        follower = _open(next_log, 0)
+                        decoder, line_filter = _new_filters()
+                        continue
+                # 包装器写完完成标记后删除运行状态文件（监控程序发送通知后还会删除完成标记）
+                if exit_on_complete and not running:
+                    _emit(decoder.decode(b"", final=True), line_filter)
+                    if line_filter is not None:
+                        for line in line_filter.flush():
+                            if all(regex.search(line) for regex in regexes):
+                                out.write(line)
+                        out.flush()
+                    save_follow_state(work_dir, follower)
+                    print(f"\n[监控器] 训练已结束", file=sys.stderr)
+                    return
+            
+            time.sleep(interval)
+            interval = min(interval * 2, max_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        save_follow_state(work_dir, follower)
+        follower.close()
 
 
 def main():
@@ -181,7 +686,19 @@ def main():
     project_root = Path(__file__).parent
     config_path = project_root / "config" / "config.yaml"
     
-    print(f"[监控器] 使用配置文件: {config_path}")
+    parser = argparse.ArgumentParser(description="HPC 训练监控器")
+    parser.add_argument("mode", nargs="?", choices=["monitor", "follow"], default="monitor",
+                        help="monitor: 等待训练完成并发送通知（默认）；follow: 实时跟踪训练日志")
+    parser.add_argument("-n", "--lines", type=int, default=20, help="follow: 先输出最后几行")
+    parser.add_argument("--from-start", action="store_true", help="follow: 从日志开头读取")
+    parser.add_argument("--metrics", action="store_true", help="follow: 只输出包含数值指标的行")
+    parser.add_argument("--grep", default=None, help="follow: 只输出匹配该正则的行")
+    parser.add_argument("--collapse", action="store_true", help="follow: 折叠进度条重绘")
+    parser.add_argument("--keep", action="store_true", help="follow: 训练结束后继续等待新的训练")
+    parser.add_argument("--rank", type=int, default=0, help="follow: 多节点作业中跟踪的 rank")
+    args = parser.parse_args()
+    
+    print(f"[监控器] 使用配置文件: {config_path}", file=sys.stderr if args.mode == "follow" else sys.stdout)
     
     # 加载配置
     loader = ConfigLoader(config_path)
@@ -193,19 +710,65 @@ def main():
     
     # 从配置文件读取参数
     work_dir = config['train']['work_dir']
+    
+    if args.mode == "follow":
+        follow_config = loader.get('monitor.follow', {}) or {}
+        follow_training(
+            work_dir=work_dir,
+            lines=args.lines,
+            from_start=args.from_start,
+            metrics_only=args.metrics,
+            pattern=args.grep,
+            collapse=args.collapse,
+            exit_on_complete=not args.keep,
+            rank=args.rank,
+            min_interval=float(follow_config.get('min_interval', 0.2)),
+            max_interval=float(follow_config.get('max_interval', 1)),
+            check_interval=float(follow_config.get('check_interval', 10)),
+        )
+        return 0
     notifier_config = config.get('notification', {})
     
+    history_config = loader.get('monitor.history', {}) or {}
+    history = open_history(history_config)
+    
     # 固定参数
     marker_file = '.train_complete.json'
     interval = 60  # 检查间隔 60 秒
     
+    # Prometheus 指标（HTTP /metrics，port 为 0 或未配置时不开启）
+    metrics_config = loader.get('monitor.metrics', {}) or {}
+    metrics, metrics_server = None, None
+    if metrics_config.get('port'):
+        metrics = MonitorMetrics()
+        try:
+            metrics_server = MetricsServer(metrics.registry, metrics_config.get('host', '127.0.0.1'),
+                                           int(metrics_config['port'])).start()
+            host, port = metrics_server.address
+            print(f"[监控器] 指标地址: http://{host}:{port}/metrics")
+        except OSError as e:
+            print(f"[警告] 指标服务启动失败: {e}")
+            metrics = None
+    
     # 开始监控
-    monitor_training(
-        work_dir=work_dir,
-        notifier_config=notifier_config,
-        marker_file=marker_file,
-        interval=interval
-    )
+    try:
+        monitor_training(
+            work_dir=work_dir,
+            notifier_config=notifier_config,
+            marker_file=marker_file,
+            interval=interval,
+            history=history,
+            history_window=int(history_config.get('window', 20)),
+            slow_factor=float(history_config.get('slow_factor', 1.5)),
+            max_interval=int(history_config.get('max_interval', 600)),
+            metrics=metrics,
+            rank_timeout=float(loader.get('monitor.rank_timeout', 1800) or 0),
+        )
+    finally:
+        if history:
+            history.close()
+        if metrics_server:
+            metrics_server.close()
     
     return 0
 
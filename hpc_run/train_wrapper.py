@@ -11,17 +11,663 @@ import sys
 import json
 import time
 import shutil
+import re
+import shlex
+import signal
+import socket
+import threading
 import subprocess
 from pathlib import Path
 from datetime import datetime
+from typing import Optional
 
 # 添加项目路径以导入 src 模块
 sys.path.insert(0, str(Path(__file__).parent))
 
 from src.utils.config_loader import ConfigLoader
+from src.core.logstore import FramedLogWriter, open_log_writer, read_log_tail, resolve_compression
+from src.core.events import EventWriter
+from src.core.steptime import StepTimer, DEFAULT_STEP_PATTERN
+from src.utils.terminal import ProgressLineFilter, read_output
+from src.core.ranks import detect_rank, rank_file_name
+from src.core.restart import Attempt, RestartPolicy, allocation_remaining
+from src.core.release import ReleasePolicy, release_argv, execute_release
 
 
-def run_training(work_dir: Path, command: str, log_dir: Path, marker_file: str = '.train_complete.json') -> int:
+def write_state_file(state_path: Path, info: dict, durable: bool = False):
+    """
+    原子写入状态文件（先写临时文件再重命名，避免监控程序读到半个 JSON）
+    
+    Args:
+        state_path: 状态文件路径
+        info: 状态信息
+        durable: 是否在返回前把文件内容和重命名同步到存储（之后即将释放计算节点时使用）
+    """
+    tmp_path = state_path.with_name(state_path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=2, ensure_ascii=False)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, state_path)
+    if durable:
+        dir_fd = os.open(state_path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def build_memory_watch(pid: int, monitor_config: dict):
+    """
+    按配置创建内存压力跟踪器
+    
+    Args:
+        pid: 训练进程 PID
+        monitor_config: 配置中的 monitor 段
+        
+    Returns:
+        MemoryWatch 实例，未启用时返回 None
+    """
+    memory_config = monitor_config.get('memory') or {}
+    if not memory_config.get('enabled', True):
+        return None
+    from src.core.memwatch import MemoryWatch
+    return MemoryWatch.for_process(
+        pid,
+        warn_seconds=float(memory_config.get('warn_seconds', 1800)),
+        warn_fraction=float(memory_config.get('warn_fraction', 0.9)),
+        window=float(memory_config.get('window', 300)),
+    )
+
+
+def open_error_index(log_file: Path, index_config: dict):
+    """
+    按配置创建日志错误索引
+    
+    Args:
+        log_file: 日志文件路径
+        index_config: 配置中的 train.log.error_index 段
+        
+    Returns:
+        ErrorIndexWriter 实例，未启用或正则无效时返回 None
+    """
+    if not index_config.get('enabled', True):
+        return None
+    from src.core.errindex import ErrorIndexWriter, ERROR_INDEX_SUFFIX
+    try:
+        return ErrorIndexWriter(
+            log_file.with_name(log_file.name + ERROR_INDEX_SUFFIX),
+            error_patterns=index_config.get('error_patterns'),
+            warning_patterns=index_config.get('warning_patterns'),
+            max_entries=int(index_config.get('max_entries', 1000)),
+        )
+    except re.error as e:
+        print(f"[训练包装器] error_index 正则无效，已禁用错误索引: {e}")
+        return None
+
+
+def stage_datasets(stage_config: dict, command_parts: list, child_env, emit):
+    """
+    按配置把数据集预拷贝到节点本地存储，并把命令参数和环境变量改写为指向本地副本
+    
+    Args:
+        stage_config: 配置中的 train.stage 段
+        command_parts: 命令参数列表
+        child_env: 训练进程的环境变量（None 表示继承当前环境）
+        emit: 事件写入函数
+        
+    Returns:
+        (命令参数列表, 环境变量, 预拷贝汇总)，未启用时汇总为 None；某个路径失败时该路径保持原样
+    """
+    if not stage_config.get('enabled', False) or not stage_config.get('paths'):
+        return command_parts, child_env, None
+    
+    from src.core.stage import StageSpec, rewrite_command, stage_paths, stage_root, summarize_stage
+    try:
+        specs = [StageSpec.from_config(item) for item in stage_config['paths']]
+    except ValueError as e:
+        print(f"[训练包装器] 预拷贝配置无效，使用原路径: {e}")
+        return command_parts, child_env, None
+    
+    root = stage_root(stage_config.get('dir'))
+    print(f"[训练包装器] 预拷贝 {len(specs)} 个路径到 {root}")
+    started = time.monotonic()
+    try:
+        results = stage_paths(specs, root, workers=int(stage_config.get('workers', 8)),
+                              block_size=int(float(stage_config.get('block_size_mb', 8)) * 1024 * 1024))
+    except OSError as e:
+        print(f"[训练包装器] 预拷贝失败，使用原路径: {e}")
+        return command_parts, child_env, {"dir": str(root), "error": str(e)}
+    summary = dict(summarize_stage(results, time.monotonic() - started), dir=str(root))
+    
+    for result in results:
+        if result.error:
+            print(f"[训练包装器] 预拷贝 {shlex.quote(result.source)} 失败，使用原路径: {result.error}")
+        else:
+            item = result.to_dict()
+            print(f"[训练包装器] 预拷贝 {shlex.quote(result.source)} -> {shlex.quote(result.local)}: "
+                  f"复制 {item['copied_mb']} MB（{result.copied_files} 个文件），"
+                  f"跳过 {item['skipped_mb']} MB，{item['seconds']}s")
+    
+    # 参数始终以列表传递；只在显示和记录时用 shlex.join 引用，包含空格的本地路径可以原样复制执行
+    staged_parts, env = rewrite_command(command_parts, results, specs)
+    if staged_parts != command_parts:
+        summary["command"] = shlex.join(staged_parts)
+        print(f"[训练包装器] 改写后的命令: {summary['command']}")
+    command_parts = staged_parts
+    if env:
+        child_env = dict(child_env or os.environ, **env)
+    emit("stage", **summary)
+    return command_parts, child_env, summary
+
+
+def start_checkpoint_watcher(work_dir: Path, checkpoint_config: dict, emit):
+    """
+    按配置启动检查点目录监视
+    
+    Args:
+        work_dir: 工作目录（检查点目录的相对路径基准）
+        checkpoint_config: 配置中的 train.checkpoint_io 段
+        emit: 事件写入函数
+        
+    Returns:
+        CheckpointWatcher 实例，未启用时返回 None
+    """
+    if not checkpoint_config.get('enabled', False):
+        return None
+    from src.core.ckptwatch import CheckpointTracker, CheckpointWatcher
+    
+    def _on_checkpoint(record):
+        emit("checkpoint", **record.to_dict())
+        bandwidth = f"，{record.bandwidth_mbps} MB/s" if record.bandwidth_mbps is not None else ""
+        print(f"[训练包装器] 检查点 {record.name}: {record.size_bytes / 1024 / 1024:.1f} MB，"
+              f"耗时 {record.duration:.1f}s{bandwidth}")
+    
+    def _on_slow(record, baseline):
+        emit("checkpoint_slow", name=record.name, bandwidth_mbps=record.bandwidth_mbps,
+             baseline_mbps=round(baseline, 2), size_bytes=record.size_bytes, duration=record.duration)
+        print(f"[训练包装器] 检查点写入变慢: {record.bandwidth_mbps} MB/s，基线 {baseline:.1f} MB/s")
+    
+    tracker = CheckpointTracker(
+        work_dir / checkpoint_config.get('dir', 'checkpoints'),
+        pattern=checkpoint_config.get('pattern', '*'),
+        settle=float(checkpoint_config.get('settle', 5)),
+        slow_factor=float(checkpoint_config.get('slow_factor', 0.5)),
+        baseline_count=int(checkpoint_config.get('baseline_count', 3)),
+        on_checkpoint=_on_checkpoint,
+        on_slow=_on_slow,
+    )
+    watcher = CheckpointWatcher(tracker, backend=checkpoint_config.get('backend', 'auto'),
+                                poll_interval=float(checkpoint_config.get('poll_interval', 2)))
+    watcher.start()
+    return watcher
+
+
+def start_resource_monitor(pid: int, monitor_config: dict, memory_watch=None, on_memory_warning=None,
+                           activity=None):
+    """
+    按配置启动子进程的资源采样
+    
+    Args:
+        pid: 子进程 PID
+        monitor_config: 配置中的 monitor 段
+        memory_watch: 内存压力跟踪器（可选）
+        on_memory_warning: 内存预警回调（可选）
+        activity: 返回最后一次输出时间（monotonic）的函数，输出停止或恢复时触发密集采样（可选）
+        
+    Returns:
+        SystemMonitor 实例，未启用或启动失败时返回 None
+    """
+    if not monitor_config.get('enabled', False):
+        return None
+    
+    interval = float(monitor_config.get('interval', 2.0))
+    
+    # 同一节点上的多个包装器共享一个设备级采样进程，各自只采样自己的进程树
+    device_source = None
+    if monitor_config.get('shared_sampler', True):
+        try:
+            from src.core.sampler import SharedSamplerClient
+            device_source = SharedSamplerClient(interval=interval)
+            device_source.join()
+        except Exception as e:
+            print(f"[训练包装器] 共享采样不可用，改为独立采样: {e}")
+            device_source = None
+    
+    try:
+        from src.core.monitor import AdaptiveSchedule, SystemMonitor
+        from src.core.sampler import visible_gpu_indices
+        fs_probe_dir = os.getcwd() if monitor_config.get('fs_probe', False) else None
+        energy_config = monitor_config.get('energy') or {}
+        energy_meter = None
+        if energy_config.get('enabled', True):
+            from src.core.energy import EnergyMeter
+            energy_meter = EnergyMeter(rapl=energy_config.get('rapl', True))
+        system_monitor = SystemMonitor(pid, device_source=device_source, gpu_indices=visible_gpu_indices(),
+                                       fs_probe_dir=fs_probe_dir,
+                                       fs_probe_interval=float(monitor_config.get('fs_probe_interval', 60)),
+                                       accounting=monitor_config.get('accounting', 'auto'),
+                                       cgroup_delegate=monitor_config.get('cgroup_delegate', False),
+                                       memory_watch=memory_watch, on_memory_warning=on_memory_warning,
+                                       energy_meter=energy_meter,
+                                       schedule=AdaptiveSchedule.from_config(monitor_config.get('sampling') or {},
+                                                                             interval),
+                                       activity=activity, gpu_min_interval=interval)
+        system_monitor.start_background(interval)
+        return system_monitor
+    except Exception as e:
+        print(f"[训练包装器] 资源监控启动失败: {e}")
+        if device_source:
+            device_source.leave()
+        return None
+
+
+def stop_resource_monitor(system_monitor, steps: Optional[int] = None) -> Optional[dict]:
+    """
+    停止资源采样并注销共享采样
+    
+    Args:
+        system_monitor: start_resource_monitor 的返回值
+        steps: 训练步数（已知时计算每步能耗）
+        
+    Returns:
+        资源汇总字典，未启用时返回 None
+    """
+    if not system_monitor:
+        return None
+    metrics = system_monitor.stop_background()
+    if system_monitor.device_source:
+        system_monitor.device_source.leave()
+    return metrics.summary(steps)
+
+
+def start_node_probe(python: str, monitor_config: dict):
+    """
+    在后台读取节点能力（缓存有效时几乎立即完成，否则重新探测，不阻塞训练启动）
+    
+    Args:
+        python: 训练使用的 Python 解释器（用于探测 PyTorch）
+        monitor_config: 配置中的 monitor 段
+        
+    Returns:
+        concurrent.futures.Future，未启用时返回 None
+    """
+    if not monitor_config.get('node_probe', True):
+        return None
+    from concurrent.futures import ThreadPoolExecutor
+    from src.core.probe import load_node_info
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='node-probe')
+    future = executor.submit(load_node_info, ttl=float(monitor_config.get('node_probe_ttl', 86400)),
+                             python=python)
+    executor.shutdown(wait=False)
+    return future
+
+
+def node_probe_result(future, timeout: float) -> Optional[dict]:
+    """
+    取出节点能力探测结果
+    
+    Args:
+        future: start_node_probe 的返回值
+        timeout: 最长等待时间（秒）
+        
+    Returns:
+        节点能力字典，未启用、超时或失败时返回 None
+    """
+    if future is None:
+        return None
+    try:
+        return future.result(timeout=timeout)
+    except Exception:
+        return None
+
+
+def resolve_train_env(env_config: dict):
+    """
+    按配置解析训练使用的 conda 环境
+    
+    Args:
+        env_config: 配置中的 train.env 段
+        
+    Returns:
+        (CondaEnv, 激活后的环境变量)，未配置时返回 (None, None)
+        
+    Raises:
+        FileNotFoundError: 找不到指定的 conda 环境
+    """
+    if not env_config.get('conda'):
+        return None, None
+    from src.core.condaenv import resolve_conda_env
+    conda_env = resolve_conda_env(str(env_config['conda']))
+    return conda_env, conda_env.apply()
+
+
+def plan_child_placement(node_future, node_info: Optional[dict], local_rank: int, placement_config: dict):
+    """
+    按配置计算训练进程的 CPU 放置
+    
+    Args:
+        node_future: start_node_probe 的返回值（缓存未就绪时等待探测完成）
+        node_info: 已取得的节点能力（可选）
+        local_rank: 节点内 rank 编号
+        placement_config: 配置中的 train.placement 段
+        
+    Returns:
+        Placement 实例，未启用或计算失败时返回 None
+    """
+    if not placement_config.get('enabled', False):
+        return None
+    try:
+        from src.core.placement import plan_placement
+        from src.core.sampler import visible_gpu_indices
+        node_info = node_info or node_probe_result(node_future, 60)
+        return plan_placement(node_info, local_rank, visible_gpu_indices(),
+                              threads=placement_config.get('threads', 'auto'),
+                              membind=placement_config.get('membind', False))
+    except Exception as e:
+        print(f"[训练包装器] CPU 放置计算失败，使用默认放置: {e}")
+        return None
+
+
+def open_event_writer(events_path: Path, events_config: dict):
+    """
+    按配置打开结构化事件文件
+    
+    Args:
+        events_path: 事件文件路径
+        events_config: 配置中的 train.events 段
+        
+    Returns:
+        EventWriter 实例，未启用时返回 None
+    """
+    if not events_config.get('enabled', True):
+        return None
+    try:
+        return EventWriter(events_path,
+                           flush_interval=float(events_config.get('flush_interval', 5)))
+    except OSError as e:
+        print(f"[训练包装器] 事件文件创建失败: {e}")
+        return None
+
+
+def collect_stats(output_stats: dict, system_monitor) -> dict:
+    """
+    当前进度和资源统计（stats 事件和指标文件共用）
+    
+    Args:
+        output_stats: 输出计数（由输出循环更新）
+        system_monitor: 资源监控器（可选）
+        
+    Returns:
+        统计字典
+    """
+    stats = {
+        "steps": output_stats.get("steps"),
+        "total_steps": output_stats.get("total_steps"),
+        "lines": output_stats["lines"],
+        "chars": output_stats["chars"],
+        "bytes": output_stats["bytes"],
+        "idle_seconds": round(time.monotonic() - output_stats["last_output"], 3),
+    }
+    if system_monitor:
+        metrics = system_monitor.get_metrics()
+        stats["cpu"] = metrics.cpu_samples[-1] if metrics.cpu_samples else None
+        stats["gpu"] = metrics.gpu_samples[-1] if metrics.gpu_samples else None
+        stats["max_memory_mb"] = round(metrics.get_max_memory(), 2)
+    return stats
+
+
+def start_stats_reporter(events: EventWriter, output_stats: dict, system_monitor, interval: float):
+    """
+    启动周期统计事件线程
+    
+    Args:
+        events: 事件写入器
+        output_stats: 输出计数（由输出循环更新）
+        system_monitor: 资源监控器（可选）
+        interval: 统计间隔（秒）
+        
+    Returns:
+        用于停止线程的 threading.Event
+    """
+    stop_event = threading.Event()
+    
+    def _loop():
+        while not stop_event.wait(interval):
+            events.emit("stats", **collect_stats(output_stats, system_monitor))
+    
+    threading.Thread(target=_loop, name="stats-reporter", daemon=True).start()
+    return stop_event
+
+
+def start_metrics_exporter(work_dir: Path, metrics_config: dict, rank_info):
+    """
+    按配置启动 node_exporter textfile collector 指标文件的定期写入
+    
+    Args:
+        work_dir: 工作目录（run 标签取其目录名）
+        metrics_config: 配置中的 monitor.metrics 段
+        rank_info: rank 信息（job_id、rank 标签，多 rank 时每个 rank 一个文件）
+        
+    Returns:
+        TextfileExporter，未配置 textfile_dir 或目录不存在时返回 None
+    """
+    textfile_dir = metrics_config.get('textfile_dir')
+    if not textfile_dir:
+        return None
+    textfile_dir = Path(os.path.expandvars(os.path.expanduser(textfile_dir)))
+    if not textfile_dir.is_dir():
+        print(f"[训练包装器] 指标目录不存在，不写入指标文件: {textfile_dir}")
+        return None
+    
+    from src.core.metrics import TextfileExporter
+    name = rank_file_name(f"hpc_run_{rank_info.job_id or os.getpid()}.prom", rank_info)
+    exporter = TextfileExporter(textfile_dir / name, {"run": work_dir.name, "job_id": rank_info.job_id or "",
+                                                      "rank": rank_info.rank})
+    exporter.set_phase("starting")
+    exporter.start(float(metrics_config.get('textfile_interval', 15)))
+    print(f"[训练包装器] 指标文件: {exporter.path}")
+    return exporter
+
+
+def build_step_timer(progress_config: dict):
+    """
+    按配置创建步时统计器
+    
+    Args:
+        progress_config: 配置中的 train.progress 段
+        
+    Returns:
+        StepTimer 实例，未启用或正则无效时返回 None
+    """
+    if not progress_config.get('enabled', True):
+        return None
+    try:
+        return StepTimer(
+            pattern=progress_config.get('step_pattern') or DEFAULT_STEP_PATTERN,
+            warmup_steps=int(progress_config.get('warmup_steps', 5)),
+            baseline_steps=int(progress_config.get('baseline_steps', 50)),
+            window=int(progress_config.get('window', 20)),
+            factor=float(progress_config.get('slowdown_factor', 1.5)),
+            sustain=int(progress_config.get('sustain', 3)),
+            total_steps=progress_config.get('total_steps'),
+        )
+    except re.error as e:
+        print(f"[训练包装器] step_pattern 无效，已禁用步时统计: {e}")
+        return None
+
+
+def build_restart_policy(restart_config: dict, rank_info):
+    """
+    按配置创建重启策略
+    
+    Args:
+        restart_config: 配置中的 train.restart 段
+        rank_info: 当前进程的 rank 信息
+        
+    Returns:
+        RestartPolicy 实例，未启用、多节点运行或配置无效时返回 None
+    """
+    if not restart_config.get('enabled', False):
+        return None
+    # 多节点运行时单个 rank 自行重启无法重新加入通信组，应由 torchrun --max-restarts 等启动器负责
+    if rank_info.is_distributed:
+        print("[训练包装器] 多节点运行不支持自动重启，已忽略 train.restart")
+        return None
+    try:
+        return RestartPolicy.from_config(restart_config)
+    except (re.error, ValueError, TypeError) as e:
+        print(f"[训练包装器] train.restart 配置无效，已禁用自动重启: {e}")
+        return None
+
+
+def build_release_policy(release_config: dict, rank_info):
+    """
+    按配置创建资源释放策略
+    
+    Args:
+        release_config: 配置中的 train.on_complete 段
+        rank_info: 当前进程的 rank 信息
+        
+    Returns:
+        ReleasePolicy 实例，未启用、多节点运行或配置无效时返回 None
+    """
+    if not release_config.get('enabled', False):
+        return None
+    # 单个 rank 结束时其他 rank 可能仍在运行，释放整个作业应由作业脚本在 srun 返回后负责
+    if rank_info.is_distributed:
+        print("[训练包装器] 多节点运行不支持自动释放资源，已忽略 train.on_complete")
+        return None
+    try:
+        return ReleasePolicy.from_config(release_config)
+    except (ValueError, TypeError) as e:
+        print(f"[训练包装器] train.on_complete 配置无效，已禁用自动释放: {e}")
+        return None
+
+
+def plan_release(policy, return_code: int, received_signals: list, log_file: Path,
+                 work_dir: Path, marker_path: Path) -> dict:
+    """
+    训练结束后确定释放计划（写入完成标记）
+    
+    Args:
+        policy: 资源释放策略
+        return_code: 训练退出码
+        received_signals: 包装器收到的信号（作业被取消或超时时分配即将结束，无需释放）
+        log_file: 训练日志路径（检查 abort_keywords）
+        work_dir: 工作目录
+        marker_path: 完成标记路径（自定义命令中的 {marker} 占位符）
+        
+    Returns:
+        包含 action、status（pending / skipped / aborted / failed）等字段的字典
+    """
+    plan = {"action": policy.action, "dry_run": policy.dry_run, "delay_seconds": policy.delay,
+            "argv": None, "status": "pending", "reason": ""}
+    if received_signals:
+        plan.update(status="skipped", reason=f"包装器收到信号 {received_signals[-1]}，分配即将结束")
+        return plan
+    if not policy.applies(return_code):
+        plan.update(status="skipped", reason=f"退出码 {return_code} 不满足 when={policy.when}")
+        return plan
+    try:
+        log_lines = read_log_tail(log_file, policy.tail_lines) if policy.abort_keywords else []
+    except OSError as e:
+        log_lines = []
+        print(f"[训练包装器] 读取日志失败，跳过关键字检查: {e}")
+    reason = policy.abort_reason(log_lines, work_dir)
+    if reason:
+        plan.update(status="aborted", reason=reason)
+        return plan
+    if policy.action != "exit_shell":
+        try:
+            plan["argv"] = release_argv(policy, return_code=return_code, work_dir=work_dir, marker=marker_path)
+        except (RuntimeError, KeyError, ValueError) as e:
+            plan.update(status="failed", reason=f"无法生成释放命令: {e}")
+            return plan
+    plan["planned_at"] = round(time.time() + policy.delay, 3)
+    return plan
+
+
+def release_allocation(policy, plan: dict, end_time: float, work_dir: Path, emit) -> dict:
+    """
+    等待安全延迟后释放计算资源，并写入 release 事件
+    
+    Args:
+        policy: 资源释放策略
+        plan: plan_release 返回的释放计划（status 为 pending）
+        end_time: 训练结束时间戳（计算从结束到释放的时长）
+        work_dir: 工作目录
+        emit: 事件写入函数
+        
+    Returns:
+        释放结果（plan 加上 status、detail 和 exit_to_release_seconds）
+    """
+    action = "（dry run）" if policy.dry_run else ""
+    target = shlex.join(plan['argv']) if plan['argv'] else "退出交互式分配的 shell"
+    print(f"[训练包装器] {policy.delay:.0f}s 后释放计算资源{action}: {target}")
+    if policy.abort_file:
+        print(f"[训练包装器] 在此之前创建 {work_dir / policy.abort_file} 可取消释放")
+    
+    result = dict(plan)
+    deadline = time.monotonic() + policy.delay
+    reason = None
+    while True:
+        reason = policy.abort_reason([], work_dir)
+        remaining = deadline - time.monotonic()
+        if reason or remaining <= 0:
+            break
+        time.sleep(min(1.0, remaining))
+    
+    released_at = time.time()
+    if reason:
+        result.update(status="aborted", reason=reason)
+    elif policy.dry_run:
+        result.update(status="dry_run")
+    else:
+        result.update(execute_release(policy, plan['argv']))
+    result["released_at"] = round(released_at, 3)
+    result["exit_to_release_seconds"] = round(released_at - end_time, 2)
+    emit("release", **result)
+    
+    if result["status"] == "released":
+        print(f"[训练包装器] 已释放计算资源（训练结束后 {result['exit_to_release_seconds']}s）")
+    elif result["status"] == "dry_run":
+        print(f"[训练包装器] dry run，未执行释放: {target}")
+    elif result["status"] == "aborted":
+        print(f"[训练包装器] 已取消释放: {reason}")
+    else:
+        print(f"[训练包装器] 释放计算资源失败: {result.get('detail')}")
+    return result
+
+
+def summarize_attempts(attempts) -> dict:
+    """
+    汇总各次运行尝试（写入完成标记）
+    
+    Args:
+        attempts: Attempt 列表
+        
+    Returns:
+        包含尝试列表、重启次数、浪费时长和最终状态的字典
+    """
+    last = attempts[-1]
+    if last.return_code == 0:
+        final_status = "succeeded" if len(attempts) == 1 else "recovered"
+    else:
+        final_status = "exhausted" if last.retryable else "failed"
+    return {
+        "attempts": [attempt.to_dict() for attempt in attempts],
+        "restarts": len(attempts) - 1,
+        # 失败后重启的运行时长加上等待时长
+        "wasted_seconds": round(sum(attempt.elapsed_seconds + attempt.delay_seconds
+                                    for attempt in attempts[:-1]), 2),
+        "final_status": final_status,
+    }
+
+
+def run_training(work_dir: Path, command: str, log_dir: Path, marker_file: str = '.train_complete.json',
+                 state_file: str = '.train_running.json', config: Optional[dict] = None) -> int:
     """
     执行训练任务
     
@@ -30,10 +676,19 @@ def run_training(work_dir: Path, command: str, log_dir: Path, marker_file: str =
         command: 训练命令
         log_dir: 日志目录
         marker_file: 完成标记文件名
+        state_file: 运行状态文件名（训练期间存在，供监控程序预估剩余时间）
+        config: 完整配置字典（可选，用于读取 monitor 等可选配置）
         
     Returns:
         退出码
     """
+    config = config or {}
+    
+    # 多节点运行时每个 rank 使用独立的标记、状态、日志和事件文件
+    rank_info = detect_rank()
+    marker_file = rank_file_name(marker_file, rank_info)
+    state_file = rank_file_name(state_file, rank_info)
+    
     # 切换到工作目录
     work_dir = Path(work_dir).resolve()
     os.chdir(work_dir)
@@ -42,13 +697,28 @@ def run_training(work_dir: Path, command: str, log_dir: Path, marker_file: str =
     log_dir = work_dir / log_dir
     log_dir.mkdir(parents=True, exist_ok=True)
     
-    # 生成日志文件名（带时间戳）
+    # 生成日志文件名（带时间戳），按配置决定是否边写边压缩
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_file = log_dir / f"train_{timestamp}.log"
+    log_config = config.get('train', {}).get('log') or {}
+    f, log_file = open_log_writer(
+        log_dir / rank_file_name(f"train_{timestamp}.log", rank_info),
+        compress=resolve_compression(log_config.get('compress')),
+        flush_bytes=int(log_config.get('flush_bytes', 1 << 20)),
+        flush_interval=float(log_config.get('flush_interval', 30))
+    )
+    error_index = open_error_index(log_file, log_config.get('error_index') or {})
+    events_config = config.get('train', {}).get('events') or {}
+    events = open_event_writer(log_dir / rank_file_name(f"train_{timestamp}.events.jsonl", rank_info),
+                               events_config)
+    emit = events.emit if events else (lambda *args, **kwargs: None)
     
+    if rank_info.is_distributed:
+        print(f"[训练包装器] rank {rank_info.rank}/{rank_info.world_size}（节点 {rank_info.node}）")
     print(f"[训练包装器] 工作目录: {work_dir}")
     print(f"[训练包装器] 执行命令: {command}")
     print(f"[训练包装器] 日志文件: {log_file}")
+    if events:
+        print(f"[训练包装器] 事件文件: {events.path}")
     print(f"[训练包装器] 完成标记: {marker_file}")
     print("-" * 60)
     
@@ -57,10 +727,18 @@ def run_training(work_dir: Path, command: str, log_dir: Path, marker_file: str =
     start_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
     # 执行训练命令
-    command_parts = command.split()
+    # 按 shell 规则拆分，带引号的参数（如含空格的路径）保持为一个参数
+    command_parts = shlex.split(command)
     
+    # 指定 conda 环境时直接使用该环境的解释器和环境变量启动（不经过 conda run）
+    conda_env, child_env = resolve_train_env(config.get('train', {}).get('env') or {})
+    if conda_env:
+        command_parts = conda_env.resolve_command(command_parts, child_env)
+        if os.path.basename(command_parts[0]).startswith('python') and '-u' not in command_parts:
+            command_parts.insert(1, '-u')
+        print(f"[训练包装器] conda 环境: {conda_env.name} ({conda_env.prefix})")
     # 智能处理 Python 命令
-    if command_parts[0] in ("python", "python3"):
+    elif command_parts[0] in ("python", "python3"):
         # 尝试找到可用的 Python
         for py_cmd in ['python3', 'python', sys.executable]:
             if shutil.which(py_cmd):
@@ -70,45 +748,297 @@ def run_training(work_dir: Path, command: str, log_dir: Path, marker_file: str =
         if '-u' not in command_parts:
             command_parts.insert(1, '-u')
     
+    emit("start", command=command, work_dir=str(work_dir), log_file=str(log_file),
+         hostname=socket.gethostname(), wrapper_pid=os.getpid(), **rank_info.to_dict())
+    
+    # 节点能力（按主机名缓存，训练使用的解释器与缓存不同时重新探测）
+    python = command_parts[0] if os.path.basename(command_parts[0]).startswith('python') else sys.executable
+    node_future = start_node_probe(shutil.which(python) or python, config.get('monitor') or {})
+    node_info = node_probe_result(node_future, 0.5)
+    if node_info:
+        from src.core.probe import summarize
+        print(f"[训练包装器] 节点: {summarize(node_info)}")
+    
+    # CPU 亲和性、NUMA 绑定和线程数
+    placement = plan_child_placement(node_future, node_info, rank_info.local_rank,
+                                     config.get('train', {}).get('placement') or {})
+    if placement:
+        from src.core.placement import membind_prefix
+        command_parts = membind_prefix(placement) + command_parts
+        child_env = dict(child_env or os.environ, **placement.env)
+        print(f"[训练包装器] CPU 放置: {placement.to_dict()['cpus']}（{placement.reason}），"
+              f"线程数 {placement.threads if placement.env else '保持不变'}")
+    
+    # 数据集预拷贝到节点本地存储（训练命令改为读取本地副本）
+    stage_config = config.get('train', {}).get('stage') or {}
+    command_parts, child_env, stage = stage_datasets(stage_config, command_parts, child_env, emit)
+    
+    # 检查点写入耗时和带宽（跨重启统计）
+    checkpoint_watcher = start_checkpoint_watcher(work_dir, config.get('train', {}).get('checkpoint_io') or {}, emit)
+    
+    # 瞬时故障自动重启（同一次资源分配内）
+    restart_policy = build_restart_policy(config.get('train', {}).get('restart') or {}, rank_info)
+    base_command_parts = command_parts
+    attempts = []
+    
+    # 训练结束后自动释放计算资源
+    release_policy = build_release_policy(config.get('train', {}).get('on_complete') or {}, rank_info)
+    
+    # Prometheus 指标（node_exporter textfile collector）
+    metrics_config = (config.get('monitor') or {}).get('metrics') or {}
+    metrics_exporter = start_metrics_exporter(work_dir, metrics_config, rank_info)
+    
     # 启动训练进程，捕获输出
-    with open(log_file, 'w', encoding='utf-8') as f:
+    previous_handlers = {}
+    received_signals = []
+    process = None
+    system_monitor = None
+    stats_stop = None
+    finished = False
+    try:
         f.write(f"[训练开始] {start_time_str}\n")
         f.write(f"[命令] {command}\n")
+        if stage and stage.get('command'):
+            f.write(f"[预拷贝后的命令] {stage['command']}\n")
         f.write(f"[工作目录] {work_dir}\n")
         f.write("-" * 60 + "\n\n")
         f.flush()
         
-        process = subprocess.Popen(
-            command_parts,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
-        )
+        # 记录收到的信号；SIGTERM/SIGUSR1（如 Slurm 的超时预警）转发给训练进程，
+        # 包装器继续等待其退出并写入完成标记。SIGINT 由终端发给整个进程组，无需转发
+        def _handle_signal(signum, frame):
+            forward = signum != signal.SIGINT and process is not None and process.poll() is None
+            received_signals.append(signal.Signals(signum).name)
+            emit("signal", signal=signal.Signals(signum).name, forwarded=forward)
+            print(f"[训练包装器] 收到信号 {signal.Signals(signum).name}")
+            if system_monitor:
+                system_monitor.burst("signal")
+            if forward:
+                process.send_signal(signum)
+        
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT, getattr(signal, 'SIGUSR1', None)):
+                if signum is not None:
+                    previous_handlers[signum] = signal.signal(signum, _handle_signal)
         
-        # 实时读取并保存输出
-        if process.stdout:
-            for line in process.stdout:
-                # 打印到控制台
-                print(line, end='')
-                # 写入日志文件
-                f.write(line)
+        state_path = work_dir / state_file
+        resume_from = None
+        while True:
+            attempt = Attempt(attempt=len(attempts) + 1, start_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                              resume_from=resume_from)
+            attempt_start = time.time()
+            process = subprocess.Popen(
+                command_parts,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                bufsize=0,
+                env=child_env
+            )
+            # 训练进程此时刚启动，之后创建的线程和 DataLoader 子进程都会继承 CPU 亲和性
+            if placement:
+                from src.core.placement import apply_affinity
+                if not apply_affinity(process.pid, placement):
+                    print("[训练包装器] 设置 CPU 亲和性失败")
+            emit("spawn", pid=process.pid, argv=command_parts, attempt=attempt.attempt,
+                 placement=placement.to_dict() if placement else None)
+            
+            # 写入运行状态文件
+            write_state_file(state_path, {
+                "status": "running",
+                "start_time": start_time_str,
+                "start_timestamp": start_time,
+                "command": command,
+                "work_dir": str(work_dir),
+                "log_file": str(log_file),
+                "events_file": str(events.path) if events else None,
+                "hostname": socket.gethostname(),
+                "pid": process.pid,
+                "attempt": attempt.attempt,
+                **rank_info.to_dict(),
+            })
+            
+            # 内存压力跟踪（由资源采样提供读数）：有效上限来自 cgroup memory.max 或调度器分配，
+            # 预计即将 OOM 时发出预警事件
+            memory_watch = build_memory_watch(process.pid, config.get('monitor') or {})
+            
+            def _memory_warning(warning):
+                emit("memory_warning", **warning)
+                eta = f"，预计 {warning['eta_seconds'] / 60:.0f} 分钟后达到上限" if warning.get('eta_seconds') else ""
+                print(f"[训练包装器] 内存预警: {warning['used_mb']:.0f} MB / {warning['limit_mb']:.0f} MB"
+                      f"（{warning['fraction']:.0%}）{eta}")
+            
+            output_stats = {"lines": 0, "chars": 0, "bytes": 0, "last_output": time.monotonic()}
+            system_monitor = start_resource_monitor(process.pid, config.get('monitor') or {},
+                                                    memory_watch, _memory_warning,
+                                                    activity=lambda: output_stats["last_output"])
+            if system_monitor is None:
+                # 没有资源采样时内存跟踪器得不到任何读数，不写入内存汇总
+                memory_watch = None
+            shutdown_burst = []
+            step_timer = build_step_timer(config.get('train', {}).get('progress') or {})
+            if events:
+                stats_stop = start_stats_reporter(events, output_stats, system_monitor,
+                                                  float(events_config.get('stats_interval', 30)))
+            if metrics_exporter:
+                metrics_exporter.source = lambda: dict(collect_stats(output_stats, system_monitor),
+                                                       attempt=attempt.attempt, start_timestamp=start_time)
+                metrics_exporter.set_phase("running")
+            
+            # 进度条（\r 重绘）在终端上实时刷新，日志中只保留每行的最终状态
+            line_filter = ProgressLineFilter(
+                sample_interval=float(log_config.get('progress_sample_interval', 0)),
+                collapse=log_config.get('collapse_progress', True)
+            )
+            failure_matches = []
+            
+            def _handle_lines(lines, now):
+                # 错误索引按批扫描：记录这批行在原始日志中的起始偏移量，整批只匹配一次
+                if error_index and lines:
+                    error_index.scan("".join(lines), f.tell())
+                for line in lines:
+                    output_stats["lines"] += 1
+                    if step_timer:
+                        slowdown = step_timer.observe(line, now)
+                        output_stats["steps"] = step_timer.steps
+                        output_stats["total_steps"] = step_timer.total_steps
+                        # 训练即将结束（最后 1% 的步数）时密集采样收尾阶段（保存检查点、评估等）；
+                        # 按输出中的步号判断，恢复训练时本次运行观测到的步数少于实际步号
+                        current_step = step_timer.last_step if step_timer.last_step is not None else step_timer.steps
+                        if (system_monitor and not shutdown_burst and step_timer.total_steps
+                                and current_step >= 0.99 * step_timer.total_steps):
+                            shutdown_burst.append(current_step)
+                            system_monitor.burst("shutdown")
+                        if slowdown:
+                            if system_monitor:
+                                system_monitor.burst("slowdown")
+                            emit("slowdown", **slowdown.to_dict())
+                            print(f"[训练包装器] 检测到持续降速: 步时 {slowdown.step_time:.3f}s，"
+                                  f"基线 {slowdown.baseline:.3f}s（step {slowdown.step}）")
+                    if restart_policy and not failure_matches:
+                        match = restart_policy.match_line(line)
+                        if match:
+                            failure_matches.append(match)
+                    # 写入日志文件
+                    f.write(line)
+            
+            # 实时读取并保存输出
+            if process.stdout:
+                for chunk in read_output(process.stdout):
+                    now = time.monotonic()
+                    output_stats["chars"] += len(chunk)
+                    output_stats["bytes"] += len(chunk.encode("utf-8", errors="replace"))
+                    output_stats["last_output"] = now
+                    # 原样打印到控制台
+                    sys.stdout.write(chunk)
+                    sys.stdout.flush()
+                    _handle_lines(line_filter.feed(chunk), now)
+                    f.flush()
+                _handle_lines(line_filter.flush(), time.monotonic())
                 f.flush()
+            # 输出已关闭，训练进程正在退出
+            if system_monitor:
+                system_monitor.burst("exit")
+            
+            # 等待进程结束
+            return_code = process.wait()
+            if stats_stop:
+                stats_stop.set()
+            
+            resources = stop_resource_monitor(system_monitor, step_timer.observed_steps if step_timer else None)
+            system_monitor = None
+            memory = memory_watch.summary(return_code) if memory_watch else None
+            if memory and memory["oom_killed"]:
+                print(f"[训练包装器] 训练进程因内存不足被杀死（OOM），峰值 {memory.get('peak_mb', 'N/A')} MB，"
+                      f"上限 {memory['limit_mb']} MB（{memory['limit_source']}）")
+            attempt.return_code = return_code
+            attempt.elapsed_seconds = round(time.time() - attempt_start, 2)
+            attempts.append(attempt)
+            emit("exit", return_code=return_code, elapsed_seconds=attempt.elapsed_seconds,
+                 attempt=attempt.attempt, lines=output_stats["lines"], chars=output_stats["chars"],
+                 redraws=line_filter.redraws, resources=resources,
+                 oom_killed=bool(memory and memory["oom_killed"]))
+            
+            if not restart_policy or return_code == 0:
+                break
+            attempt.retryable, attempt.reason = restart_policy.classify(
+                return_code, failure_matches[0] if failure_matches else None)
+            delay = restart_policy.delay(len(attempts))
+            remaining = allocation_remaining()
+            if not attempt.retryable:
+                break
+            if received_signals:
+                attempt.reason += f"；收到信号 {received_signals[-1]}，不再重启"
+                break
+            if len(attempts) > restart_policy.max_restarts:
+                attempt.reason += f"；已达到最大重启次数 {restart_policy.max_restarts}"
+                break
+            if remaining is not None and remaining < delay + restart_policy.min_remaining:
+                attempt.reason += f"；资源分配剩余 {remaining:.0f}s，不足以重启"
+                break
+            
+            attempt.delay_seconds = delay
+            command_parts, resume_from = restart_policy.resume_command(base_command_parts, str(work_dir))
+            emit("restart", attempt=attempt.attempt + 1, reason=attempt.reason, delay_seconds=delay,
+                 resume_from=resume_from)
+            if metrics_exporter:
+                metrics_exporter.set_phase("restarting")
+            print(f"[训练包装器] 第 {attempt.attempt} 次运行失败（{attempt.reason}），"
+                  f"{delay:.0f}s 后重启" + (f"，从 {resume_from} 恢复" if resume_from else ""))
+            f.write(f"\n[重启] {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} 第 {attempt.attempt} 次运行"
+                    f"退出码 {return_code}（{attempt.reason}），{delay:.0f}s 后重启\n")
+            f.write(f"[命令] {shlex.join(command_parts)}\n\n")
+            f.flush()
+            # 分段等待，等待期间收到信号（如作业被取消）时立即放弃重启
+            deadline = time.monotonic() + delay
+            while not received_signals and time.monotonic() < deadline:
+                time.sleep(min(1.0, deadline - time.monotonic()))
+            if received_signals:
+                attempt.reason += f"；等待重启时收到信号 {received_signals[-1]}"
+                break
         
-        # 等待进程结束
-        return_code = process.wait()
-    
-    # 记录结束时间
-    end_time = time.time()
-    end_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    elapsed = round(end_time - start_time, 2)
-    
-    # 追加结束信息到日志
-    with open(log_file, 'a', encoding='utf-8') as f:
+        # 记录结束时间
+        end_time = time.time()
+        end_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        elapsed = round(end_time - start_time, 2)
+        
+        # 追加结束信息到日志
         f.write("\n" + "-" * 60 + "\n")
         f.write(f"[训练结束] {end_time_str}\n")
         f.write(f"[运行时长] {elapsed}s\n")
+        if len(attempts) > 1:
+            f.write(f"[运行次数] {len(attempts)}\n")
         f.write(f"[退出码] {return_code}\n")
+        if memory and memory["oom_killed"]:
+            f.write(f"[OOM] 训练进程因内存不足被杀死，峰值 {memory.get('peak_mb', 'N/A')} MB，上限 {memory['limit_mb']} MB\n")
+        finished = True
+    finally:
+        f.close()
+        if error_index:
+            error_index.close()
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+        # 训练进程启动失败（命令不存在、conda 环境缺失等）时同样停止后台线程并注销共享采样
+        if stats_stop:
+            stats_stop.set()
+        if system_monitor:
+            stop_resource_monitor(system_monitor)
+        if checkpoint_watcher:
+            checkpoint_watcher.stop()
+        if not finished:
+            if metrics_exporter:
+                metrics_exporter.set_phase("failed")
+                metrics_exporter.close(remove=bool(metrics_config.get('remove_on_exit', False)))
+            if events:
+                events.close()
+    
+    # 删除本地副本（多 rank 共用同一节点的副本，其他 rank 可能仍在读取）
+    if stage and stage.get('paths') and stage_config.get('cleanup', True):
+        if rank_info.is_distributed:
+            print("[训练包装器] 多节点运行不删除本地副本（由调度器清理 $TMPDIR）")
+        else:
+            from src.core.stage import cleanup_stage
+            cleanup_stage([item['local'] for item in stage['paths']], Path(stage['dir']))
+            stage["cleaned_up"] = True
     
     print("-" * 60)
     print(f"[训练包装器] 训练完成")
@@ -121,19 +1051,81 @@ def run_training(work_dir: Path, command: str, log_dir: Path, marker_file: str =
         "status": "completed",
         "start_time": start_time_str,
         "end_time": end_time_str,
+        "start_timestamp": start_time,
         "elapsed_seconds": elapsed,
         "return_code": return_code,
         "command": command,
         "work_dir": str(work_dir),
         "log_file": str(log_file),
-        "timestamp": time.time()
+        "events_file": str(events.path) if events else None,
+        "hostname": socket.gethostname(),
+        "timestamp": time.time(),
+        **rank_info.to_dict(),
     }
+    if resources:
+        completion_info["resources"] = resources
+    if error_index:
+        completion_info["error_index"] = error_index.summary()
+    if checkpoint_watcher:
+        completion_info["checkpoint_io"] = dict(checkpoint_watcher.tracker.summary(elapsed),
+                                                backend=checkpoint_watcher.active_backend)
+    if memory:
+        completion_info["memory"] = memory
+        completion_info["oom_killed"] = memory["oom_killed"]
+    node_info = node_info or node_probe_result(node_future, 30)
+    if node_info:
+        completion_info["node_probe"] = node_info
+    if placement:
+        completion_info["placement"] = placement.to_dict()
+    if restart_policy:
+        completion_info["restarts"] = summarize_attempts(attempts)
+    if stage:
+        completion_info["stage"] = stage
+    if conda_env:
+        completion_info["conda_env"] = {"name": conda_env.name, "prefix": conda_env.prefix,
+                                        "python": conda_env.python}
+    step_times = step_timer.summary() if step_timer else None
+    if step_times:
+        completion_info["step_times"] = step_times
+    if isinstance(f, FramedLogWriter) and f.compressed_bytes:
+        completion_info["log_compression"] = {
+            "algorithm": f.compress,
+            "raw_bytes": f.raw_bytes,
+            "compressed_bytes": f.compressed_bytes,
+            "ratio": round(f.raw_bytes / f.compressed_bytes, 2),
+        }
+    
+    release_plan = None
+    if release_policy:
+        release_plan = plan_release(release_policy, return_code, received_signals, log_file,
+                                    work_dir, marker_path)
+        completion_info["release"] = release_plan
     
-    with open(marker_path, 'w', encoding='utf-8') as f:
-        json.dump(completion_info, f, indent=2, ensure_ascii=False)
+    # 之后要释放计算节点时，确保标记已经落盘，监控程序一定能读到
+    write_state_file(marker_path, completion_info, durable=release_plan is not None)
+    
+    try:
+        state_path.unlink()
+    except FileNotFoundError:
+        pass
+    
+    emit("marker", path=str(marker_path))
+    if metrics_exporter:
+        metrics_exporter.set_phase("completed" if return_code == 0 else "failed")
     
     print(f"[训练包装器] 已创建完成标记: {marker_path}")
     
+    if release_plan and release_plan["status"] == "pending":
+        if metrics_exporter:
+            metrics_exporter.set_phase("releasing")
+        release_allocation(release_policy, release_plan, end_time, work_dir, emit)
+    elif release_plan:
+        print(f"[训练包装器] 不释放计算资源: {release_plan['reason']}")
+    if metrics_exporter:
+        metrics_exporter.close(remove=bool(metrics_config.get('remove_on_exit', False)))
+    if events:
+        events.close()
+    
     return return_code
 
 
@@ -160,7 +1152,7 @@ def main():
     marker_file = '.train_complete.json'  # 固定标记文件名
     
     # 执行训练
-    return_code = run_training(work_dir, command, log_dir, marker_file)
+    return_code = run_training(work_dir, command, log_dir, marker_file, config=config)
     return return_code
 
 